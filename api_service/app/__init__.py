@@ -1,29 +1,105 @@
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import POSTGRES_DB, POSTGRES_PASSWORD, POSTGRES_USER
-from app.minio_service import MinioService
+from typing import Any, Dict
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from app.config import (
+    DATABASE_URL,
+    DATABASE_REPLICA_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT,
+    DB_REPLICA_POOL_SIZE,
+    DB_REPLICA_MAX_OVERFLOW,
+    DB_REPLICA_STATEMENT_TIMEOUT,
+)
+from app.db_routing import read_from_primary
+from app.metrics import TimedAsyncQueuePool, instrument_engine
+from app.minio_service import MinioService, get_shared_minio_service
 
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@db:5432/{POSTGRES_DB}"
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def build_engine(url: str, pool_size: int, max_overflow: int, statement_timeout: int) -> AsyncEngine:
+    """
+    Создание движка базы данных с пулом соединений и ограничением времени запросов.
+
+    Args:
+        url (str): URL базы данных SQLAlchemy.
+        pool_size (int): Количество постоянных соединений в пуле.
+        max_overflow (int): Количество дополнительных соединений сверх pool_size.
+        statement_timeout (int): Максимальное время одного запроса в миллисекундах (0 - без ограничения).
+
+    Returns:
+        AsyncEngine: Движок с учетом запросов и ожидания пула в метриках.
+    """
+    options: Dict[str, Any] = {}
+    # SQLite (local runs, tests and benchmarks) opens a connection per session and has no pool to tune
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=TimedAsyncQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    if url.startswith("postgresql+asyncpg") and statement_timeout > 0:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(statement_timeout)}}
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_STATEMENT_TIMEOUT)
+# Without a replica, reads share the primary engine and its pool
+replica_engine = (
+    build_engine(DATABASE_REPLICA_URL, DB_REPLICA_POOL_SIZE, DB_REPLICA_MAX_OVERFLOW, DB_REPLICA_STATEMENT_TIMEOUT)
+    if DATABASE_REPLICA_URL
+    else engine
+)
+
+# expire_on_commit=False keeps loaded attributes usable after commit without lazy IO
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+
+def get_session_factory() -> async_sessionmaker:
+    # For work that outlives the request's dependencies, e.g. streaming response bodies
+    return SessionLocal
+
+
+def get_replica_session_factory() -> async_sessionmaker:
+    return ReplicaSessionLocal
+
+
+def get_read_session_factory(
+    request: Request,
+    primary: async_sessionmaker = Depends(get_session_factory),
+    replica: async_sessionmaker = Depends(get_replica_session_factory),
+) -> async_sessionmaker:
+    # Reads go to the replica unless the client has just written and the replica may lag behind
+    return primary if read_from_primary(request) else replica
+
+
+async def get_read_db(session_factory: async_sessionmaker = Depends(get_read_session_factory)):
+    async with session_factory() as db:
         yield db
-    finally:
-        db.close()
 
 
 def get_minio_service() -> MinioService:
-    return MinioService()
+    return get_shared_minio_service()
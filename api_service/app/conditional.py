@@ -0,0 +1,90 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+from fastapi import Request, Response, status
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive timestamps; they are stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Построение сильного ETag из значений, от которых зависит представление ресурса.
+
+    Args:
+        *parts (Any): Значения, например идентификатор и время последнего изменения.
+
+    Returns:
+        str: ETag в кавычках.
+    """
+    raw = "|".join(_as_utc(part).isoformat() if isinstance(part, datetime) else str(part) for part in parts)
+    return f'"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return etag in [candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates]
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Проверка условных заголовков запроса. If-None-Match имеет приоритет над If-Modified-Since.
+
+    Args:
+        request (Request): Входящий запрос.
+        etag (str): Текущий ETag ресурса.
+        last_modified (Optional[datetime]): Время последнего изменения ресурса.
+
+    Returns:
+        bool: True, если у клиента актуальная версия и можно ответить 304.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one second precision
+    return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> None:
+    """
+    Установка заголовков ETag и Last-Modified.
+
+    Args:
+        response (Response): Ответ.
+        etag (str): ETag ресурса.
+        last_modified (Optional[datetime]): Время последнего изменения ресурса.
+    """
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    """
+    Ответ 304 Not Modified с валидаторами ресурса.
+
+    Args:
+        etag (str): ETag ресурса.
+        last_modified (Optional[datetime]): Время последнего изменения ресурса.
+
+    Returns:
+        Response: Ответ без тела.
+    """
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
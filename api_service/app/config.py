@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import Union
 
 
@@ -12,6 +13,81 @@ PORT = int(os.environ.get("PORT", 8000))
 POSTGRES_USER = os.environ.get("POSTGRES_USER", "admin")
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD", "admin")
 POSTGRES_DB = os.environ.get("POSTGRES_DB", "postgres")
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL", f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@db:5432/{POSTGRES_DB}"
+)
 MINIO_ROOT_USER = os.environ.get("MINIO_ROOT_USER", "minioadmin")
 MINIO_ROOT_PASSWORD = os.environ.get("MINIO_ROOT_PASSWORD", "minioadmin")
 INTERNAL_MEDIA_SERVICE = parse_bool(os.environ.get("INTERNAL_MEDIA_SERVICE", False))
+MINIO_ENDPOINT = os.environ.get("MINIO_ENDPOINT", "minio:9000")
+MINIO_SECURE = parse_bool(os.environ.get("MINIO_SECURE", False))
+MINIO_POOL_MAXSIZE = int(os.environ.get("MINIO_POOL_MAXSIZE", 20))
+MINIO_CONNECT_TIMEOUT = float(os.environ.get("MINIO_CONNECT_TIMEOUT", 5))
+MINIO_READ_TIMEOUT = float(os.environ.get("MINIO_READ_TIMEOUT", 60))
+MINIO_MAX_RETRIES = int(os.environ.get("MINIO_MAX_RETRIES", 3))
+MINIO_REGION = os.environ.get("MINIO_REGION", "us-east-1")
+PRESIGNED_URL_EXPIRES = int(os.environ.get("PRESIGNED_URL_EXPIRES", 7 * 24 * 3600))
+PRESIGNED_URL_CACHE_TTL = int(os.environ.get("PRESIGNED_URL_CACHE_TTL", 24 * 3600))
+PRESIGNED_URL_CACHE_SIZE = int(os.environ.get("PRESIGNED_URL_CACHE_SIZE", 10000))
+COUNT_STRATEGY = os.environ.get("COUNT_STRATEGY", "exact")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = parse_bool(os.environ.get("DB_POOL_PRE_PING", True))
+# Milliseconds; 0 disables the timeout
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 30000))
+# Reads of the public service and GET endpoints go to the replica when it is set
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL", "")
+DB_REPLICA_POOL_SIZE = int(os.environ.get("DB_REPLICA_POOL_SIZE", DB_POOL_SIZE))
+DB_REPLICA_MAX_OVERFLOW = int(os.environ.get("DB_REPLICA_MAX_OVERFLOW", DB_MAX_OVERFLOW))
+DB_REPLICA_STATEMENT_TIMEOUT = int(os.environ.get("DB_REPLICA_STATEMENT_TIMEOUT", DB_STATEMENT_TIMEOUT))
+# Seconds after a write during which the same client reads from the primary
+READ_YOUR_WRITES_WINDOW = float(os.environ.get("READ_YOUR_WRITES_WINDOW", 5))
+# Seconds a worker waits for in-flight requests after SIGTERM before it is killed
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+READINESS_TIMEOUT = float(os.environ.get("READINESS_TIMEOUT", 2))
+STORAGE_MAX_CONCURRENCY = int(os.environ.get("STORAGE_MAX_CONCURRENCY", 16))
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 20 * 1024 * 1024))
+# S3 requires every multipart part except the last one to be at least 5 MiB
+UPLOAD_PART_SIZE = max(int(os.environ.get("UPLOAD_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024)
+UPLOAD_PART_CONCURRENCY = int(os.environ.get("UPLOAD_PART_CONCURRENCY", 4))
+UPLOAD_MEMORY_BUDGET = int(os.environ.get("UPLOAD_MEMORY_BUDGET", 256 * 1024 * 1024))
+# Lifetime of a POST policy for direct uploads to MinIO, and how long the upload may be completed after it
+DIRECT_UPLOAD_EXPIRES = int(os.environ.get("DIRECT_UPLOAD_EXPIRES", 900))
+DIRECT_UPLOAD_COMPLETE_WINDOW = int(os.environ.get("DIRECT_UPLOAD_COMPLETE_WINDOW", 900))
+# Resumable uploads without new bytes for this many seconds are dropped
+RESUMABLE_UPLOAD_EXPIRES = int(os.environ.get("RESUMABLE_UPLOAD_EXPIRES", 24 * 3600))
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+# A request holding an Idempotency-Key longer than this is assumed to have died and can be retried;
+# if it was only slow, it is rolled back instead of being applied twice
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+STORAGE_DEDUP = parse_bool(os.environ.get("STORAGE_DEDUP", False))
+THUMBNAILS_ENABLED = parse_bool(os.environ.get("THUMBNAILS_ENABLED", True))
+# Comma-separated variants in the form name:max_side:format
+THUMBNAIL_VARIANTS = os.environ.get("THUMBNAIL_VARIANTS", "thumb:256:webp,preview:640:jpeg")
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 2))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 100))
+MAX_LOOKUP_IDS = int(os.environ.get("MAX_LOOKUP_IDS", 200))
+RESPONSE_CACHE_ENABLED = parse_bool(os.environ.get("RESPONSE_CACHE_ENABLED", True))
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1000))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 30))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+MEDIA_CACHE_DIR = os.environ.get("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "meme-media-cache"))
+# Total for all workers; each worker process keeps its own cache with an equal share of the bytes
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Set by gunicorn.conf.py to the number of workers
+MEDIA_CACHE_WORKERS = max(int(os.environ.get("MEDIA_CACHE_WORKERS", 1)), 1)
+# Block size for serving cached images; uvicorn has no zero-copy ASGI extension, so cache hits are read and sent in blocks
+MEDIA_CHUNK_SIZE = int(os.environ.get("MEDIA_CHUNK_SIZE", 256 * 1024))
+STORAGE_GC_ENABLED = parse_bool(os.environ.get("STORAGE_GC_ENABLED", True))
+STORAGE_GC_INTERVAL = float(os.environ.get("STORAGE_GC_INTERVAL", 5))
+STORAGE_GC_BATCH_SIZE = int(os.environ.get("STORAGE_GC_BATCH_SIZE", 500))
+STORAGE_GC_RECONCILE_INTERVAL = float(os.environ.get("STORAGE_GC_RECONCILE_INTERVAL", 3600))
+# Unreferenced objects younger than this may belong to an upload whose DB commit is still in flight
+STORAGE_GC_ORPHAN_MIN_AGE = float(os.environ.get("STORAGE_GC_ORPHAN_MIN_AGE", 3600))
+METRICS_ENABLED = parse_bool(os.environ.get("METRICS_ENABLED", True))
+# Exposes the per-phase breakdown (db, storage, serialization) to clients, so it is off by default
+SERVER_TIMING_ENABLED = parse_bool(os.environ.get("SERVER_TIMING_ENABLED", False))
+# Set by gunicorn.conf.py when several workers run; /metrics then aggregates all workers
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
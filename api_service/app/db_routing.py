@@ -0,0 +1,41 @@
+import math
+import time
+from fastapi import Request, Response
+from app.config import READ_YOUR_WRITES_WINDOW
+
+# Wall-clock time of the client's last write; set on write responses, read back on later requests
+LAST_WRITE_COOKIE = "last_write_at"
+
+
+def mark_write(response: Response, window: float = READ_YOUR_WRITES_WINDOW) -> None:
+    """
+    Отметка о записи в ответе: следующие запросы этого клиента в течение window секунд читают с primary.
+
+    Args:
+        response (Response): Ответ на запрос, изменивший данные.
+        window (float): Время в секундах, за которое реплика должна догнать primary.
+    """
+    if window > 0:
+        response.set_cookie(
+            LAST_WRITE_COOKIE, f"{time.time():.3f}", max_age=math.ceil(window), httponly=True, samesite="lax"
+        )
+
+
+def read_from_primary(request: Request, window: float = READ_YOUR_WRITES_WINDOW) -> bool:
+    """
+    Нужно ли читать с primary, чтобы клиент увидел собственную недавнюю запись.
+
+    Args:
+        request (Request): Входящий запрос.
+        window (float): Время в секундах после записи, в течение которого чтение идет с primary.
+
+    Returns:
+        bool: True, если клиент менял данные меньше window секунд назад.
+    """
+    written = request.cookies.get(LAST_WRITE_COOKIE)
+    if not written:
+        return False
+    try:
+        return time.time() - float(written) < window
+    except ValueError:
+        return False
@@ -1,36 +1,161 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.minio_service import MinioService
 from app.services.meme_service import MemeService
-from app import get_db, get_minio_service
-from app.models.meme_responses import PaginatedMemesResponse
+from app.services.response_cache import list_response_cache
+from app.serialization import FastJSONResponse, render_json
+from app.range_response import RangeFileResponse
+from app.conditional import is_not_modified, not_modified, set_validators
+from app.pagination import CountStrategy, MemeFilter, MemeSortField, SortOrder, get_meme_filter
+from app import get_read_db, get_minio_service
+from app.models.meme_responses import MemeSearchResponse, PaginatedMemesResponse
 
 router = APIRouter()
 
 @router.get("/memes", response_model=PaginatedMemesResponse)
 async def get_memes(
+    request: Request,
     page: int = Query(default=1, gt=0, description="Номер страницы."),
     page_size: int = Query(default=10, gt=0, le=100, description="Количество мемов на странице."),
-    db: Session = Depends(get_db),
+    sort_by: MemeSortField = Query(default=MemeSortField.id, description="Поле сортировки."),
+    order: SortOrder = Query(default=SortOrder.asc, description="Направление сортировки."),
+    cursor: Optional[str] = Query(default=None, description="Курсор next_cursor предыдущей страницы."),
+    count: Optional[CountStrategy] = Query(default=None, description="Способ подсчета общего количества мемов."),
+    meme_filter: MemeFilter = Depends(get_meme_filter),
+    db: AsyncSession = Depends(get_read_db),
     minio_service: MinioService = Depends(get_minio_service),
 ):
     """
-    Получение списка мемов с пагинацией.
+    Получение списка мемов с пагинацией по номеру страницы или по курсору. Ответы кэшируются
+    до следующей записи в базу данных, но не дольше RESPONSE_CACHE_TTL секунд.
+
+    На запросы с If-None-Match отвечает 304 Not Modified, если версия данных мемов не менялась.
+
+    Args:
+        request (Request): Входящий запрос с условными заголовками.
+        page (int): Номер страницы. По умолчанию 1. Игнорируется, если передан курсор.
+        page_size (int): Количество мемов на странице. По умолчанию 10. Максимум 100.
+        sort_by (MemeSortField): Поле сортировки: id, created_at, updated_at, size, width или height.
+            По умолчанию id. При сортировке по size, width или height выводятся только мемы
+            со сведениями об изображении.
+        order (SortOrder): Направление сортировки: asc или desc. По умолчанию asc.
+        cursor (Optional[str]): Курсор next_cursor предыдущей страницы.
+        count (Optional[CountStrategy]): Способ подсчета total: exact, counter, estimate или none.
+            По умолчанию берется из конфигурации.
+        meme_filter (MemeFilter): Ограничения min_/max_ по размеру файла (size) и размерам изображения
+            (width, height). С ними total всегда считается точно.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        PaginatedMemesResponse: Объект ответа с пагинированными мемами или пустой ответ 304.
+
+    Raises:
+        HTTPException: Если курсор некорректен или произошла ошибка при получении мемов.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        etag, version = await meme_service.get_list_validators()
+        if etag is not None and is_not_modified(request, etag, None):
+            return not_modified(etag, None)
+
+        async def build() -> bytes:
+            return render_json(
+                await meme_service.get_paginated_memes_payload(
+                    page, page_size, sort_by, order, cursor, count, meme_filter
+                )
+            )
+
+        # Writes come from the internal service; they bump the data version shared through the database
+        key = (page, page_size, sort_by, order, cursor, count, meme_filter)
+        body = await list_response_cache.get_or_build(db, key, build, version)
+        response = Response(content=body, media_type="application/json")
+        if etag is not None:
+            set_validators(response, etag, None)
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/memes/search", response_model=MemeSearchResponse)
+async def search_memes(
+    q: str = Query(min_length=1, max_length=100, description="Поисковая строка."),
+    page_size: int = Query(default=10, gt=0, le=100, description="Количество мемов на странице."),
+    cursor: Optional[str] = Query(default=None, description="Курсор next_cursor предыдущей страницы."),
+    db: AsyncSession = Depends(get_read_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Поиск мемов по подстроке или нечеткому совпадению названия. Результаты отсортированы по сходству.
 
     Args:
-        page (int): Номер страницы. По умолчанию 1.
+        q (str): Поисковая строка.
         page_size (int): Количество мемов на странице. По умолчанию 10. Максимум 100.
-        db (Session): Сессия базы данных, автоматически внедряемая FastAPI.
+        cursor (Optional[str]): Курсор next_cursor предыдущей страницы того же поиска.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        MemeSearchResponse: Найденные мемы и курсор следующей страницы.
+
+    Raises:
+        HTTPException: Если курсор некорректен или произошла ошибка при поиске.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        return FastJSONResponse(await meme_service.search_memes_payload(q, page_size, cursor=cursor))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/memes/{id}/image", response_class=RangeFileResponse)
+async def get_meme_image(
+    id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Получение изображения мема через API с поддержкой Range-запросов.
+
+    Изображения кэшируются на локальном диске сервиса, поэтому повторные запросы не обращаются к MinIO.
+
+    Args:
+        id (int): Идентификатор мема.
+        request (Request): Входящий запрос с заголовками Range, If-Range и If-None-Match.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
         minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
 
     Returns:
-        PaginatedMemesResponse: Объект ответа с пагинированными мемами.
+        RangeFileResponse: Изображение целиком (200), его часть (206), ответ 416 для недопустимого диапазона
+            или пустой ответ 304.
 
     Raises:
-        HTTPException: Если произошла ошибка при получении мемов.
+        HTTPException: Если мем или его изображение не найдены.
     """
     try:
         meme_service = MemeService(db, minio_service)
-        return meme_service.get_paginated_memes(page, page_size)
+        image = await meme_service.open_meme_image(id)
+        if not image:
+            raise HTTPException(status_code=404, detail="Meme not found")
+        cached, file = image
+        if is_not_modified(request, cached.etag, None):
+            file.close()
+            return not_modified(cached.etag, None)
+        return RangeFileResponse(
+            file,
+            cached.size,
+            cached.content_type,
+            cached.etag,
+            range_header=request.headers.get("range"),
+            if_range=request.headers.get("if-range"),
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
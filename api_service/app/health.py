@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import get_replica_session_factory, get_session_factory
+from app.config import READINESS_TIMEOUT
+from app.minio_service import MinioService, current_minio_service
+from app.models.health_responses import ReadinessResponse
+from app.models.message_response import MessageResponse
+
+logger = logging.getLogger("resources")
+
+router = APIRouter(tags=["health"])
+
+
+def get_storage() -> Optional[MinioService]:
+    # Unlike get_minio_service, never creates the client or retries the bucket check inline
+    return current_minio_service()
+
+
+async def check_database(session_factory: async_sessionmaker, timeout: float = READINESS_TIMEOUT) -> str:
+    """
+    Проверка, что пул базы данных может выдать соединение. Запросы к таблицам не выполняются:
+    соединение только берется из пула (с pre-ping, если он включен) и сразу возвращается.
+
+    Args:
+        session_factory (async_sessionmaker): Фабрика сессий проверяемой базы данных.
+        timeout (float): Максимальное время ожидания соединения в секундах.
+
+    Returns:
+        str: "ok" или описание ошибки.
+    """
+
+    async def checkout() -> None:
+        async with session_factory() as db:
+            await db.connection()
+
+    try:
+        await asyncio.wait_for(checkout(), timeout)
+        return "ok"
+    except asyncio.TimeoutError:
+        return f"no connection within {timeout:g}s"
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+
+async def check_storage(minio_service: Optional[MinioService], timeout: float = READINESS_TIMEOUT) -> str:
+    """
+    Проверка готовности хранилища. Если бакет уже проверен при старте, запросов к MinIO нет,
+    иначе проверка бакета повторяется в пуле потоков хранилища.
+
+    Args:
+        minio_service (Optional[MinioService]): Общий MinioService процесса или None, если он еще не создан.
+        timeout (float): Максимальное время проверки бакета в секундах.
+
+    Returns:
+        str: "ok" или описание ошибки.
+    """
+    if minio_service is None:
+        return "storage client is not initialized"
+    if minio_service.bucket_ready:
+        return "ok"
+    try:
+        ready = await asyncio.wait_for(minio_service.run("bucket", minio_service.ensure_bucket_exists, "memes"), timeout)
+    except asyncio.TimeoutError:
+        return f"bucket check did not finish within {timeout:g}s"
+    except Exception as e:
+        return str(e) or type(e).__name__
+    return "ok" if ready else "bucket is not available"
+
+
+@router.get("/healthz", response_model=MessageResponse)
+async def healthz():
+    """
+    Проверка, что процесс жив и обрабатывает запросы. Зависимости не проверяются.
+
+    Returns:
+        MessageResponse: Сообщение "ok".
+    """
+    return MessageResponse(message="ok")
+
+
+@router.get("/readyz", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readyz(
+    primary: async_sessionmaker = Depends(get_session_factory),
+    replica: async_sessionmaker = Depends(get_replica_session_factory),
+    minio_service: Optional[MinioService] = Depends(get_storage),
+):
+    """
+    Проверка, что сервис готов принимать запросы: пулы базы данных выдают соединения и хранилище доступно.
+
+    Args:
+        primary (async_sessionmaker): Фабрика сессий основной базы данных, автоматически внедряемая FastAPI.
+        replica (async_sessionmaker): Фабрика сессий реплики, автоматически внедряемая FastAPI.
+        minio_service (Optional[MinioService]): Общий MinioService процесса, автоматически внедряемый FastAPI.
+
+    Returns:
+        ReadinessResponse: Результаты проверок. Код 503, если хотя бы одна зависимость не готова.
+    """
+    checks = [check_database(primary), check_storage(minio_service)]
+    names = ["database", "storage"]
+    # Without DATABASE_REPLICA_URL both factories are bound to the same engine
+    if replica.kw.get("bind") is not primary.kw.get("bind"):
+        checks.append(check_database(replica))
+        names.append("replica")
+    results = dict(zip(names, await asyncio.gather(*checks)))
+    ready = all(result == "ok" for result in results.values())
+    if not ready:
+        logger.warning(f"Readiness check failed: {results}")
+    response = ReadinessResponse(ready=ready, checks=results)
+    return response if ready else JSONResponse(response.model_dump(), status_code=503)
@@ -0,0 +1,256 @@
+import hashlib
+import struct
+from typing import Generator, Iterable, NamedTuple, Optional, Tuple
+from fastapi import HTTPException, status
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+# JPEG start-of-frame markers carry the image size; C4, C8 and CC share the range but are not frames
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+_JPEG_STANDALONE_MARKERS = frozenset({0x01, *range(0xD0, 0xD8)})
+
+# Parser requests: read n bytes and get them back, or skip n bytes without buffering them
+_READ, _SKIP = 0, 1
+
+
+class ImageMetadata(NamedTuple):
+    """
+    Сведения об изображении, полученные при загрузке.
+
+    Attributes:
+        content_type (str): Тип изображения по сигнатуре: image/png, image/jpeg или image/gif.
+        width (int): Ширина в пикселях.
+        height (int): Высота в пикселях.
+        frames (int): Количество кадров: для GIF и APNG по содержимому файла, для остальных 1.
+        size (int): Размер файла в байтах.
+        checksum (str): SHA-256 содержимого в hex.
+    """
+
+    content_type: str
+    width: int
+    height: int
+    frames: int
+    size: int
+    checksum: str
+
+
+class _Header(NamedTuple):
+    content_type: str
+    width: int
+    height: int
+    frames: int
+
+
+def _invalid_image() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="File content is not a valid PNG, JPG, or GIF image.",
+    )
+
+
+class ImageInspector:
+    """
+    Потоковая проверка изображения: по мере поступления частей файла проверяет сигнатуру и разбирает
+    заголовки PNG, JPEG и GIF, одновременно считая SHA-256 и размер. Пиксельные данные не декодируются
+    и не накапливаются: пропускаемые блоки только хэшируются, поэтому расход памяти не зависит от размера файла.
+
+    Attributes:
+        expected_type (Optional[str]): Заявленный тип изображения, с которым должна совпасть сигнатура.
+            Если не задан, подходит любой из PNG, JPEG и GIF.
+        size (int): Количество полученных байтов.
+    """
+
+    def __init__(self, expected_type: Optional[str] = None):
+        self.expected_type = expected_type
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._buffer = bytearray()
+        self._header: Optional[_Header] = None
+        self._content_type: Optional[str] = None
+        # GIF frames seen so far, for a file that ends without its trailer
+        self._partial: Optional[_Header] = None
+        self._failed = False
+        self._parser = self._parse()
+        self._request: Optional[Tuple[int, int]] = next(self._parser)
+
+    def update(self, chunk: bytes) -> None:
+        """
+        Обработка очередной части файла.
+
+        Args:
+            chunk (bytes): Часть файла.
+        """
+        self.size += len(chunk)
+        self._digest.update(chunk)
+        view = memoryview(chunk)
+        while self._request is not None and view:
+            kind, amount = self._request
+            if kind == _SKIP:
+                taken = min(amount, len(view))
+                view = view[taken:]
+                if taken < amount:
+                    self._request = (_SKIP, amount - taken)
+                    return
+                self._advance(None)
+                continue
+            taken = min(amount - len(self._buffer), len(view))
+            self._buffer += view[:taken]
+            view = view[taken:]
+            if len(self._buffer) == amount:
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                self._advance(data)
+
+    def _advance(self, data: Optional[bytes]) -> None:
+        try:
+            self._request = self._parser.send(data)
+            while self._request == (_SKIP, 0):
+                self._request = self._parser.send(None)
+        except StopIteration as stop:
+            self._request = None
+            self._header = stop.value
+            self._failed = stop.value is None
+
+    def check_signature(self) -> None:
+        """
+        Ранняя проверка по уже полученным байтам: файл начинается с сигнатуры PNG, JPEG или GIF,
+        совпадающей с заявленным типом, и разобранная часть заголовков корректна.
+
+        Raises:
+            HTTPException: Если файл не является изображением допустимого формата или заявленного типа.
+        """
+        if self._failed:
+            raise _invalid_image()
+        if self.expected_type and self._content_type and self._content_type != self.expected_type:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File content is {self._content_type}, not {self.expected_type}.",
+            )
+
+    def finish(self) -> ImageMetadata:
+        """
+        Завершение проверки после последней части файла.
+
+        Returns:
+            ImageMetadata: Сведения об изображении.
+
+        Raises:
+            HTTPException: Если файл не является изображением допустимого формата или заявленного типа,
+                или его заголовки обрезаны.
+        """
+        self.check_signature()
+        header = self._header
+        if header is None and self._request is not None:
+            # Like browsers, accept a GIF cut short after a complete frame header
+            header = self._partial
+        if header is None or not header.width or not header.height:
+            raise _invalid_image()
+        return ImageMetadata(
+            content_type=header.content_type,
+            width=header.width,
+            height=header.height,
+            frames=max(header.frames, 1),
+            size=self.size,
+            checksum=self._digest.hexdigest(),
+        )
+
+    def _parse(self) -> Generator[Tuple[int, int], Optional[bytes], Optional[_Header]]:
+        signature = yield (_READ, 3)
+        if signature == JPEG_SIGNATURE:
+            self._content_type = "image/jpeg"
+            return (yield from self._parse_jpeg())
+        signature += yield (_READ, 3)
+        if signature in GIF_SIGNATURES:
+            self._content_type = "image/gif"
+            return (yield from self._parse_gif())
+        signature += yield (_READ, 2)
+        if signature == PNG_SIGNATURE:
+            self._content_type = "image/png"
+            return (yield from self._parse_png())
+        return None
+
+    def _parse_png(self) -> Generator[Tuple[int, int], Optional[bytes], Optional[_Header]]:
+        length, chunk_type = struct.unpack(">I4s", (yield (_READ, 8)))
+        if chunk_type != b"IHDR" or length < 8:
+            return None
+        width, height = struct.unpack(">II", (yield (_READ, 8)))
+        yield (_SKIP, length - 8 + 4)
+        # Animated PNGs declare their frame count in acTL, which must come before the image data
+        while True:
+            length, chunk_type = struct.unpack(">I4s", (yield (_READ, 8)))
+            if chunk_type == b"acTL" and length >= 8:
+                frames = struct.unpack(">I", (yield (_READ, 8))[:4])[0]
+                return _Header("image/png", width, height, frames)
+            if chunk_type in (b"IDAT", b"IEND"):
+                return _Header("image/png", width, height, 1)
+            yield (_SKIP, length + 4)
+
+    def _parse_jpeg(self) -> Generator[Tuple[int, int], Optional[bytes], Optional[_Header]]:
+        # The signature already consumed the 0xFF of the first marker after SOI
+        while True:
+            marker = (yield (_READ, 1))[0]
+            while marker == 0xFF:
+                marker = (yield (_READ, 1))[0]
+            if marker in _JPEG_STANDALONE_MARKERS:
+                pass
+            elif marker in _JPEG_SOF_MARKERS:
+                _, _, height, width = struct.unpack(">HBHH", (yield (_READ, 7)))
+                return _Header("image/jpeg", width, height, 1)
+            elif marker in (0xD9, 0xDA):
+                # End of image or start of scan before any frame header
+                return None
+            else:
+                length = struct.unpack(">H", (yield (_READ, 2)))[0]
+                if length < 2:
+                    return None
+                yield (_SKIP, length - 2)
+            if (yield (_READ, 1)) != b"\xff":
+                return None
+
+    def _parse_gif(self) -> Generator[Tuple[int, int], Optional[bytes], Optional[_Header]]:
+        width, height, flags = struct.unpack("<HHB", (yield (_READ, 7))[:5])
+        if flags & 0x80:
+            yield (_SKIP, 3 << ((flags & 0x07) + 1))
+        frames = 0
+        while True:
+            introducer = (yield (_READ, 1))[0]
+            if introducer == 0x3B:
+                return _Header("image/gif", width, height, frames)
+            if introducer == 0x2C:
+                frames += 1
+                self._partial = _Header("image/gif", width, height, frames)
+                flags = (yield (_READ, 9))[8]
+                if flags & 0x80:
+                    yield (_SKIP, 3 << ((flags & 0x07) + 1))
+                # LZW minimum code size precedes the data sub-blocks
+                yield (_SKIP, 1)
+            elif introducer == 0x21:
+                yield (_SKIP, 1)
+            else:
+                return None
+            while block_size := (yield (_READ, 1))[0]:
+                yield (_SKIP, block_size)
+
+
+def inspect_chunks(chunks: Iterable[bytes], expected_type: Optional[str] = None) -> ImageMetadata:
+    """
+    Проверка изображения, доступного как последовательность частей (файл или поток из MinIO).
+
+    Args:
+        chunks (Iterable[bytes]): Части файла по порядку.
+        expected_type (Optional[str]): Заявленный тип изображения.
+
+    Returns:
+        ImageMetadata: Сведения об изображении.
+
+    Raises:
+        HTTPException: Если содержимое не является изображением допустимого формата или заявленного типа.
+    """
+    inspector = ImageInspector(expected_type)
+    for chunk in chunks:
+        inspector.update(chunk)
+        inspector.check_signature()
+    return inspector.finish()
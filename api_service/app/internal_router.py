@@ -1,97 +1,617 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from app.models.message_response import MessageResponse
-from app.models.meme_responses import PaginatedMemesResponse, MemeResponse
+from app.models.meme_responses import (
+    BatchCreateResponse,
+    MemeResponse,
+    MemeSearchResponse,
+    MemesLookupRequest,
+    MemesLookupResponse,
+    PaginatedMemesResponse,
+)
+from app.models.storage_responses import DedupStatsResponse, StorageGCStatsResponse
+from app.models.upload_responses import DirectUploadRequest, DirectUploadResponse
 from app.minio_service import MinioService
+from app.config import MAX_BATCH_SIZE, THUMBNAILS_ENABLED
 from app.services.meme_service import MemeService
-from app import get_db, get_minio_service
+from app.services.derivative_service import generate_variants_in_background
+from app.services.export_service import ExportService
+from app.services.idempotency_service import request_fingerprint, run_idempotent
+from app.services.resumable_upload_service import TUS_VERSION, ResumableUploadService, parse_upload_metadata
+from app.services.storage_gc_service import StorageGCService
+from app.upload_pipeline import upload_checksum
+from app.serialization import FastJSONResponse
+from app.range_response import RangeFileResponse
+from app.conditional import is_not_modified, not_modified, set_validators
+from app.pagination import CountStrategy, MemeFilter, MemeSortField, SortOrder, get_meme_filter
+from app import get_db, get_minio_service, get_read_db, get_read_session_factory
+from app.db_routing import mark_write
 
 router = APIRouter()
 
 
 @router.get("/memes", response_model=PaginatedMemesResponse)
 async def get_memes(
+    request: Request,
     page: int = Query(default=1, gt=0, description="Номер страницы."),
     page_size: int = Query(default=10, gt=0, le=100, description="Количество мемов на странице."),
-    db: Session = Depends(get_db),
+    sort_by: MemeSortField = Query(default=MemeSortField.id, description="Поле сортировки."),
+    order: SortOrder = Query(default=SortOrder.asc, description="Направление сортировки."),
+    cursor: Optional[str] = Query(default=None, description="Курсор next_cursor предыдущей страницы."),
+    count: Optional[CountStrategy] = Query(default=None, description="Способ подсчета общего количества мемов."),
+    meme_filter: MemeFilter = Depends(get_meme_filter),
+    db: AsyncSession = Depends(get_read_db),
     minio_service: MinioService = Depends(get_minio_service),
 ):
     """
-    Получение списка мемов с пагинацией.
+    Получение списка мемов с пагинацией по номеру страницы или по курсору.
+
+    На запросы с If-None-Match отвечает 304 Not Modified, если версия данных мемов не менялась.
+
+    Args:
+        request (Request): Входящий запрос с условными заголовками.
+        page (int): Номер страницы. По умолчанию 1. Игнорируется, если передан курсор.
+        page_size (int): Количество мемов на странице. По умолчанию 10. Максимум 100.
+        sort_by (MemeSortField): Поле сортировки: id, created_at, updated_at, size, width или height.
+            По умолчанию id. При сортировке по size, width или height выводятся только мемы
+            со сведениями об изображении.
+        order (SortOrder): Направление сортировки: asc или desc. По умолчанию asc.
+        cursor (Optional[str]): Курсор next_cursor предыдущей страницы.
+        count (Optional[CountStrategy]): Способ подсчета total: exact, counter, estimate или none.
+            По умолчанию берется из конфигурации.
+        meme_filter (MemeFilter): Ограничения min_/max_ по размеру файла (size) и размерам изображения
+            (width, height). С ними total всегда считается точно.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        PaginatedMemesResponse: Объект ответа с пагинированными мемами или пустой ответ 304.
+
+    Raises:
+        HTTPException: Если курсор некорректен или произошла ошибка при получении мемов.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        etag, version = await meme_service.get_list_validators()
+        if etag is not None and is_not_modified(request, etag, None):
+            return not_modified(etag, None)
+        response = FastJSONResponse(
+            await meme_service.get_paginated_memes_payload(
+                page, page_size, sort_by, order, cursor, count, meme_filter
+            )
+        )
+        if etag is not None:
+            set_validators(response, etag, None)
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/memes/search", response_model=MemeSearchResponse)
+async def search_memes(
+    q: str = Query(min_length=1, max_length=100, description="Поисковая строка."),
+    page_size: int = Query(default=10, gt=0, le=100, description="Количество мемов на странице."),
+    cursor: Optional[str] = Query(default=None, description="Курсор next_cursor предыдущей страницы."),
+    db: AsyncSession = Depends(get_read_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Поиск мемов по подстроке или нечеткому совпадению названия. Результаты отсортированы по сходству.
 
     Args:
-        page (int): Номер страницы. По умолчанию 1.
+        q (str): Поисковая строка.
         page_size (int): Количество мемов на странице. По умолчанию 10. Максимум 100.
-        db (Session): Сессия базы данных, автоматически внедряемая FastAPI.
+        cursor (Optional[str]): Курсор next_cursor предыдущей страницы того же поиска.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
         minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
 
     Returns:
-        PaginatedMemesResponse: Объект ответа с пагинированными мемами.
+        MemeSearchResponse: Найденные мемы и курсор следующей страницы.
+
+    Raises:
+        HTTPException: Если курсор некорректен или произошла ошибка при поиске.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        return FastJSONResponse(await meme_service.search_memes_payload(q, page_size, cursor=cursor))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/memes/export", response_class=StreamingResponse)
+async def export_memes(
+    updated_since: Optional[datetime] = Query(default=None, description="Только мемы, измененные не раньше."),
+    updated_before: Optional[datetime] = Query(default=None, description="Только мемы, измененные раньше."),
+    include_urls: bool = Query(default=False, description="Добавить presigned URL изображений."),
+    session_factory: async_sessionmaker = Depends(get_read_session_factory),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Потоковая выгрузка всех мемов в формате NDJSON с постоянным расходом памяти.
+
+    Args:
+        updated_since (Optional[datetime]): Только мемы, измененные не раньше этого времени.
+        updated_before (Optional[datetime]): Только мемы, измененные раньше этого времени.
+        include_urls (bool): Добавлять ли presigned URL изображений. По умолчанию нет.
+        session_factory (async_sessionmaker): Фабрика сессий базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        StreamingResponse: Поток строк application/x-ndjson, по одному мему на строку.
+    """
+    export_service = ExportService(session_factory, minio_service)
+    return StreamingResponse(
+        export_service.stream_ndjson(updated_since, updated_before, include_urls),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/memes/lookup", response_model=MemesLookupResponse)
+async def lookup_memes(
+    request: MemesLookupRequest,
+    db: AsyncSession = Depends(get_read_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Получение нескольких мемов по идентификаторам за один запрос.
+
+    Args:
+        request (MemesLookupRequest): Идентификаторы мемов в нужном порядке.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        MemesLookupResponse: Найденные мемы в порядке запроса и идентификаторы, которые не найдены.
 
     Raises:
         HTTPException: Если произошла ошибка при получении мемов.
     """
     try:
         meme_service = MemeService(db, minio_service)
-        return meme_service.get_paginated_memes(page, page_size)
+        return FastJSONResponse(await meme_service.get_memes_by_ids_payload(request.ids))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/memes/{id}", response_model=MemeResponse)
 async def get_meme(
-    id: int, db: Session = Depends(get_db), minio_service: MinioService = Depends(get_minio_service)
+    id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    minio_service: MinioService = Depends(get_minio_service),
 ):
     """
     Получение мема по его идентификатору.
 
+    Условный запрос проверяется до генерации presigned URL: если мем не менялся, сразу возвращается 304.
+
     Args:
         id (int): Идентификатор мема.
-        db (Session): Сессия базы данных, автоматически внедряемая FastAPI.
+        request (Request): Входящий запрос с условными заголовками.
+        response (Response): Ответ, в который добавляются ETag и Last-Modified.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
         minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
 
     Returns:
-        MemeResponse: Объект ответа с информацией о меме.
+        MemeResponse: Объект ответа с информацией о меме или пустой ответ 304.
 
     Raises:
         HTTPException: Если мем не найден.
     """
     try:
         meme_service = MemeService(db, minio_service)
-        meme = meme_service.get_meme_by_id(id)
+        validators = await meme_service.get_meme_validators(id)
+        if not validators:
+            raise HTTPException(status_code=404, detail="Meme not found")
+        etag, last_modified = validators
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+        set_validators(response, etag, last_modified)
+        meme = await meme_service.get_meme_by_id(id)
         if not meme:
             raise HTTPException(status_code=404, detail="Meme not found")
         return meme
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/memes/{id}/image", response_class=RangeFileResponse)
+async def get_meme_image(
+    id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Получение изображения мема через API с поддержкой Range-запросов.
+
+    Изображения кэшируются на локальном диске сервиса, поэтому повторные запросы не обращаются к MinIO.
+
+    Args:
+        id (int): Идентификатор мема.
+        request (Request): Входящий запрос с заголовками Range, If-Range и If-None-Match.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        RangeFileResponse: Изображение целиком (200), его часть (206), ответ 416 для недопустимого диапазона
+            или пустой ответ 304.
+
+    Raises:
+        HTTPException: Если мем или его изображение не найдены.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        image = await meme_service.open_meme_image(id)
+        if not image:
+            raise HTTPException(status_code=404, detail="Meme not found")
+        cached, file = image
+        if is_not_modified(request, cached.etag, None):
+            file.close()
+            return not_modified(cached.etag, None)
+        return RangeFileResponse(
+            file,
+            cached.size,
+            cached.content_type,
+            cached.etag,
+            range_header=request.headers.get("range"),
+            if_range=request.headers.get("if-range"),
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/memes", response_model=MemeResponse)
 async def create_meme(
+    response: Response,
+    background_tasks: BackgroundTasks,
     title: str = Form(..., description="Название мема."),
     file: UploadFile = File(..., description="Файл изображения мема."),
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255, description="Ключ идемпотентности."),
+    db: AsyncSession = Depends(get_db),
     minio_service: MinioService = Depends(get_minio_service),
 ):
     """
     Создание нового мема.
 
+    С заголовком Idempotency-Key повтор запроса возвращает сохраненный ответ и не создает мем еще раз.
+
     Args:
+        response (Response): Ответ, в который добавляется отметка о записи (следующие чтения клиента идут с primary).
+        background_tasks (BackgroundTasks): Фоновые задачи; после ответа запускается генерация миниатюр.
         title (str): Название мема.
         file (UploadFile): Файл изображения мема.
-        db (Session): Сессия базы данных, автоматически внедряемая FastAPI.
+        idempotency_key (Optional[str]): Значение заголовка Idempotency-Key.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
         minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
 
     Returns:
         MemeResponse: Объект ответа с информацией о созданном меме.
 
     Raises:
-        HTTPException: Если произошла ошибка при создании мема.
+        HTTPException: Если произошла ошибка при создании мема или ключ идемпотентности уже занят.
     """
     try:
         meme_service = MemeService(db, minio_service)
-        meme = meme_service.create_meme(title, file)
+        # Only requests with a key are compared, so only they pay for hashing the file
+        checksum = await upload_checksum(file) if idempotency_key else None
+        fingerprint = request_fingerprint(title, file.filename, file.content_type, file.size, checksum)
+        result = await run_idempotent(
+            db,
+            idempotency_key,
+            "POST /memes",
+            fingerprint,
+            lambda save: meme_service.create_meme(title, file, before_commit=save),
+        )
+        if isinstance(result, Response):
+            mark_write(result)
+            return result
+        mark_write(response)
+        if THUMBNAILS_ENABLED:
+            background_tasks.add_task(generate_variants_in_background, result.id, minio_service)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/memes/batch", response_model=BatchCreateResponse)
+async def create_memes_batch(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    titles: List[str] = Form(..., description="Названия мемов в порядке файлов."),
+    files: List[UploadFile] = File(..., description="Файлы изображений мемов."),
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Пакетное создание мемов: файлы загружаются параллельно, строки вставляются одной транзакцией.
+
+    Args:
+        response (Response): Ответ, в который добавляется отметка о записи (следующие чтения клиента идут с primary).
+        background_tasks (BackgroundTasks): Фоновые задачи; после ответа запускается генерация миниатюр.
+        titles (List[str]): Названия мемов; i-е название относится к i-му файлу.
+        files (List[UploadFile]): Файлы изображений мемов.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        BatchCreateResponse: Результаты по каждому элементу, включая ошибки отдельных элементов.
+
+    Raises:
+        HTTPException: Если количество названий и файлов не совпадает, пакет слишком большой
+            или не удалось сохранить мемы.
+    """
+    if len(titles) != len(files):
+        raise HTTPException(status_code=400, detail="The number of titles must match the number of files.")
+    if len(files) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_SIZE} memes.")
+    try:
+        meme_service = MemeService(db, minio_service)
+        result = await meme_service.create_memes_batch(list(zip(titles, files)))
+        if result.created:
+            mark_write(response)
+        if THUMBNAILS_ENABLED:
+            for item in result.items:
+                if item.meme is not None:
+                    background_tasks.add_task(generate_variants_in_background, item.meme.id, minio_service)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/memes/uploads", response_model=DirectUploadResponse)
+async def start_direct_upload(
+    upload: DirectUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Начало загрузки изображения напрямую в MinIO: выдача POST-политики с ограничениями типа и размера файла.
+
+    Args:
+        upload (DirectUploadRequest): Название мема и тип изображения.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        DirectUploadResponse: Адрес и поля формы для загрузки в MinIO и идентификатор загрузки.
+
+    Raises:
+        HTTPException: Если тип изображения не поддерживается или не удалось выдать политику.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        return await meme_service.start_direct_upload(upload.title, upload.content_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/memes/uploads/{token}/complete", response_model=MemeResponse)
+async def complete_direct_upload(
+    token: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Завершение загрузки напрямую в MinIO: проверка загруженного файла и создание мема.
+
+    Args:
+        token (str): Идентификатор загрузки из ответа POST /memes/uploads.
+        response (Response): Ответ, в который добавляется отметка о записи (следующие чтения клиента идут с primary).
+        background_tasks (BackgroundTasks): Фоновые задачи; после ответа запускается генерация миниатюр.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        MemeResponse: Объект ответа с информацией о созданном меме.
+
+    Raises:
+        HTTPException: Если загрузка не найдена или истекла, файл не загружен или не соответствует политике.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        meme = await meme_service.complete_direct_upload(token)
+        mark_write(response)
+        if THUMBNAILS_ENABLED:
+            background_tasks.add_task(generate_variants_in_background, meme.id, minio_service)
         return meme
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/memes/resumable", status_code=status.HTTP_201_CREATED, response_class=Response)
+async def create_resumable_upload(
+    upload_length: int = Header(..., description="Полный размер файла в байтах."),
+    upload_metadata: Optional[str] = Header(default=None, description="Метаданные tus: title и filetype в base64."),
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Начало загрузки изображения по частям в стиле протокола tus.
+
+    Название мема и тип изображения передаются в Upload-Metadata (ключи title и filetype). Адрес загрузки
+    возвращается в заголовке Location; байты отправляются запросами PATCH на этот адрес.
+
+    Args:
+        upload_length (int): Полный размер файла в байтах (заголовок Upload-Length).
+        upload_metadata (Optional[str]): Заголовок Upload-Metadata.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        Response: Пустой ответ 201 с заголовком Location.
+
+    Raises:
+        HTTPException: Если метаданные, тип или размер файла некорректны или произошла ошибка при создании загрузки.
+    """
+    try:
+        metadata = parse_upload_metadata(upload_metadata)
+        upload_service = ResumableUploadService(db, minio_service)
+        upload = await upload_service.create_upload(
+            metadata.get("title", ""), metadata.get("filetype", ""), upload_length
+        )
+        return Response(
+            status_code=status.HTTP_201_CREATED,
+            headers={"Location": f"/memes/resumable/{upload.id}", "Tus-Resumable": TUS_VERSION},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.head("/memes/resumable/{upload_id}", response_class=Response)
+async def get_resumable_upload_offset(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Получение смещения, с которого нужно продолжить загрузку по частям.
+
+    Args:
+        upload_id (str): Идентификатор загрузки.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        Response: Пустой ответ с заголовками Upload-Offset и Upload-Length.
+
+    Raises:
+        HTTPException: Если загрузка не найдена или истекла.
+    """
+    try:
+        upload = await ResumableUploadService(db, minio_service).get_upload(upload_id)
+        return Response(
+            headers={
+                "Upload-Offset": str(upload.received),
+                "Upload-Length": str(upload.length),
+                "Tus-Resumable": TUS_VERSION,
+                "Cache-Control": "no-store",
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.patch("/memes/resumable/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
+async def append_resumable_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., description="Смещение фрагмента в байтах."),
+    content_type: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Прием очередного фрагмента файла. Тело запроса передается как application/offset+octet-stream.
+
+    Если соединение оборвалось, принятые байты сохраняются: клиент запрашивает смещение через HEAD
+    и продолжает с него.
+
+    Args:
+        upload_id (str): Идентификатор загрузки.
+        request (Request): Запрос с телом фрагмента.
+        upload_offset (int): Смещение фрагмента (заголовок Upload-Offset); должно совпадать с принятыми байтами.
+        content_type (Optional[str]): Тип тела запроса.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        Response: Пустой ответ 204 с новым значением Upload-Offset.
+
+    Raises:
+        HTTPException: Если тип тела неверен, загрузка не найдена или истекла, смещение не совпадает
+            или фрагмент выходит за размер файла.
+    """
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream.",
+        )
+    try:
+        upload_service = ResumableUploadService(db, minio_service)
+        received = await upload_service.append(upload_id, upload_offset, request.stream())
+        return Response(
+            status_code=status.HTTP_204_NO_CONTENT,
+            headers={"Upload-Offset": str(received), "Tus-Resumable": TUS_VERSION},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/memes/resumable/{upload_id}/complete", response_model=MemeResponse)
+async def complete_resumable_upload(
+    upload_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
+):
+    """
+    Создание мема из полностью принятой загрузки по частям. Повторный вызов возвращает тот же мем.
+
+    Args:
+        upload_id (str): Идентификатор загрузки.
+        response (Response): Ответ, в который добавляется отметка о записи (следующие чтения клиента идут с primary).
+        background_tasks (BackgroundTasks): Фоновые задачи; после ответа запускается генерация миниатюр.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        MemeResponse: Объект ответа с информацией о созданном меме.
+
+    Raises:
+        HTTPException: Если загрузка не найдена, истекла или приняты не все байты.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        meme = await meme_service.complete_resumable_upload(upload_id)
+        mark_write(response)
+        if THUMBNAILS_ENABLED:
+            background_tasks.add_task(generate_variants_in_background, meme.id, minio_service)
+        return meme
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -99,47 +619,74 @@ async def create_meme(
 @router.put("/memes/{id}", response_model=MemeResponse)
 async def update_meme(
     id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
     title: str = Form(..., description="Новое название мема."),
     file: UploadFile = File(None, description="Новый файл изображения мема."),
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255, description="Ключ идемпотентности."),
+    db: AsyncSession = Depends(get_db),
     minio_service: MinioService = Depends(get_minio_service),
 ):
     """
     Обновление существующего мема.
 
+    С заголовком Idempotency-Key повтор запроса возвращает сохраненный ответ и не обновляет мем еще раз.
+
     Args:
         id (int): Идентификатор мема.
+        response (Response): Ответ, в который добавляется отметка о записи (следующие чтения клиента идут с primary).
+        background_tasks (BackgroundTasks): Фоновые задачи; при замене изображения запускается генерация миниатюр.
         title (str): Новое название мема.
         file (UploadFile, optional): Новый файл изображения мема.
-        db (Session): Сессия базы данных, автоматически внедряемая FastAPI.
+        idempotency_key (Optional[str]): Значение заголовка Idempotency-Key.
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
         minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
 
     Returns:
         MemeResponse: Объект ответа с информацией о меме.
 
     Raises:
-        HTTPException: Если мем не найден или произошла ошибка при обновлении мема.
+        HTTPException: Если мем не найден, произошла ошибка при обновлении мема или ключ идемпотентности уже занят.
     """
     try:
         meme_service = MemeService(db, minio_service)
-        meme = meme_service.update_meme(id, title, file)
-        if not meme:
-            raise HTTPException(status_code=404, detail="Meme not found")
-        return meme
+
+        async def update(save: Optional[Callable[[MemeResponse], Awaitable[None]]]) -> MemeResponse:
+            meme = await meme_service.update_meme(id, title, file, before_commit=save)
+            if not meme:
+                raise HTTPException(status_code=404, detail="Meme not found")
+            return meme
+
+        checksum = await upload_checksum(file) if file and idempotency_key else None
+        fingerprint = request_fingerprint(title, file and (file.filename, file.content_type, file.size, checksum))
+        result = await run_idempotent(db, idempotency_key, f"PUT /memes/{id}", fingerprint, update)
+        if isinstance(result, Response):
+            mark_write(result)
+            return result
+        mark_write(response)
+        if file and THUMBNAILS_ENABLED:
+            background_tasks.add_task(generate_variants_in_background, result.id, minio_service)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/memes/{id}", response_model=MessageResponse)
 async def delete_meme(
-    id: int, db: Session = Depends(get_db), minio_service: MinioService = Depends(get_minio_service)
+    id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    minio_service: MinioService = Depends(get_minio_service),
 ):
     """
     Удаление мема по его идентификатору.
 
     Args:
         id (int): Идентификатор мема.
-        db (Session): Сессия базы данных, автоматически внедряемая FastAPI.
+        response (Response): Ответ, в который добавляется отметка о записи (следующие чтения клиента идут с primary).
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
         minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
 
     Returns:
@@ -150,9 +697,60 @@ async def delete_meme(
     """
     try:
         meme_service = MemeService(db, minio_service)
-        success = meme_service.delete_meme(id)
+        success = await meme_service.delete_meme(id)
         if not success:
             raise HTTPException(status_code=404, detail="Meme not found")
+        mark_write(response)
         return MessageResponse(message="Meme deleted successfully")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/storage/dedup", response_model=DedupStatsResponse)
+async def get_dedup_stats(
+    db: AsyncSession = Depends(get_read_db), minio_service: MinioService = Depends(get_minio_service)
+):
+    """
+    Статистика дедупликации изображений: сколько байт не пришлось загружать и хранить повторно.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        DedupStatsResponse: Объект ответа со статистикой дедупликации.
+
+    Raises:
+        HTTPException: Если произошла ошибка при получении статистики.
+    """
+    try:
+        meme_service = MemeService(db, minio_service)
+        return await meme_service.get_dedup_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/storage/gc", response_model=StorageGCStatsResponse)
+async def get_storage_gc_stats(
+    db: AsyncSession = Depends(get_read_db), minio_service: MinioService = Depends(get_minio_service)
+):
+    """
+    Состояние очереди удаления объектов MinIO и объем, освобожденный фоновым удалением.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных, автоматически внедряемая FastAPI.
+        minio_service (MinioService): Клиент MinIO для работы с файловым хранилищем, автоматически внедряемый FastAPI.
+
+    Returns:
+        StorageGCStatsResponse: Объект ответа со статистикой очереди удаления.
+
+    Raises:
+        HTTPException: Если произошла ошибка при получении статистики.
+    """
+    try:
+        gc_service = StorageGCService(db, minio_service)
+        return await gc_service.get_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple
+from app.config import MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_WORKERS, MEDIA_CHUNK_SIZE
+from app.minio_service import MinioService
+
+
+class CachedObject(NamedTuple):
+    """
+    Объект MinIO, сохраненный на локальном диске.
+    """
+
+    path: str
+    size: int
+    content_type: str
+    etag: str
+
+
+class MediaCache:
+    """
+    LRU-кэш объектов MinIO на локальном диске с ограничением по суммарному размеру файлов.
+
+    Одновременные промахи по одному объекту объединяются в одно скачивание. Объекты больше
+    max_bytes не кэшируются: каждый запрос скачивает их во временный файл.
+
+    Attributes:
+        directory (str): Каталог с файлами кэша. Очищается при создании.
+        max_bytes (int): Максимальный суммарный размер файлов в байтах.
+        size (int): Текущий суммарный размер файлов в байтах.
+        hits (int): Количество попаданий в кэш.
+        misses (int): Количество скачиваний из MinIO.
+        collapsed (int): Количество промахов, дождавшихся чужого скачивания.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, chunk_size: int = MEDIA_CHUNK_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self._entries: "OrderedDict[Tuple[str, str], CachedObject]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+    def _file_path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self.directory, hashlib.sha256("/".join(key).encode()).hexdigest())
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Tuple[CachedObject, BinaryIO]]:
+        # The file is opened under the lock, so eviction cannot remove it in between
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            try:
+                file = open(entry.path, "rb")
+            except FileNotFoundError:
+                del self._entries[key]
+                self.size -= entry.size
+                return None
+            self._entries.move_to_end(key)
+            return entry, file
+
+    def _download(self, minio_service: MinioService, key: Tuple[str, str]) -> Tuple[str, int, str, Optional[str]]:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                size, content_type, etag = minio_service.download_to_file(*key, file, chunk_size=self.chunk_size)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path, size, content_type, etag
+
+    def _admit(
+        self, key: Tuple[str, str], tmp_path: str, size: int, content_type: str, etag: Optional[str]
+    ) -> Tuple[CachedObject, BinaryIO, bool]:
+        # Open before publishing: an open file survives eviction of its path
+        file = open(tmp_path, "rb")
+        etag = f'"{etag}"' if etag else f'"{hashlib.sha256("/".join(key).encode()).hexdigest()[:32]}"'
+        if size > self.max_bytes:
+            os.unlink(tmp_path)
+            return CachedObject(path=tmp_path, size=size, content_type=content_type, etag=etag), file, False
+        entry = CachedObject(path=self._file_path(key), size=size, content_type=content_type, etag=etag)
+        with self._lock:
+            os.replace(tmp_path, entry.path)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                try:
+                    os.unlink(evicted.path)
+                except FileNotFoundError:
+                    pass
+        return entry, file, True
+
+    async def open(self, minio_service: MinioService, bucket_name: str, object_name: str) -> Tuple[CachedObject, BinaryIO]:
+        """
+        Открытие объекта из кэша или скачивание его из MinIO.
+
+        Args:
+            minio_service (MinioService): Сервис MinIO.
+            bucket_name (str): Название бакета.
+            object_name (str): Путь к объекту в бакете.
+
+        Returns:
+            Tuple[CachedObject, BinaryIO]: Описание объекта и открытый на чтение файл, который нужно закрыть.
+
+        Raises:
+            S3Error: Если объект не удалось получить из MinIO.
+        """
+        key = (bucket_name, object_name)
+        share = True
+        while True:
+            hit = self._lookup(key)
+            if hit is not None:
+                self.hits += 1
+                return hit
+            pending = self._inflight.get(key)
+            if pending is not None and share:
+                self.collapsed += 1
+                # False: the object was too large to cache or the download failed, so fetch it separately
+                share = await asyncio.shield(pending)
+                continue
+            self.misses += 1
+            future = asyncio.get_running_loop().create_future()
+            if pending is None:
+                self._inflight[key] = future
+            cached = False
+            try:
+                downloaded = await minio_service.run("download", self._download, minio_service, key)
+                entry, file, cached = await asyncio.to_thread(self._admit, key, *downloaded)
+                return entry, file
+            finally:
+                future.set_result(cached)
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики кэша.
+
+        Returns:
+            Dict[str, int]: Количество и суммарный размер файлов, попадания, промахи и объединенные промахи.
+        """
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "entries": entries,
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+        }
+
+    def close(self) -> None:
+        """
+        Удаление файлов кэша.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_media_cache: Optional[MediaCache] = None
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale_directories(root: str) -> None:
+    """
+    Удаление подкаталогов кэша, оставшихся от завершившихся процессов: после перезапуска
+    воркера его каталог больше никто не использует и не очищает.
+
+    Args:
+        root (str): Общий каталог кэша, в котором подкаталоги названы по PID процессов.
+    """
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.isdigit() and int(name) != os.getpid() and not _process_exists(int(name)):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def get_media_cache() -> MediaCache:
+    """
+    Общий для процесса кэш изображений. Каждый процесс использует свой подкаталог MEDIA_CACHE_DIR
+    и долю MEDIA_CACHE_MAX_BYTES, поэтому все воркеры вместе не превышают общий лимит.
+
+    Returns:
+        MediaCache: Кэш изображений.
+    """
+    global _media_cache
+    if _media_cache is None:
+        remove_stale_directories(MEDIA_CACHE_DIR)
+        _media_cache = MediaCache(
+            os.path.join(MEDIA_CACHE_DIR, str(os.getpid())), MEDIA_CACHE_MAX_BYTES // MEDIA_CACHE_WORKERS
+        )
+    return _media_cache
+
+
+def current_media_cache() -> Optional[MediaCache]:
+    """
+    Кэш изображений процесса, если он уже создан. В отличие от get_media_cache, не очищает каталог кэша.
+
+    Returns:
+        Optional[MediaCache]: Кэш изображений или None.
+    """
+    return _media_cache
+
+
+def close_media_cache() -> None:
+    """
+    Удаление файлов кэша изображений при остановке процесса.
+    """
+    global _media_cache
+    if _media_cache is not None:
+        _media_cache.close()
+        _media_cache = None
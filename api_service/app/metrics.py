@@ -0,0 +1,267 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import PROMETHEUS_MULTIPROC_DIR, SERVER_TIMING_ENABLED
+
+logger = logging.getLogger("resources")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса.",
+    ["method", "route", "status"],
+)
+REQUEST_PHASE_DURATION = Histogram(
+    "http_request_phase_seconds",
+    "Время запроса по фазам: db, db_pool, storage, presign, serialization и этапы MemeService.",
+    ["route", "phase"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Количество SQL-запросов на HTTP-запрос.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds", "Время получения соединения из пула базы данных.")
+STORAGE_GC_REMOVED = Counter("storage_gc_removed_objects", "Объекты, удаленные из MinIO фоновым удалением.")
+STORAGE_GC_RECLAIMED = Counter("storage_gc_reclaimed_bytes", "Объем, освобожденный фоновым удалением.")
+STORAGE_GC_FAILURES = Counter("storage_gc_failures", "Неудачные попытки удаления объектов из MinIO.")
+DEDUP_SKIPPED_UPLOADS = Counter("storage_dedup_skipped_uploads", "Загрузки, пропущенные дедупликацией.")
+DEDUP_SKIPPED_BYTES = Counter("storage_dedup_skipped_bytes", "Объем загрузок, пропущенных дедупликацией.")
+
+
+class RequestTimings:
+    """
+    Время текущего запроса по фазам и количество SQL-запросов.
+
+    Фазы могут пересекаться: этапы MemeService (например, count) включают время фазы db,
+    а параллельные операции с хранилищем суммируются.
+
+    Attributes:
+        phases (Dict[str, float]): Суммарное время по фазам в секундах.
+        queries (int): Количество выполненных SQL-запросов.
+    """
+
+    __slots__ = ("phases", "queries")
+
+    def __init__(self):
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.queries = 0
+
+    def server_timing(self, total: float) -> str:
+        """
+        Значение заголовка Server-Timing.
+
+        Args:
+            total (float): Полное время запроса в секундах.
+
+        Returns:
+            str: Фазы и полное время в миллисекундах.
+        """
+        entries = [
+            f'db;desc="{self.queries} queries";dur={self.phases["db"] * 1000:.2f}'
+            if phase == "db"
+            else f"{phase};dur={seconds * 1000:.2f}"
+            for phase, seconds in self.phases.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record(phase: str, seconds: float) -> None:
+    """
+    Учет времени фазы в текущем запросе. Вне запроса (фоновые задачи) ничего не делает.
+
+    Args:
+        phase (str): Название фазы.
+        seconds (float): Время в секундах.
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.phases[phase] += seconds
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Учет времени блока кода как фазы текущего запроса.
+
+    Args:
+        phase (str): Название фазы.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Подсчет SQL-запросов и их времени в текущем запросе.
+
+    Args:
+        engine (Engine): Синхронный движок SQLAlchemy (AsyncEngine.sync_engine).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.queries += 1
+            timings.phases["db"] += time.perf_counter() - context._metrics_started
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который учитывает время ожидания свободного соединения (включая открытие нового).
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            DB_POOL_WAIT.observe(waited)
+            record("db_pool", waited)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: длительность запросов и фаз в Prometheus и, если включено, заголовок Server-Timing.
+
+    Фазы ответов с ошибкой 5xx также пишутся в лог, так как роутеры превращают любое исключение
+    в 500 без подробностей.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    header = timings.server_timing(time.perf_counter() - started)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            self._observe(scope, timings, status_code, time.perf_counter() - started)
+
+    def _observe(self, scope: Scope, timings: RequestTimings, status_code: int, duration: float) -> None:
+        # Route templates keep label cardinality bounded; unknown paths share one label
+        route = getattr(scope.get("route"), "path", "unmatched")
+        REQUEST_DURATION.labels(scope["method"], route, str(status_code)).observe(duration)
+        REQUEST_DB_QUERIES.labels(route).observe(timings.queries)
+        for phase, seconds in timings.phases.items():
+            REQUEST_PHASE_DURATION.labels(route, phase).observe(seconds)
+        if status_code >= 500:
+            logger.error(
+                f"{scope['method']} {scope['path']} failed with {status_code} after {duration * 1000:.1f} ms: "
+                f"{timings.server_timing(duration)}"
+            )
+
+
+class ServiceStatsCollector:
+    """
+    Экспорт счетчиков, которые сервисы уже ведут сами: кэш presigned URL, операции с хранилищем,
+    кэш ответов и кэш изображений на диске.
+    """
+
+    def describe(self):
+        # Collected lazily: the services import the models, which are not ready while app/__init__ runs
+        return []
+
+    def collect(self):
+        from app.media_cache import current_media_cache
+        from app.minio_service import current_minio_service
+        from app.services.response_cache import list_response_cache
+
+        minio_service = current_minio_service()
+        if minio_service is not None:
+            url_cache = minio_service.url_cache.stats()
+            yield GaugeMetricFamily("presigned_url_cache_entries", "Записи в кэше presigned URL.", value=url_cache["size"])
+            yield CounterMetricFamily("presigned_url_cache_hits", "Попадания в кэш presigned URL.", value=url_cache["hits"])
+            yield CounterMetricFamily("presigned_url_cache_misses", "Промахи кэша presigned URL.", value=url_cache["misses"])
+
+            operations = CounterMetricFamily("storage_operations", "Операции с хранилищем.", labels=["operation"])
+            queued = CounterMetricFamily(
+                "storage_queued_seconds", "Время ожидания потока для операций с хранилищем.", labels=["operation"]
+            )
+            io = CounterMetricFamily("storage_io_seconds", "Время операций с хранилищем.", labels=["operation"])
+            for operation, stats in minio_service.timings.stats().items():
+                operations.add_metric([operation], stats["count"])
+                queued.add_metric([operation], stats["queued_seconds"])
+                io.add_metric([operation], stats["io_seconds"])
+            yield from (operations, queued, io)
+
+        response_cache = list_response_cache.stats()
+        yield GaugeMetricFamily("response_cache_entries", "Записи в кэше ответов.", value=response_cache["size"])
+        yield CounterMetricFamily("response_cache_hits", "Попадания в кэш ответов.", value=response_cache["hits"])
+        yield CounterMetricFamily("response_cache_misses", "Промахи кэша ответов.", value=response_cache["misses"])
+
+        media_cache = current_media_cache()
+        if media_cache is not None:
+            stats = media_cache.stats()
+            yield GaugeMetricFamily("media_cache_entries", "Файлы в кэше изображений.", value=stats["entries"])
+            yield GaugeMetricFamily("media_cache_bytes", "Объем кэша изображений.", value=stats["bytes"])
+            yield CounterMetricFamily("media_cache_hits", "Попадания в кэш изображений.", value=stats["hits"])
+            yield CounterMetricFamily("media_cache_misses", "Скачивания изображений из MinIO.", value=stats["misses"])
+            yield CounterMetricFamily(
+                "media_cache_collapsed", "Промахи, дождавшиеся чужого скачивания.", value=stats["collapsed"]
+            )
+
+
+REGISTRY.register(ServiceStatsCollector())
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """
+    Метрики в текстовом формате Prometheus.
+
+    Если задан PROMETHEUS_MULTIPROC_DIR (несколько воркеров gunicorn), счетчики и гистограммы запросов
+    суммируются по всем воркерам, а счетчики кэшей и хранилища, которые каждый процесс ведет сам, не отдаются.
+
+    Args:
+        request (Request): HTTP-запрос.
+
+    Returns:
+        Response: Метрики.
+    """
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
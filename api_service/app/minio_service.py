@@ -1,23 +1,203 @@
+import asyncio
+import io
 import logging
-from fastapi import HTTPException, status
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+import urllib3
+from urllib3.connection import HTTPConnection
 from minio import Minio
+from minio.datatypes import Part, PostPolicy
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
-from app.config import MINIO_ROOT_USER, MINIO_ROOT_PASSWORD
+from app.image_metadata import ImageMetadata, inspect_chunks
+from app.config import (
+    MINIO_ROOT_USER,
+    MINIO_ROOT_PASSWORD,
+    MINIO_ENDPOINT,
+    MINIO_SECURE,
+    MINIO_POOL_MAXSIZE,
+    MINIO_CONNECT_TIMEOUT,
+    MINIO_READ_TIMEOUT,
+    MINIO_MAX_RETRIES,
+    MINIO_REGION,
+    PRESIGNED_URL_EXPIRES,
+    PRESIGNED_URL_CACHE_TTL,
+    PRESIGNED_URL_CACHE_SIZE,
+    STORAGE_MAX_CONCURRENCY,
+)
+from app.metrics import record
 
 logger = logging.getLogger("resources")
 
 
+def create_http_client() -> urllib3.PoolManager:
+    """
+    Создание пула HTTP-соединений для клиента MinIO.
+
+    Returns:
+        urllib3.PoolManager: Пул соединений с keep-alive, таймаутами и повторами из конфигурации.
+    """
+    return urllib3.PoolManager(
+        maxsize=MINIO_POOL_MAXSIZE,
+        timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT, read=MINIO_READ_TIMEOUT),
+        retries=urllib3.Retry(
+            total=MINIO_MAX_RETRIES,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504],
+        ),
+        socket_options=HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+    )
+
+
+class PresignedUrlCache:
+    """
+    Потокобезопасный LRU-кэш presigned URL с ограниченным временем жизни записей.
+
+    Attributes:
+        max_size (int): Максимальное количество записей.
+        ttl (float): Время жизни записи в секундах.
+        hits (int): Количество попаданий в кэш.
+        misses (int): Количество промахов.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        """
+        Получение URL из кэша. Просроченная запись удаляется и считается промахом.
+
+        Args:
+            key (Tuple[str, str]): Пара (бакет, путь к объекту).
+
+        Returns:
+            Optional[str]: URL или None, если записи нет.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Tuple[str, str], url: str) -> None:
+        """
+        Сохранение URL в кэш с вытеснением самых давно использованных записей.
+
+        Args:
+            key (Tuple[str, str]): Пара (бакет, путь к объекту).
+            url (str): Presigned URL.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (url, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Tuple[str, str]) -> None:
+        """
+        Удаление записи из кэша.
+
+        Args:
+            key (Tuple[str, str]): Пара (бакет, путь к объекту).
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики кэша.
+
+        Returns:
+            Dict[str, int]: Размер кэша, количество попаданий и промахов.
+        """
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def create_presigned_url_cache() -> PresignedUrlCache:
+    # Cached URLs must stay valid for a long time after they are served, so the TTL
+    # never exceeds half of the presign expiry.
+    ttl = min(PRESIGNED_URL_CACHE_TTL, PRESIGNED_URL_EXPIRES // 2)
+    return PresignedUrlCache(max_size=PRESIGNED_URL_CACHE_SIZE, ttl=ttl)
+
+
+class StorageTimings:
+    """
+    Потокобезопасная статистика операций с хранилищем: время ожидания в очереди executor
+    и время самой операции ввода-вывода учитываются раздельно.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Dict[str, float]] = {}
+
+    def record(self, operation: str, queued: float, io: float) -> None:
+        """
+        Учет одной операции.
+
+        Args:
+            operation (str): Название операции, например "upload".
+            queued (float): Время ожидания свободного потока в секундах.
+            io (float): Время выполнения операции в секундах.
+        """
+        with self._lock:
+            stats = self._operations.setdefault(
+                operation, {"count": 0, "queued_seconds": 0.0, "io_seconds": 0.0, "max_queued_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["queued_seconds"] += queued
+            stats["io_seconds"] += io
+            stats["max_queued_seconds"] = max(stats["max_queued_seconds"], queued)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Накопленная статистика по операциям.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Количество, суммарное время в очереди и в вводе-выводе по каждой операции.
+        """
+        with self._lock:
+            return {operation: dict(stats) for operation, stats in self._operations.items()}
+
+
 class MinioService:
-    def __init__(self, client=None):
+    def __init__(self, client=None, url_cache: Optional[PresignedUrlCache] = None):
         # Initialize minio client with an endpoint and access/secret keys.
+        self._http_client = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.bucket_ready = False
+        self.url_cache = url_cache or create_presigned_url_cache()
+        self.timings = StorageTimings()
         if client:
             self.client = client
         else:
+            self._http_client = create_http_client()
             self.client = Minio(
-                endpoint="minio:9000",
+                endpoint=MINIO_ENDPOINT,
                 access_key=MINIO_ROOT_USER,
                 secret_key=MINIO_ROOT_PASSWORD,
-                secure=False,  # Set to True if you use https
+                secure=MINIO_SECURE,
+                # A pinned region keeps presigning local instead of asking MinIO for the bucket location.
+                region=MINIO_REGION,
+                http_client=self._http_client,
             )
             self.ensure_bucket_exists("memes")
 
@@ -30,22 +210,280 @@ class MinioService:
                 logger.info(f"Bucket '{bucket_name}' created successfully.")
             else:
                 logger.info(f"Bucket '{bucket_name}' already exists.")
+            self.bucket_ready = True
         except S3Error as e:
             logger.error(f"An error occurred while checking/creating the bucket: {e}")
+        except urllib3.exceptions.HTTPError as e:
+            logger.error(f"MinIO is not reachable while checking the bucket: {e}")
+        return self.bucket_ready
+
+    def close(self):
+        # Stop the storage executor and release pooled connections if the client was created by this service.
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._http_client is not None:
+            self._http_client.clear()
+            self._http_client = None
+
+    async def run(self, operation: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполнение блокирующей операции с хранилищем в ограниченном пуле потоков, не блокируя event loop.
+
+        Число одновременных операций ограничено STORAGE_MAX_CONCURRENCY; остальные ждут в очереди executor.
+
+        Args:
+            operation (str): Название операции для статистики.
+            func (Callable[..., Any]): Блокирующая функция.
+            *args: Позиционные аргументы функции.
+            **kwargs: Именованные аргументы функции.
+
+        Returns:
+            Any: Результат функции.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=STORAGE_MAX_CONCURRENCY, thread_name_prefix="storage")
+        submitted = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.timings.record(operation, queued=started - submitted, io=time.perf_counter() - started)
 
-    def get_presigned_url(self, bucket_name, object_name):
-        # Generate a presigned URL to access the object
         try:
-            presigned_url = self.client.presigned_get_object(bucket_name, object_name)
-            logger.info(f"Presigned URL for '{object_name}' in bucket '{bucket_name}' is generated.")
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            # Signing is local CPU work, everything else is a round trip to MinIO
+            record("presign" if operation == "presign" else "storage", time.perf_counter() - submitted)
+
+    def get_presigned_url(self, bucket_name, object_name):
+        # Generate a presigned URL to access the object, reusing a cached one while it is fresh
+        presigned_url = self.url_cache.get((bucket_name, object_name))
+        if presigned_url is not None:
             return presigned_url
+        return self._presign(bucket_name, object_name)
+
+    def _presign(self, bucket_name, object_name, remember=True):
+        # Sign a GET URL and remember it in the cache unless asked not to
+        try:
+            presigned_url = self.client.presigned_get_object(
+                bucket_name, object_name, expires=timedelta(seconds=PRESIGNED_URL_EXPIRES)
+            )
+            logger.debug(f"Presigned URL for '{object_name}' in bucket '{bucket_name}' is generated.")
         except S3Error as e:
             logger.error(f"Failed to generate presigned URL: {e}")
             return None
+        if remember:
+            self.url_cache.set((bucket_name, object_name), presigned_url)
+        return presigned_url
+
+    async def get_presigned_urls_async(
+        self, objects: Iterable[Tuple[str, str]], remember: bool = True
+    ) -> List[Optional[str]]:
+        """
+        Получение presigned URL для нескольких объектов. Попадания в кэш обслуживаются сразу,
+        промахи подписываются одной задачей в пуле потоков.
+
+        Args:
+            objects (Iterable[Tuple[str, str]]): Пары (бакет, путь к объекту).
+            remember (bool): Сохранять ли новые URL в кэш. Массовые выгрузки передают False,
+                чтобы не вытеснять из кэша часто запрашиваемые мемы.
+
+        Returns:
+            List[Optional[str]]: URL в том же порядке, что и объекты.
+        """
+        objects = list(objects)
+        urls = [self.url_cache.get(key) for key in objects]
+        missing = [index for index, url in enumerate(urls) if url is None]
+        if missing:
+            signed = await self.run(
+                "presign", lambda: [self._presign(*objects[index], remember=remember) for index in missing]
+            )
+            for index, url in zip(missing, signed):
+                urls[index] = url
+        return urls
+
+    async def get_presigned_url_async(self, bucket_name: str, object_name: str) -> Optional[str]:
+        # Generate a presigned URL without blocking the event loop
+        return (await self.get_presigned_urls_async([(bucket_name, object_name)]))[0]
+
+    def invalidate_presigned_url(self, bucket_name, object_name):
+        # Drop a cached URL for an object that was replaced or deleted
+        self.url_cache.invalidate((bucket_name, object_name))
+
+    def bucket_url(self, bucket_name: str) -> str:
+        # Address that browser POST uploads are sent to
+        return f"{'https' if MINIO_SECURE else 'http'}://{MINIO_ENDPOINT}/{bucket_name}"
+
+    def presign_post_policy(
+        self, bucket_name: str, object_name: str, content_type: str, max_size: int, expires_at: datetime
+    ) -> Dict[str, str]:
+        # Form fields that let a client upload exactly this object with the given content type and size limit
+        policy = PostPolicy(bucket_name, expires_at)
+        policy.add_equals_condition("key", object_name)
+        policy.add_equals_condition("Content-Type", content_type)
+        policy.add_content_length_range_condition(1, max_size)
+        return {"key": object_name, "Content-Type": content_type, **self.client.presigned_post_policy(policy)}
+
+    def put_bytes(self, bucket_name: str, object_name: str, data: bytes, content_type: str) -> None:
+        # Upload a small object in a single request
+        self.client.put_object(bucket_name, object_name, io.BytesIO(data), length=len(data), content_type=content_type)
 
-    def upload_to_minio(self, bucket_name: str, minio_path: str, file_data: str) -> str:
+    def get_object_bytes(self, bucket_name: str, object_name: str) -> bytes:
+        # Download a whole object into memory
+        response = self.client.get_object(bucket_name, object_name)
         try:
-            self.client.put_object(bucket_name, minio_path, file_data, length=-1, part_size=10 * 1024 * 1024)
-            return minio_path
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def inspect_object(
+        self, bucket_name: str, object_name: str, expected_type: Optional[str], chunk_size: int = 256 * 1024
+    ) -> Optional[ImageMetadata]:
+        # Stream an image object once to validate it and read its metadata; None if it does not exist
+        try:
+            response = self.client.get_object(bucket_name, object_name)
         except S3Error as e:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return inspect_chunks(response.stream(chunk_size), expected_type)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def download_to_file(
+        self, bucket_name: str, object_name: str, file: BinaryIO, chunk_size: int = 256 * 1024
+    ) -> Tuple[int, str, Optional[str]]:
+        # Copy an object into a file chunk by chunk; returns its size, content type and S3 ETag
+        response = self.client.get_object(bucket_name, object_name)
+        try:
+            size = 0
+            for chunk in response.stream(chunk_size):
+                file.write(chunk)
+                size += len(chunk)
+            content_type = response.headers.get("Content-Type") or "application/octet-stream"
+            etag = response.headers.get("ETag")
+            return size, content_type, etag.strip('"') if etag else None
+        finally:
+            response.close()
+            response.release_conn()
+
+    # Multipart uploads whose parts come from separate reads or requests (stream_to_minio, resumable uploads)
+    # have no public API in the minio client: these methods call its private helpers, so the minio version
+    # is pinned exactly in requirements.txt and must be checked against them before an upgrade.
+
+    def create_multipart_upload(self, bucket_name: str, object_name: str, content_type: str) -> str:
+        # Start a multipart upload and return its upload id
+        return self.client._create_multipart_upload(bucket_name, object_name, {"Content-Type": content_type})
+
+    def upload_part(self, bucket_name: str, object_name: str, upload_id: str, part_number: int, data: bytes) -> Part:
+        # Upload one part of a multipart upload
+        etag = self.client._upload_part(bucket_name, object_name, data, None, upload_id, part_number)
+        return Part(part_number, etag)
+
+    def complete_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str, parts: List[Part]) -> None:
+        # Assemble uploaded parts into the final object
+        self.client._complete_multipart_upload(
+            bucket_name, object_name, upload_id, sorted(parts, key=lambda part: part.part_number)
+        )
+
+    def abort_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str) -> None:
+        # Discard the parts of an unfinished multipart upload
+        self.client._abort_multipart_upload(bucket_name, object_name, upload_id)
+
+    def remove_object(self, bucket_name: str, object_name: str) -> None:
+        # Remove an object and forget its cached URL
+        self.client.remove_object(bucket_name, object_name)
+        self.invalidate_presigned_url(bucket_name, object_name)
+
+    async def remove_object_async(self, bucket_name: str, object_name: str) -> None:
+        # Remove an object without blocking the event loop
+        await self.run("remove", self.remove_object, bucket_name, object_name)
+
+    def remove_objects(self, bucket_name: str, object_names: List[str]) -> Dict[str, str]:
+        # Remove objects with bulk DeleteObjects requests; returns errors by object name, missing objects count as removed
+        errors = {}
+        for error in self.client.remove_objects(bucket_name, [DeleteObject(name) for name in object_names]):
+            if error.code != "NoSuchKey":
+                errors[error.name] = f"{error.code}: {error.message}"
+        for name in object_names:
+            if name not in errors:
+                self.invalidate_presigned_url(bucket_name, name)
+        return errors
+
+    def get_object_sizes(self, objects: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        # Look up sizes of existing objects; missing objects are left out
+        sizes = {}
+        for bucket_name, object_name in objects:
+            try:
+                sizes[(bucket_name, object_name)] = self.client.stat_object(bucket_name, object_name).size
+            except S3Error as e:
+                if e.code != "NoSuchKey":
+                    raise
+        return sizes
+
+    def list_objects_page(
+        self, bucket_name: str, start_after: Optional[str] = None, limit: int = 1000
+    ) -> List[Tuple[str, int, Optional[datetime]]]:
+        # One chunk of the bucket listing in key order: (object name, size, last modified)
+        page = []
+        for obj in self.client.list_objects(bucket_name, recursive=True, start_after=start_after):
+            page.append((obj.object_name, obj.size, obj.last_modified))
+            if len(page) >= limit:
+                break
+        return page
+
+
+# Process-wide service shared by all requests; created once on application startup.
+_minio_service: Optional[MinioService] = None
+
+
+def init_minio_service() -> MinioService:
+    """
+    Создание общего для процесса MinioService и проверка бакета.
+
+    Returns:
+        MinioService: Общий экземпляр сервиса.
+    """
+    global _minio_service
+    if _minio_service is None:
+        _minio_service = MinioService()
+    return _minio_service
+
+
+def get_shared_minio_service() -> MinioService:
+    """
+    Получение общего MinioService. Если бакет не удалось проверить при старте, проверка повторяется.
+
+    Returns:
+        MinioService: Общий экземпляр сервиса.
+    """
+    service = init_minio_service()
+    if not service.bucket_ready:
+        service.ensure_bucket_exists("memes")
+    return service
+
+
+def current_minio_service() -> Optional[MinioService]:
+    """
+    Общий MinioService, если он уже создан. В отличие от init_minio_service, не создает клиент.
+
+    Returns:
+        Optional[MinioService]: Общий экземпляр сервиса или None.
+    """
+    return _minio_service
+
+
+def close_minio_service() -> None:
+    """
+    Закрытие общего MinioService и освобождение пула соединений.
+    """
+    global _minio_service
+    if _minio_service is not None:
+        _minio_service.close()
+        _minio_service = None
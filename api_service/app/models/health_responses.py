@@ -0,0 +1,15 @@
+from typing import Dict
+from pydantic import BaseModel
+
+
+class ReadinessResponse(BaseModel):
+    """
+    ReadinessResponse представляет собой модель данных для ответа о готовности сервиса принимать запросы.
+
+    Attributes:
+        ready (bool): Готовы ли все зависимости.
+        checks (Dict[str, str]): Результат проверки каждой зависимости: "ok" или описание ошибки.
+    """
+
+    ready: bool
+    checks: Dict[str, str]
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app import Base
+
+
+class IdempotencyKey(Base):
+    """
+    IdempotencyKey хранит результат запроса с заголовком Idempotency-Key, чтобы повтор того же запроса
+    вернул сохраненный ответ, а не выполнил изменение еще раз.
+
+    Attributes:
+        key (str): Значение заголовка Idempotency-Key.
+        scope (str): Метод и путь запроса, например "PUT /memes/1".
+        fingerprint (str): SHA-256 параметров запроса; повтор ключа с другими параметрами отклоняется.
+        claim (str): Случайная метка запроса, который выполняется с этим ключом. Результат сохраняет
+            только запрос с той же меткой, поэтому перехваченный повтором запрос не запишет свой результат.
+        status_code (Optional[int]): Код сохраненного ответа. None, пока запрос выполняется.
+        response_body (Optional[str]): Тело сохраненного ответа в JSON.
+        created_at (datetime): Время начала выполнения запроса.
+        expires_at (datetime): Время, после которого ключ удаляется и может быть использован снова.
+    """
+    __tablename__ = "idempotency_key"
+    __table_args__ = (Index("ix_idempotency_key_expires_at", "expires_at"),)
+
+    key = Column(String(255), primary_key=True)
+    scope = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    claim = Column(String(32), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
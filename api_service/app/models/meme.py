@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, BigInteger, Column, Integer, String, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import validates
@@ -14,15 +14,41 @@ class Meme(Base):
         title (str): Название мема.
         minio_bucket (str): Название бакета MinIO, в котором хранится мем.
         minio_path (str): Путь к файлу мема в бакете MinIO.
+        content_hash (Optional[str]): SHA-256 изображения, если оно хранится с дедупликацией (см. MemeBlob).
+        width (Optional[int]): Ширина изображения в пикселях.
+        height (Optional[int]): Высота изображения в пикселях.
+        frames (Optional[int]): Количество кадров (больше 1 у анимированных GIF и PNG).
+        size (Optional[int]): Размер файла изображения в байтах.
+        checksum (Optional[str]): SHA-256 файла изображения.
+            Сведения об изображении записываются при загрузке; у мемов, созданных раньше, они пустые.
         created_at (datetime): Время создания мема.
         updated_at (datetime): Время последнего обновления мема.
     """
     __tablename__ = "meme"
+    __table_args__ = (
+        # Keyset pagination scans these indexes for every supported sort order
+        Index("ix_meme_created_at_id", "created_at", "id"),
+        Index("ix_meme_updated_at_id", "updated_at", "id"),
+        # Sorting and min/max filters on image metadata
+        Index("ix_meme_size_id", "size", "id"),
+        Index("ix_meme_width_id", "width", "id"),
+        Index("ix_meme_height_id", "height", "id"),
+        # The orphan reconciler checks listed object keys against stored paths
+        Index("ix_meme_minio_path", "minio_path"),
+        # Trigram index for substring and fuzzy title search; a plain index elsewhere
+        Index("ix_meme_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(255), nullable=False)
     minio_bucket = Column(String(255), nullable=False)
     minio_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    frames = Column(Integer, nullable=True)
+    size = Column(BigInteger, nullable=True)
+    checksum = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -0,0 +1,28 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app import Base
+
+
+class MemeBlob(Base):
+    """
+    MemeBlob описывает изображение, которое хранится в MinIO под ключом из его SHA-256
+    и может использоваться несколькими мемами.
+
+    Attributes:
+        sha256 (str): SHA-256 содержимого в hex.
+        minio_bucket (str): Название бакета MinIO.
+        minio_path (str): Путь к объекту в бакете MinIO.
+        size (int): Размер объекта в байтах.
+        ref_count (int): Количество мемов, ссылающихся на объект.
+        created_at (datetime): Время первой загрузки.
+    """
+    __tablename__ = "meme_blob"
+    __table_args__ = (Index("ix_meme_blob_minio_path", "minio_path"),)
+
+    sha256 = Column(String(64), primary_key=True)
+    minio_bucket = Column(String(255), nullable=False)
+    minio_path = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, HttpUrl
-from typing import List
+from pydantic import BaseModel, Field, HttpUrl
+from typing import Dict, List, Optional
 from datetime import datetime
+from app.config import MAX_LOOKUP_IDS
+from app.pagination import CountStrategy
 
 
 # Определение модели мема для ответа
@@ -14,6 +16,14 @@ class MemeResponse(BaseModel):
         minio_bucket (str): Название бакета MinIO, в котором хранится мем.
         minio_path (str): Путь к файлу мема в бакете MinIO.
         minio_url (HttpUrl): Ссылка на файл мема.
+        variants (Dict[str, HttpUrl]): Ссылки на уменьшенные варианты изображения по их названию.
+            Пока вариант не готов, вместо него отдается ссылка на оригинал.
+        width (Optional[int]): Ширина изображения в пикселях.
+        height (Optional[int]): Высота изображения в пикселях.
+        frames (Optional[int]): Количество кадров (больше 1 у анимированных GIF и PNG).
+        size (Optional[int]): Размер файла изображения в байтах.
+        checksum (Optional[str]): SHA-256 файла изображения.
+            Сведения об изображении записываются при загрузке; у мемов, созданных раньше, они равны None.
         created_at (datetime): Время создания мема.
         updated_at (datetime): Время последнего обновления мема.
     """
@@ -23,6 +33,12 @@ class MemeResponse(BaseModel):
     minio_bucket: str
     minio_path: str
     minio_url: HttpUrl
+    variants: Dict[str, HttpUrl] = {}
+    width: Optional[int] = None
+    height: Optional[int] = None
+    frames: Optional[int] = None
+    size: Optional[int] = None
+    checksum: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -37,12 +53,87 @@ class PaginatedMemesResponse(BaseModel):
 
     Attributes:
         items (List[MemeResponse]): Список мемов на текущей странице.
-        total (int): Общее количество мемов.
-        page (int): Номер текущей страницы.
+        total (Optional[int]): Общее количество мемов или None, если подсчет отключен.
+        total_strategy (CountStrategy): Способ, которым получено значение total.
+        page (Optional[int]): Номер текущей страницы. None при пагинации по курсору.
         page_size (int): Количество мемов на странице.
+        next_cursor (Optional[str]): Курсор следующей страницы или None, если страница последняя.
     """
 
     items: List[MemeResponse]
-    total: int
-    page: int
+    total: Optional[int]
+    total_strategy: CountStrategy = CountStrategy.exact
+    page: Optional[int]
     page_size: int
+    next_cursor: Optional[str] = None
+
+
+class MemeSearchResponse(BaseModel):
+    """
+    MemeSearchResponse представляет собой модель данных для ответа с результатами поиска мемов по названию.
+
+    Attributes:
+        items (List[MemeResponse]): Найденные мемы, от наиболее похожих к наименее похожим.
+        page_size (int): Количество мемов на странице.
+        next_cursor (Optional[str]): Курсор следующей страницы или None, если страница последняя.
+    """
+
+    items: List[MemeResponse]
+    page_size: int
+    next_cursor: Optional[str] = None
+
+
+class BatchItemResult(BaseModel):
+    """
+    BatchItemResult представляет собой модель данных для результата создания одного мема из пакета.
+
+    Attributes:
+        index (int): Позиция элемента в запросе.
+        status_code (int): HTTP-статус обработки элемента.
+        meme (Optional[MemeResponse]): Созданный мем, если элемент обработан успешно.
+        error (Optional[str]): Описание ошибки, если элемент не создан.
+    """
+
+    index: int
+    status_code: int
+    meme: Optional[MemeResponse] = None
+    error: Optional[str] = None
+
+
+class BatchCreateResponse(BaseModel):
+    """
+    BatchCreateResponse представляет собой модель данных для ответа на пакетное создание мемов.
+
+    Attributes:
+        items (List[BatchItemResult]): Результаты по каждому элементу в порядке запроса.
+        created (int): Количество созданных мемов.
+        failed (int): Количество элементов с ошибкой.
+    """
+
+    items: List[BatchItemResult]
+    created: int
+    failed: int
+
+
+class MemesLookupRequest(BaseModel):
+    """
+    MemesLookupRequest представляет собой модель данных для запроса нескольких мемов по идентификаторам.
+
+    Attributes:
+        ids (List[int]): Идентификаторы мемов в нужном порядке.
+    """
+
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_LOOKUP_IDS)
+
+
+class MemesLookupResponse(BaseModel):
+    """
+    MemesLookupResponse представляет собой модель данных для ответа с несколькими мемами.
+
+    Attributes:
+        items (List[MemeResponse]): Найденные мемы в порядке запроса.
+        not_found (List[int]): Идентификаторы, для которых мемы не найдены.
+    """
+
+    items: List[MemeResponse]
+    not_found: List[int]
@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, String
+
+from app import Base
+
+
+class MemeStats(Base):
+    """
+    MemeStats хранит счетчики по таблице мемов, которые поддерживаются операциями записи MemeService.
+
+    Attributes:
+        name (str): Название счетчика, например "total".
+        value (int): Значение счетчика.
+    """
+    __tablename__ = "meme_stats"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,41 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app import Base
+
+
+class MemeVariant(Base):
+    """
+    MemeVariant описывает производное изображение мема (например, миниатюру), сохраненное в MinIO.
+
+    Attributes:
+        id (int): Уникальный идентификатор варианта.
+        meme_id (int): Идентификатор мема.
+        name (str): Название варианта, например "thumb".
+        source_path (str): Путь к оригиналу, из которого получен вариант. Вариант актуален,
+            только пока он совпадает с текущим minio_path мема.
+        minio_bucket (str): Название бакета MinIO.
+        minio_path (str): Путь к файлу варианта в бакете MinIO.
+        content_type (str): MIME-тип варианта.
+        width (int): Ширина в пикселях.
+        height (int): Высота в пикселях.
+        size (int): Размер файла в байтах.
+        created_at (datetime): Время создания варианта.
+    """
+    __tablename__ = "meme_variant"
+    __table_args__ = (
+        UniqueConstraint("meme_id", "name", name="uq_meme_variant_meme_id_name"),
+        Index("ix_meme_variant_minio_path", "minio_path"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    meme_id = Column(Integer, ForeignKey("meme.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(64), nullable=False)
+    source_path = Column(String(255), nullable=False)
+    minio_bucket = Column(String(255), nullable=False)
+    minio_path = Column(String(255), nullable=False)
+    content_type = Column(String(64), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
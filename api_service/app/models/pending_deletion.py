@@ -0,0 +1,37 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app import Base
+
+
+class PendingDeletion(Base):
+    """
+    PendingDeletion описывает объект MinIO, который больше не нужен и ждет удаления в фоне.
+    Строка добавляется в той же транзакции, которая перестала ссылаться на объект. Каждый объект
+    стоит в очереди не больше одного раза.
+
+    Attributes:
+        id (int): Уникальный идентификатор записи.
+        minio_bucket (str): Название бакета MinIO.
+        minio_path (str): Путь к объекту в бакете MinIO.
+        size (Optional[int]): Размер объекта в байтах, если известен.
+        attempts (int): Количество неудачных попыток удаления.
+        last_error (Optional[str]): Ошибка последней попытки.
+        enqueued_at (datetime): Время постановки в очередь.
+        not_before (datetime): Время, раньше которого объект не удаляется (откладывается после ошибки).
+    """
+    __tablename__ = "pending_deletion"
+    __table_args__ = (
+        # The drainer takes the oldest due rows first
+        Index("ix_pending_deletion_not_before_id", "not_before", "id"),
+        UniqueConstraint("minio_bucket", "minio_path", name="uq_pending_deletion_minio_bucket_minio_path"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    minio_bucket = Column(String(255), nullable=False)
+    minio_path = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime(timezone=True), server_default=func.now())
+    not_before = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,38 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, String
+from sqlalchemy.sql import func
+
+from app import Base
+
+
+class PendingUpload(Base):
+    """
+    PendingUpload описывает загрузку изображения напрямую в MinIO, для которой выдана POST-политика,
+    но мем еще не создан. Строка удаляется при завершении загрузки или после истечения срока
+    вместе с загруженным объектом.
+
+    Attributes:
+        token (str): Случайный идентификатор загрузки, который клиент передает при завершении.
+        title (str): Название будущего мема.
+        minio_bucket (str): Название бакета MinIO.
+        minio_path (str): Путь, по которому клиент загружает объект.
+        content_type (str): Разрешенный тип содержимого.
+        max_size (int): Максимальный размер объекта в байтах.
+        created_at (datetime): Время выдачи политики.
+        expires_at (datetime): Время, после которого загрузку нельзя завершить и она удаляется.
+    """
+    __tablename__ = "pending_upload"
+    __table_args__ = (
+        # The garbage collector takes expired uploads first
+        Index("ix_pending_upload_expires_at", "expires_at"),
+        # The orphan reconciler checks listed object keys against stored paths
+        Index("ix_pending_upload_minio_path", "minio_path"),
+    )
+
+    token = Column(String(64), primary_key=True)
+    title = Column(String(255), nullable=False)
+    minio_bucket = Column(String(255), nullable=False)
+    minio_path = Column(String(255), nullable=False)
+    content_type = Column(String(64), nullable=False)
+    max_size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,57 @@
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app import Base
+
+
+class ResumableUpload(Base):
+    """
+    ResumableUpload описывает загрузку изображения по частям, которую можно продолжить после обрыва связи.
+
+    Полученные байты собираются в multipart upload MinIO частями по UPLOAD_PART_SIZE. Остаток меньше
+    части хранится отдельным объектом tail_path, пока не придут следующие байты.
+
+    Attributes:
+        id (str): Случайный идентификатор загрузки.
+        title (str): Название будущего мема.
+        content_type (str): Тип изображения.
+        minio_bucket (str): Название бакета MinIO.
+        minio_path (str): Путь к собираемому объекту.
+        length (int): Полный размер файла в байтах.
+        received (int): Количество принятых байтов (смещение, с которого клиент продолжает загрузку).
+        multipart_upload_id (str): Идентификатор multipart upload в MinIO.
+        parts (List[List]): Номера и ETag отправленных частей.
+        tail_path (Optional[str]): Объект с принятыми байтами, которые еще не вошли в часть.
+        tail_size (int): Размер объекта tail_path в байтах.
+        meme_id (Optional[int]): Идентификатор созданного мема, если загрузка завершена.
+        created_at (datetime): Время начала загрузки.
+        expires_at (datetime): Время, после которого загрузка без активности удаляется.
+    """
+    __tablename__ = "resumable_upload"
+    __table_args__ = (
+        # The garbage collector takes expired uploads first
+        Index("ix_resumable_upload_expires_at", "expires_at"),
+        # The orphan reconciler checks listed object keys against stored paths
+        Index("ix_resumable_upload_minio_path", "minio_path"),
+        Index("ix_resumable_upload_tail_path", "tail_path"),
+    )
+
+    id = Column(String(64), primary_key=True)
+    title = Column(String(255), nullable=False)
+    content_type = Column(String(64), nullable=False)
+    minio_bucket = Column(String(255), nullable=False)
+    minio_path = Column(String(255), nullable=False)
+    length = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0)
+    multipart_upload_id = Column(String(255), nullable=False)
+    parts = Column(JSON, nullable=False, default=list)
+    tail_path = Column(String(255), nullable=True)
+    tail_size = Column(BigInteger, nullable=False, default=0)
+    meme_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    @property
+    def assembled(self) -> bool:
+        # All bytes are received and the object is assembled in MinIO
+        return self.received == self.length
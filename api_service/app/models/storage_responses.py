@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class DedupStatsResponse(BaseModel):
+    """
+    DedupStatsResponse представляет собой модель данных для ответа со статистикой дедупликации изображений.
+
+    Attributes:
+        blobs (int): Количество уникальных изображений в хранилище.
+        references (int): Количество мемов, ссылающихся на эти изображения.
+        stored_bytes (int): Объем, который занимают уникальные изображения.
+        bytes_saved (int): Объем, который не пришлось загружать и хранить повторно.
+    """
+
+    blobs: int
+    references: int
+    stored_bytes: int
+    bytes_saved: int
+
+
+class StorageGCStatsResponse(BaseModel):
+    """
+    StorageGCStatsResponse представляет собой модель данных для ответа о фоновом удалении объектов из хранилища.
+
+    Attributes:
+        queue_depth (int): Количество объектов в очереди на удаление.
+        queued_bytes (int): Известный суммарный размер объектов в очереди.
+        failing (int): Количество объектов в очереди, удаление которых уже завершалось ошибкой.
+        oldest_enqueued_at (Optional[datetime]): Время постановки в очередь самого старого объекта.
+        bytes_reclaimed (int): Объем, освобожденный фоновым удалением за все время.
+        objects_reclaimed (int): Количество объектов, удаленных фоновым удалением за все время.
+    """
+
+    queue_depth: int
+    queued_bytes: int
+    failing: int
+    oldest_enqueued_at: Optional[datetime] = None
+    bytes_reclaimed: int
+    objects_reclaimed: int
@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Dict, Literal
+from pydantic import BaseModel, Field
+
+
+class DirectUploadRequest(BaseModel):
+    """
+    DirectUploadRequest представляет собой модель данных для запроса на загрузку изображения напрямую в MinIO.
+
+    Attributes:
+        title (str): Название будущего мема.
+        content_type (str): Тип изображения: image/png, image/jpeg или image/gif.
+    """
+
+    title: str = Field(..., min_length=1, max_length=255)
+    content_type: Literal["image/png", "image/jpeg", "image/gif"]
+
+
+class DirectUploadResponse(BaseModel):
+    """
+    DirectUploadResponse представляет собой модель данных для ответа с POST-политикой загрузки в MinIO.
+
+    Клиент отправляет файл запросом POST multipart/form-data на url со всеми полями fields и полем file
+    (последним), а затем завершает загрузку запросом POST /memes/uploads/{token}/complete.
+
+    Attributes:
+        token (str): Идентификатор загрузки.
+        url (str): Адрес бакета MinIO для загрузки.
+        fields (Dict[str, str]): Поля формы с подписанной политикой.
+        max_size (int): Максимальный размер файла в байтах.
+        expires_at (datetime): Время, после которого MinIO не примет файл по этой политике.
+        complete_by (datetime): Время, после которого загрузку нельзя завершить и она удаляется.
+    """
+
+    token: str
+    url: str
+    fields: Dict[str, str]
+    max_size: int
+    expires_at: datetime
+    complete_by: datetime
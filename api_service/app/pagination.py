@@ -0,0 +1,202 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, NamedTuple, Optional
+from fastapi import Query
+
+
+class MemeSortField(str, Enum):
+    """
+    Поля, по которым можно сортировать список мемов. Для каждого поля есть индекс (поле, id).
+
+    При сортировке по сведениям об изображении (size, width, height) в список попадают только мемы,
+    для которых эти сведения записаны при загрузке.
+    """
+
+    id = "id"
+    created_at = "created_at"
+    updated_at = "updated_at"
+    size = "size"
+    width = "width"
+    height = "height"
+
+
+# Sort keys that are integers in the cursor; the rest are datetimes
+INTEGER_SORT_FIELDS = frozenset({MemeSortField.id, MemeSortField.size, MemeSortField.width, MemeSortField.height})
+# Image metadata columns that may be empty for memes created before it was recorded
+METADATA_SORT_FIELDS = INTEGER_SORT_FIELDS - {MemeSortField.id}
+
+
+class SortOrder(str, Enum):
+    """
+    Направление сортировки.
+    """
+
+    asc = "asc"
+    desc = "desc"
+
+
+class InvalidCursorError(ValueError):
+    """
+    Курсор не удалось разобрать или он не соответствует параметрам сортировки.
+    """
+
+
+class Cursor(NamedTuple):
+    """
+    Позиция в отсортированном списке: значение ключа сортировки и id последнего элемента страницы.
+    """
+
+    sort_by: MemeSortField
+    order: SortOrder
+    value: Any
+    id: int
+
+
+class MemeFilter(NamedTuple):
+    """
+    Ограничения списка мемов по сведениям об изображении. Границы включаются; None - без ограничения.
+    Мемы без сведений об изображении не проходят ни одно ограничение.
+
+    Attributes:
+        min_size (Optional[int]): Минимальный размер файла в байтах.
+        max_size (Optional[int]): Максимальный размер файла в байтах.
+        min_width (Optional[int]): Минимальная ширина в пикселях.
+        max_width (Optional[int]): Максимальная ширина в пикселях.
+        min_height (Optional[int]): Минимальная высота в пикселях.
+        max_height (Optional[int]): Максимальная высота в пикселях.
+    """
+
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    min_width: Optional[int] = None
+    max_width: Optional[int] = None
+    min_height: Optional[int] = None
+    max_height: Optional[int] = None
+
+
+def get_meme_filter(
+    min_size: Optional[int] = Query(default=None, ge=0, description="Минимальный размер файла в байтах."),
+    max_size: Optional[int] = Query(default=None, ge=0, description="Максимальный размер файла в байтах."),
+    min_width: Optional[int] = Query(default=None, ge=0, description="Минимальная ширина в пикселях."),
+    max_width: Optional[int] = Query(default=None, ge=0, description="Максимальная ширина в пикселях."),
+    min_height: Optional[int] = Query(default=None, ge=0, description="Минимальная высота в пикселях."),
+    max_height: Optional[int] = Query(default=None, ge=0, description="Максимальная высота в пикселях."),
+) -> MemeFilter:
+    """
+    Сбор ограничений списка мемов из параметров запроса.
+
+    Returns:
+        MemeFilter: Ограничения по сведениям об изображении.
+    """
+    return MemeFilter(min_size, max_size, min_width, max_width, min_height, max_height)
+
+
+class SearchCursor(NamedTuple):
+    """
+    Позиция в результатах поиска: поисковая строка, оценка сходства и id последнего элемента страницы.
+    """
+
+    query: str
+    score: float
+    id: int
+
+
+def _encode_payload(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_payload(raw: str) -> Dict[str, Any]:
+    padded = raw + "=" * (-len(raw) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """
+    Кодирование курсора в непрозрачную строку.
+
+    Args:
+        cursor (Cursor): Позиция в списке.
+
+    Returns:
+        str: Строка курсора в base64url.
+    """
+    value = cursor.value.isoformat() if isinstance(cursor.value, datetime) else cursor.value
+    return _encode_payload({"s": cursor.sort_by.value, "o": cursor.order.value, "v": value, "i": cursor.id})
+
+
+def decode_cursor(raw: str) -> Cursor:
+    """
+    Разбор строки курсора.
+
+    Args:
+        raw (str): Строка курсора, полученная из next_cursor.
+
+    Returns:
+        Cursor: Позиция в списке.
+
+    Raises:
+        InvalidCursorError: Если строка не является корректным курсором.
+    """
+    try:
+        payload = _decode_payload(raw)
+        sort_by = MemeSortField(payload["s"])
+        order = SortOrder(payload["o"])
+        value = payload["v"]
+        if sort_by in INTEGER_SORT_FIELDS:
+            value = int(value)
+        else:
+            value = datetime.fromisoformat(value)
+        return Cursor(sort_by=sort_by, order=order, value=value, id=int(payload["i"]))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor.") from e
+
+
+def encode_search_cursor(cursor: SearchCursor) -> str:
+    """
+    Кодирование курсора поиска в непрозрачную строку.
+
+    Args:
+        cursor (SearchCursor): Позиция в результатах поиска.
+
+    Returns:
+        str: Строка курсора в base64url.
+    """
+    return _encode_payload({"q": cursor.query, "r": cursor.score, "i": cursor.id})
+
+
+def decode_search_cursor(raw: str) -> SearchCursor:
+    """
+    Разбор строки курсора поиска.
+
+    Args:
+        raw (str): Строка курсора, полученная из next_cursor результатов поиска.
+
+    Returns:
+        SearchCursor: Позиция в результатах поиска.
+
+    Raises:
+        InvalidCursorError: Если строка не является корректным курсором поиска.
+    """
+    try:
+        payload = _decode_payload(raw)
+        return SearchCursor(query=str(payload["q"]), score=float(payload["r"]), id=int(payload["i"]))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor.") from e
+
+
+class CountStrategy(str, Enum):
+    """
+    Способ получения общего количества мемов для ответа со списком.
+
+    exact - точный SELECT count(*); counter - счетчик, который поддерживают операции записи;
+    estimate - оценка планировщика из pg_class.reltuples; none - общее количество не считается.
+    """
+
+    exact = "exact"
+    counter = "counter"
+    estimate = "estimate"
+    none = "none"
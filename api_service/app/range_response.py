@@ -0,0 +1,131 @@
+import os
+from typing import BinaryIO, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app.config import MEDIA_CHUNK_SIZE
+
+
+class RangeNotSatisfiableError(ValueError):
+    """
+    Запрошенный диапазон байтов лежит за пределами файла.
+    """
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбор заголовка Range с одним диапазоном байтов.
+
+    Несколько диапазонов (multipart/byteranges) и некорректные заголовки игнорируются,
+    как разрешает RFC 9110: в ответ отдается весь файл.
+
+    Args:
+        header (Optional[str]): Значение заголовка Range, например "bytes=0-99", "bytes=100-" или "bytes=-100".
+        size (int): Размер файла в байтах.
+
+    Returns:
+        Optional[Tuple[int, int]]: Первый и последний байт диапазона включительно или None, если отдается весь файл.
+
+    Raises:
+        RangeNotSatisfiableError: Если диапазон не пересекается с файлом.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    start, separator, end = spec.partition("-")
+    if "," in spec or not separator:
+        return None
+    try:
+        first = int(start) if start else None
+        last = int(end) if end else None
+    except ValueError:
+        return None
+    if first is None:
+        if last is None:
+            return None
+        if last == 0:
+            raise RangeNotSatisfiableError(header)
+        first, last = max(size - last, 0), size - 1
+    elif last is None:
+        last = size - 1
+    elif last < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiableError(header)
+    return first, min(last, size - 1)
+
+
+class RangeFileResponse(Response):
+    """
+    Ответ с содержимым открытого файла и поддержкой одного диапазона Range.
+
+    Если сервер объявляет ASGI-расширение http.response.zerocopy, файл отдается без копирования через
+    sendfile. uvicorn (и gunicorn с UvicornWorker) это расширение не поддерживает: там файл читается
+    блоками MEDIA_CHUNK_SIZE через os.pread в пуле потоков, не блокируя event loop. Файл закрывается после отправки.
+    """
+
+    chunk_size = MEDIA_CHUNK_SIZE
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        size: int,
+        media_type: str,
+        etag: str,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+    ):
+        """
+        Инициализация ответа.
+
+        Args:
+            file (BinaryIO): Открытый на чтение файл.
+            size (int): Размер файла в байтах.
+            media_type (str): Тип содержимого.
+            etag (str): ETag содержимого.
+            range_header (Optional[str]): Заголовок Range запроса.
+            if_range (Optional[str]): Заголовок If-Range запроса. Диапазон учитывается, только если он равен etag.
+        """
+        self.file = file
+        self.media_type = media_type
+        self.background = None
+        self.offset, self.count = 0, size
+        status_code = 200
+        headers = {"accept-ranges": "bytes", "etag": etag}
+        if if_range is not None and if_range != etag:
+            range_header = None
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except RangeNotSatisfiableError:
+            status_code, self.count = 416, 0
+            headers["content-range"] = f"bytes */{size}"
+        else:
+            if byte_range is not None:
+                status_code = 206
+                self.offset, self.count = byte_range[0], byte_range[1] - byte_range[0] + 1
+                headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        headers["content-length"] = str(self.count)
+        self.status_code = status_code
+        self.body = b""
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope.get("method") == "HEAD" or self.count == 0:
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopy", "file": self.file, "offset": self.offset, "count": self.count})
+            else:
+                fd = self.file.fileno()
+                position, end = self.offset, self.offset + self.count
+                while position < end:
+                    chunk = await run_in_threadpool(os.pread, fd, min(self.chunk_size, end - position), position)
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": position < end})
+                if position < end:
+                    await send({"type": "http.response.body", "body": b""})
+        finally:
+            self.file.close()
@@ -0,0 +1,62 @@
+from typing import Any, Dict, Iterable
+import orjson
+from fastapi.responses import ORJSONResponse
+from app.metrics import timed
+from app.models.meme import Meme
+
+
+def meme_payload(meme: Meme, minio_url: str, variant_urls: Dict[str, str], variant_names: Iterable[str]) -> Dict[str, Any]:
+    """
+    Построение JSON-представления мема с полями MemeResponse напрямую из строки базы данных.
+
+    Pydantic-модель не создается: presigned URL приходят от MinIO и не требуют повторной проверки,
+    а datetime и Enum сериализует orjson.
+
+    Args:
+        meme (Meme): Строка мема из базы данных.
+        minio_url (str): Presigned URL оригинала.
+        variant_urls (Dict[str, str]): Presigned URL готовых вариантов по их названию.
+        variant_names (Iterable[str]): Названия всех настроенных вариантов.
+
+    Returns:
+        Dict[str, Any]: Представление мема.
+    """
+    return {
+        "id": meme.id,
+        "title": meme.title,
+        "minio_bucket": meme.minio_bucket,
+        "minio_path": meme.minio_path,
+        "minio_url": minio_url,
+        "variants": {name: variant_urls.get(name) or minio_url for name in variant_names},
+        "width": meme.width,
+        "height": meme.height,
+        "frames": meme.frames,
+        "size": meme.size,
+        "checksum": meme.checksum,
+        "created_at": meme.created_at,
+        "updated_at": meme.updated_at,
+    }
+
+
+def render_json(content: Any) -> bytes:
+    """
+    Сериализация ответа в JSON тем же форматом дат, что и у pydantic (UTC как "Z").
+
+    Args:
+        content (Any): Словари, списки, строки, числа, datetime и Enum.
+
+    Returns:
+        bytes: JSON.
+    """
+    with timed("serialization"):
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    JSON-ответ для готовых представлений (см. meme_payload). Эндпоинт, который возвращает Response,
+    не проходит повторную валидацию response_model в FastAPI; response_model остается для документации.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return render_json(content)
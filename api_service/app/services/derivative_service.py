@@ -0,0 +1,264 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import THUMBNAIL_VARIANTS, THUMBNAIL_WORKERS
+from app.minio_service import MinioService
+from app.models.meme import Meme
+from app.models.meme_variant import MemeVariant
+from app.services.response_cache import bump_data_version
+from app.services.storage_gc_service import enqueue_deletions
+
+logger = logging.getLogger("resources")
+
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+class VariantSpec(NamedTuple):
+    """
+    Описание производного изображения: название, максимальная сторона в пикселях и формат.
+    """
+
+    name: str
+    max_side: int
+    format: str
+
+
+class RenderedVariant(NamedTuple):
+    """
+    Результат рендеринга варианта в рабочем процессе.
+    """
+
+    name: str
+    data: bytes
+    format: str
+    width: int
+    height: int
+
+
+def parse_variant_specs(raw: str) -> List[VariantSpec]:
+    """
+    Разбор строки конфигурации вариантов вида "thumb:256:webp,preview:640:jpeg".
+
+    Args:
+        raw (str): Строка конфигурации.
+
+    Returns:
+        List[VariantSpec]: Описания вариантов.
+    """
+    specs = []
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        name, max_side, image_format = item.split(":")
+        specs.append(VariantSpec(name=name, max_side=int(max_side), format=image_format.lower()))
+    return specs
+
+
+VARIANT_SPECS = parse_variant_specs(THUMBNAIL_VARIANTS)
+
+
+def render_variants(data: bytes, specs: List[VariantSpec]) -> List[RenderedVariant]:
+    """
+    Построение уменьшенных копий изображения. Выполняется в отдельном процессе,
+    поэтому декодирование не занимает GIL рабочих потоков API.
+
+    Args:
+        data (bytes): Содержимое оригинала.
+        specs (List[VariantSpec]): Описания вариантов.
+
+    Returns:
+        List[RenderedVariant]: Закодированные варианты.
+    """
+    from PIL import Image, ImageOps
+
+    rendered = []
+    with Image.open(io.BytesIO(data)) as source:
+        # Animated GIFs are previewed by their first frame
+        source.seek(0)
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for spec in specs:
+            variant = image.copy()
+            variant.thumbnail((spec.max_side, spec.max_side), Image.Resampling.LANCZOS)
+            if spec.format == "jpeg" and variant.mode != "RGB":
+                variant = variant.convert("RGB")
+            buffer = io.BytesIO()
+            variant.save(buffer, format=spec.format.upper(), quality=80, optimize=True)
+            rendered.append(
+                RenderedVariant(
+                    name=spec.name,
+                    data=buffer.getvalue(),
+                    format=spec.format,
+                    width=variant.width,
+                    height=variant.height,
+                )
+            )
+    return rendered
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Общий для процесса пул рабочих процессов для обработки изображений.
+
+    Returns:
+        ProcessPoolExecutor: Пул процессов.
+    """
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that already runs threads and an event loop is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def close_process_pool() -> None:
+    """
+    Остановка пула рабочих процессов.
+    """
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+class DerivativeService:
+    def __init__(self, db: AsyncSession, minio_client: MinioService, specs: List[VariantSpec] = VARIANT_SPECS):
+        """
+        Инициализация DerivativeService с подключением к базе данных и MinIO.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия базы данных.
+            minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+            specs (List[VariantSpec]): Описания генерируемых вариантов.
+        """
+        self.db = db
+        self.minio_client = minio_client
+        self.specs = specs
+
+    async def generate_for_meme(self, meme_id: int) -> List[MemeVariant]:
+        """
+        Генерация вариантов изображения мема и сохранение их в MinIO и базе данных.
+
+        Старые варианты мема заменяются, их файлы ставятся в очередь на удаление. Если за время генерации
+        изображение мема сменилось или мем удален, загруженные файлы вариантов ставятся в очередь на удаление:
+        новое изображение обработает задача, запущенная обновлением.
+
+        Args:
+            meme_id (int): Идентификатор мема.
+
+        Returns:
+            List[MemeVariant]: Сохраненные варианты или пустой список, если мем не найден или изменился.
+        """
+        meme = await self.db.get(Meme, meme_id)
+        if not meme or not self.specs:
+            return []
+        bucket_name, source_path = meme.minio_bucket, meme.minio_path
+        # Release the connection while the image is downloaded and processed
+        await self.db.rollback()
+        data = await self.minio_client.run("download", self.minio_client.get_object_bytes, bucket_name, source_path)
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            get_process_pool(), render_variants, data, self.specs
+        )
+
+        stem = source_path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        variants = []
+        for item in rendered:
+            minio_path = f"variants/{meme_id}/{stem}-{item.name}.{item.format}"
+            await self.minio_client.run(
+                "upload", self.minio_client.put_bytes, bucket_name, minio_path, item.data, CONTENT_TYPES[item.format]
+            )
+            variants.append(
+                MemeVariant(
+                    meme_id=meme_id,
+                    name=item.name,
+                    source_path=source_path,
+                    minio_bucket=bucket_name,
+                    minio_path=minio_path,
+                    content_type=CONTENT_TYPES[item.format],
+                    width=item.width,
+                    height=item.height,
+                    size=len(item.data),
+                )
+            )
+
+        current_path = await self.db.scalar(select(Meme.minio_path).where(Meme.id == meme_id).with_for_update())
+        if current_path != source_path:
+            # The meme was deleted or got a new image; its delete or update did not know about these objects
+            await self.db.rollback()
+            await self._discard_objects([(variant.minio_bucket, variant.minio_path, variant.size) for variant in variants])
+            return []
+        replaced = (
+            await self.db.execute(
+                delete(MemeVariant)
+                .where(MemeVariant.meme_id == meme_id)
+                .returning(MemeVariant.minio_bucket, MemeVariant.minio_path, MemeVariant.size)
+            )
+        ).all()
+        current = {(variant.minio_bucket, variant.minio_path) for variant in variants}
+        await enqueue_deletions(self.db, [tuple(row) for row in replaced if tuple(row[:2]) not in current])
+        self.db.add_all(variants)
+        # New variant URLs change the cached lists; the meme ETag covers them via its ready variants
+        await bump_data_version(self.db)
+        await self.db.commit()
+        return variants
+
+    async def _discard_objects(self, objects: List[tuple]) -> None:
+        """
+        Постановка в очередь на удаление файлов вариантов, которые не были сохранены.
+
+        Args:
+            objects (List[tuple]): Бакет, путь к объекту и размер.
+        """
+        try:
+            await enqueue_deletions(self.db, objects)
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Failed to queue discarded variants for deletion: {e}")
+
+
+async def load_ready_variants(db: AsyncSession, memes: List[Meme]) -> Dict[int, List[MemeVariant]]:
+    """
+    Загрузка актуальных вариантов для набора мемов одним запросом.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        memes (List[Meme]): Мемы.
+
+    Returns:
+        Dict[int, List[MemeVariant]]: Варианты по идентификатору мема. Варианты, построенные
+            из прежнего изображения, не включаются.
+    """
+    if not memes:
+        return {}
+    source_paths = {meme.id: meme.minio_path for meme in memes}
+    rows = await db.scalars(select(MemeVariant).where(MemeVariant.meme_id.in_(source_paths)))
+    ready: Dict[int, List[MemeVariant]] = {}
+    for variant in rows:
+        if variant.source_path == source_paths[variant.meme_id]:
+            ready.setdefault(variant.meme_id, []).append(variant)
+    return ready
+
+
+async def generate_variants_in_background(meme_id: int, minio_client: MinioService) -> None:
+    """
+    Фоновая задача генерации вариантов после создания или обновления мема. Открывает собственную сессию.
+
+    Args:
+        meme_id (int): Идентификатор мема.
+        minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+    """
+    from app import SessionLocal
+
+    try:
+        async with SessionLocal() as db:
+            await DerivativeService(db, minio_client).generate_for_meme(meme_id)
+    except Exception as e:
+        logger.error(f"Failed to generate variants for meme {meme_id}: {e}")
@@ -0,0 +1,83 @@
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.config import EXPORT_BATCH_SIZE
+from app.minio_service import MinioService
+from app.models.meme import Meme
+from app.serialization import render_json
+
+logger = logging.getLogger("resources")
+
+
+class ExportService:
+    def __init__(self, session_factory: async_sessionmaker, minio_client: MinioService, batch_size: int = EXPORT_BATCH_SIZE):
+        """
+        Инициализация ExportService.
+
+        Сервис открывает собственную сессию: тело ответа отдается после того, как FastAPI
+        уже закрыл зависимости запроса, включая сессию из get_db.
+
+        Args:
+            session_factory (async_sessionmaker): Фабрика сессий базы данных.
+            minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+            batch_size (int): Количество строк, получаемых из курсора за один раз.
+        """
+        self.session_factory = session_factory
+        self.minio_client = minio_client
+        self.batch_size = batch_size
+
+    async def stream_ndjson(
+        self,
+        updated_since: Optional[datetime] = None,
+        updated_before: Optional[datetime] = None,
+        include_urls: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """
+        Выгрузка мемов в формате NDJSON (по одному JSON-объекту на строку) в порядке id.
+
+        Строки читаются серверным курсором пачками по batch_size и выбираются как кортежи, а не ORM-объекты,
+        поэтому в памяти одновременно находится не больше одной пачки независимо от размера таблицы.
+
+        Args:
+            updated_since (Optional[datetime]): Только мемы, измененные не раньше этого времени.
+            updated_before (Optional[datetime]): Только мемы, измененные раньше этого времени.
+            include_urls (bool): Добавлять ли presigned URL изображений (поле minio_url).
+
+        Yields:
+            bytes: Строки NDJSON одной пачки.
+        """
+        query = select(
+            Meme.id,
+            Meme.title,
+            Meme.minio_bucket,
+            Meme.minio_path,
+            Meme.content_hash,
+            Meme.width,
+            Meme.height,
+            Meme.frames,
+            Meme.size,
+            Meme.checksum,
+            Meme.created_at,
+            Meme.updated_at,
+        ).order_by(Meme.id)
+        if updated_since is not None:
+            query = query.where(Meme.updated_at >= updated_since)
+        if updated_before is not None:
+            query = query.where(Meme.updated_at < updated_before)
+
+        exported = 0
+        async with self.session_factory() as db:
+            result = await db.stream(query.execution_options(yield_per=self.batch_size))
+            async for rows in result.mappings().partitions():
+                records = [dict(row) for row in rows]
+                if include_urls:
+                    urls = await self.minio_client.get_presigned_urls_async(
+                        [(record["minio_bucket"], record["minio_path"]) for record in records], remember=False
+                    )
+                    for record, url in zip(records, urls):
+                        record["minio_url"] = url
+                exported += len(records)
+                yield b"".join(render_json(record) + b"\n" for record in records)
+        logger.info(f"Exported {exported} memes.")
@@ -0,0 +1,245 @@
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional, Union
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import IDEMPOTENCY_KEY_TTL, IDEMPOTENCY_LOCK_TIMEOUT
+from app.models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger("resources")
+
+# Set on responses that were replayed from a stored result
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def request_fingerprint(*values) -> str:
+    """
+    Отпечаток параметров запроса для сравнения повторов с одним Idempotency-Key.
+
+    Args:
+        *values: Параметры запроса; сравниваются по repr.
+
+    Returns:
+        str: SHA-256 параметров в hex.
+    """
+    return hashlib.sha256("\x1f".join(repr(value) for value in values).encode()).hexdigest()
+
+
+class IdempotencyService:
+    def __init__(self, db: AsyncSession, ttl: int = IDEMPOTENCY_KEY_TTL, lock_timeout: int = IDEMPOTENCY_LOCK_TIMEOUT):
+        """
+        Инициализация IdempotencyService с подключением к базе данных.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия базы данных.
+            ttl (int): Сколько секунд хранится результат запроса.
+            lock_timeout (int): Через сколько секунд незавершенный запрос считается прерванным.
+        """
+        self.db = db
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    async def begin(self, key: str, scope: str, fingerprint: str, claim: str) -> Optional[IdempotencyKey]:
+        """
+        Захват ключа перед выполнением запроса.
+
+        Args:
+            key (str): Значение заголовка Idempotency-Key.
+            scope (str): Метод и путь запроса.
+            fingerprint (str): Отпечаток параметров запроса.
+            claim (str): Случайная метка этого выполнения запроса.
+
+        Returns:
+            Optional[IdempotencyKey]: Сохраненный результат, если запрос уже выполнен, или None,
+            если ключ захвачен и запрос нужно выполнить.
+
+        Raises:
+            HTTPException: Если ключ использован с другими параметрами (422) или такой же запрос
+                еще выполняется (409).
+        """
+        now = datetime.now(timezone.utc)
+        row = (
+            await self.db.execute(
+                select(
+                    IdempotencyKey,
+                    IdempotencyKey.expires_at <= now,
+                    IdempotencyKey.created_at <= now - timedelta(seconds=self.lock_timeout),
+                )
+                .where(IdempotencyKey.key == key, IdempotencyKey.scope == scope)
+                .with_for_update()
+            )
+        ).first()
+        if row is None:
+            try:
+                self.db.add(
+                    IdempotencyKey(
+                        key=key,
+                        scope=scope,
+                        fingerprint=fingerprint,
+                        claim=claim,
+                        created_at=now,
+                        expires_at=now + timedelta(seconds=self.ttl),
+                    )
+                )
+                await self.db.commit()
+            except IntegrityError:
+                # A concurrent request with the same key got there first
+                await self.db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is already in progress.",
+                )
+            return None
+
+        stored, expired, abandoned = row
+        if expired or (stored.status_code is None and abandoned):
+            # Start over: the stored result is too old or the request holding the key looks dead;
+            # if that request is only slow, the new claim keeps it from saving its result
+            stored.fingerprint = fingerprint
+            stored.claim = claim
+            stored.status_code = None
+            stored.response_body = None
+            stored.created_at = now
+            stored.expires_at = now + timedelta(seconds=self.ttl)
+            await self.db.commit()
+            return None
+        # Commit rather than roll back: it releases the row lock without expiring the loaded result
+        await self.db.commit()
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="This Idempotency-Key was already used with different request parameters.",
+            )
+        if stored.status_code is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is already in progress.",
+            )
+        return stored
+
+    async def save(self, key: str, scope: str, claim: str, status_code: int, response_body: str) -> None:
+        """
+        Запись результата запроса в текущей транзакции, до коммита изменения, которое он описывает:
+        изменение и результат сохраняются вместе или не сохраняются вовсе.
+
+        Args:
+            key (str): Значение заголовка Idempotency-Key.
+            scope (str): Метод и путь запроса.
+            claim (str): Метка, с которой запрос захватил ключ.
+            status_code (int): Код ответа.
+            response_body (str): Тело ответа в JSON.
+
+        Raises:
+            HTTPException: Если ключ перехватил повтор запроса, посчитав этот запрос прерванным (409).
+                Транзакцию изменения тогда нужно отменить.
+        """
+        result = await self.db.execute(
+            update(IdempotencyKey)
+            .where(
+                IdempotencyKey.key == key,
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.claim == claim,
+                IdempotencyKey.status_code.is_(None),
+            )
+            .values(status_code=status_code, response_body=response_body)
+        )
+        if result.rowcount == 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A retry with this Idempotency-Key took over the request, so the request was not applied.",
+            )
+
+    async def release(self, key: str, scope: str, claim: str) -> None:
+        """
+        Освобождение ключа после неудачного запроса, чтобы клиент мог повторить его с тем же ключом.
+
+        Args:
+            key (str): Значение заголовка Idempotency-Key.
+            scope (str): Метод и путь запроса.
+            claim (str): Метка, с которой запрос захватил ключ; ключ, перехваченный повтором, не освобождается.
+        """
+        await self.db.rollback()
+        await self.db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.key == key,
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.claim == claim,
+                IdempotencyKey.status_code.is_(None),
+            )
+        )
+        await self.db.commit()
+
+    async def purge_expired(self) -> int:
+        """
+        Удаление ключей, срок хранения которых истек.
+
+        Returns:
+            int: Количество удаленных ключей.
+        """
+        result = await self.db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.now(timezone.utc))
+        )
+        await self.db.commit()
+        return result.rowcount
+
+
+async def run_idempotent(
+    db: AsyncSession,
+    key: Optional[str],
+    scope: str,
+    fingerprint: str,
+    action: Callable[[Optional[Callable[[BaseModel], Awaitable[None]]]], Awaitable[BaseModel]],
+) -> Union[BaseModel, Response]:
+    """
+    Выполнение изменяющего запроса не более одного раза для одного Idempotency-Key.
+
+    Без ключа action просто выполняется. С ключом action получает функцию сохранения результата
+    и должна вызвать ее в своей транзакции до коммита, поэтому изменение не может закоммититься
+    без результата. Повтор запроса возвращает сохраненный результат с заголовком Idempotent-Replayed,
+    не выполняя action. После ошибки ключ освобождается.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        key (Optional[str]): Значение заголовка Idempotency-Key.
+        scope (str): Метод и путь запроса.
+        fingerprint (str): Отпечаток параметров запроса.
+        action (Callable[[Optional[Callable[[BaseModel], Awaitable[None]]]], Awaitable[BaseModel]]): Выполнение
+            запроса; получает функцию сохранения результата или None без ключа.
+
+    Returns:
+        Union[BaseModel, Response]: Результат action или сохраненный ответ.
+
+    Raises:
+        HTTPException: Если ключ использован с другими параметрами, запрос с этим ключом еще выполняется
+            или ключ перехватил повтор запроса.
+    """
+    if not key:
+        return await action(None)
+    service = IdempotencyService(db)
+    claim = secrets.token_hex(16)
+    stored = await service.begin(key, scope, fingerprint, claim)
+    if stored is not None:
+        return Response(
+            stored.response_body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    async def save(result: BaseModel) -> None:
+        await service.save(key, scope, claim, status.HTTP_200_OK, result.model_dump_json())
+
+    try:
+        return await action(save)
+    except BaseException:
+        try:
+            await service.release(key, scope, claim)
+        except Exception as e:
+            # The key unlocks itself after IDEMPOTENCY_LOCK_TIMEOUT
+            logger.error(f"Failed to release Idempotency-Key '{key}': {e}")
+        raise
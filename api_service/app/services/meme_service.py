@@ -1,33 +1,99 @@
-from typing import Optional
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+import asyncio
+import secrets
 import uuid
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
+from sqlalchemy import Float, and_, cast, delete, func, insert, or_, select, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, UploadFile, status
 import logging
 from minio.error import S3Error
+from app.conditional import make_etag
+from app.media_cache import CachedObject, get_media_cache
+from app.metrics import DEDUP_SKIPPED_BYTES, DEDUP_SKIPPED_UPLOADS, timed
+from app.config import (
+    COUNT_STRATEGY,
+    DIRECT_UPLOAD_COMPLETE_WINDOW,
+    DIRECT_UPLOAD_EXPIRES,
+    MAX_UPLOAD_SIZE,
+    RESUMABLE_UPLOAD_EXPIRES,
+    STORAGE_DEDUP,
+)
 from app.minio_service import MinioService
 from app.models.meme import Meme
-from app.models.meme_responses import MemeResponse, PaginatedMemesResponse
+from app.models.meme_blob import MemeBlob
+from app.models.meme_variant import MemeVariant
+from app.models.meme_stats import MemeStats
+from app.models.pending_upload import PendingUpload
+from app.models.resumable_upload import ResumableUpload
+from app.models.meme_responses import (
+    BatchCreateResponse,
+    BatchItemResult,
+    MemeResponse,
+    MemeSearchResponse,
+    MemesLookupResponse,
+    PaginatedMemesResponse,
+)
+from app.models.storage_responses import DedupStatsResponse
+from app.models.upload_responses import DirectUploadResponse
+from app.services.derivative_service import VARIANT_SPECS, load_ready_variants
+from app.services.response_cache import bump_data_version, get_data_version
+from app.services.storage_gc_service import enqueue_deletions, lock_object
+from app.serialization import meme_payload
+from app.image_metadata import ImageInspector, ImageMetadata
+from app.upload_pipeline import inspect_upload, stream_to_minio
+from app.pagination import (
+    CountStrategy,
+    Cursor,
+    InvalidCursorError,
+    METADATA_SORT_FIELDS,
+    MemeFilter,
+    MemeSortField,
+    SearchCursor,
+    SortOrder,
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+)
 
 logger = logging.getLogger("resources")
 
+# Object key extensions of direct uploads by content type
+IMAGE_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/gif": "gif"}
+
+
+def _metadata_columns(metadata: ImageMetadata) -> Dict[str, Any]:
+    # Meme columns filled from the image inspected at upload
+    return {
+        "width": metadata.width,
+        "height": metadata.height,
+        "frames": metadata.frames,
+        "size": metadata.size,
+        "checksum": metadata.checksum,
+    }
+
 
 class MemeService:
-    def __init__(self, db: Session, minio_client: MinioService):
+    def __init__(self, db: AsyncSession, minio_client: MinioService, dedup: bool = STORAGE_DEDUP):
         """
         Инициализация MemeService с подключением к базе данных и MinIO.
 
         Args:
-            db (Session): Сессия базы данных.
+            db (AsyncSession): Асинхронная сессия базы данных.
             minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+            dedup (bool): Хранить изображения под ключом из SHA-256 содержимого без повторной загрузки дубликатов.
         """
         self.db = db
         self.minio_client = minio_client
         self.bucket_name = "memes"
+        self.dedup = dedup
 
     def _is_allowed_image_file(self, file: UploadFile) -> bool:
         """
-        Проверка, является ли файл допустимым изображением (PNG, JPG, GIF).
+        Проверка, является ли файл допустимым изображением (PNG, JPG, GIF), по имени и заявленному типу.
+        Содержимое файла проверяется по сигнатуре при загрузке в хранилище (см. _store_image).
 
         Args:
             file (UploadFile): Загруженный файл.
@@ -46,48 +112,507 @@ class MemeService:
 
         return True
 
-    def get_paginated_memes(self, page: int, page_size: int) -> PaginatedMemesResponse:
+    async def _to_payloads(self, memes: List[Meme]) -> List[Dict[str, Any]]:
         """
-        Получение списка мемов с пагинацией.
+        Построение JSON-представлений по строкам мемов. Варианты изображений загружаются одним запросом,
+        presigned URL оригиналов и вариантов получаются одним пакетом вне event loop.
 
         Args:
-            page (int): Номер страницы.
-            page_size (int): Количество мемов на странице.
+            memes (List[Meme]): Строки мемов из базы данных.
 
         Returns:
-            PaginatedMemesResponse: Объект ответа с пагинированными мемами.
+            List[Dict[str, Any]]: Представления с полями MemeResponse в том же порядке.
+
+        Raises:
+            HTTPException: Если не удалось получить presigned URL оригинала. Вместо варианта без URL
+                отдается ссылка на оригинал.
         """
-        offset = (page - 1) * page_size
-        total = self.db.query(Meme).count()
-        memes = self.db.query(Meme).offset(offset).limit(page_size).all()
-        memes_response = []
+        ready_variants = await load_ready_variants(self.db, memes)
+        objects = [(meme.minio_bucket, meme.minio_path) for meme in memes]
         for meme in memes:
-            meme_data = MemeResponse(
-                id=meme.id,
-                title=meme.title,
-                minio_bucket=meme.minio_bucket,
-                minio_path=meme.minio_path,
-                minio_url=self.minio_client.get_presigned_url(meme.minio_bucket, meme.minio_path),
-                created_at=meme.created_at,
-                updated_at=meme.updated_at,
+            objects.extend((variant.minio_bucket, variant.minio_path) for variant in ready_variants.get(meme.id, []))
+        urls = dict(zip(objects, await self.minio_client.get_presigned_urls_async(objects)))
+        # Payloads skip MemeResponse validation, so reject a missing URL here like the response model would
+        missing = [meme.id for meme in memes if urls[(meme.minio_bucket, meme.minio_path)] is None]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to generate presigned URL for memes: {', '.join(map(str, missing))}",
             )
-            memes_response.append(meme_data)
 
-        return PaginatedMemesResponse(items=memes_response, total=total, page=page, page_size=page_size)
+        variant_names = [spec.name for spec in VARIANT_SPECS]
+        payloads = []
+        with timed("serialization"):
+            for meme in memes:
+                variant_urls = {
+                    variant.name: urls[(variant.minio_bucket, variant.minio_path)]
+                    for variant in ready_variants.get(meme.id, [])
+                }
+                payloads.append(
+                    meme_payload(meme, urls[(meme.minio_bucket, meme.minio_path)], variant_urls, variant_names)
+                )
+        return payloads
+
+    async def _to_responses(self, memes: List[Meme]) -> List[MemeResponse]:
+        """
+        Построение ответов по строкам мемов.
+
+        Args:
+            memes (List[Meme]): Строки мемов из базы данных.
+
+        Returns:
+            List[MemeResponse]: Объекты ответа в том же порядке.
+        """
+        return [MemeResponse.model_validate(payload) for payload in await self._to_payloads(memes)]
+
+    async def _to_response(self, meme: Meme) -> MemeResponse:
+        """
+        Построение ответа по строке мема с presigned URL на изображение.
+
+        Args:
+            meme (Meme): Строка мема из базы данных.
+
+        Returns:
+            MemeResponse: Объект ответа с информацией о меме.
+        """
+        return (await self._to_responses([meme]))[0]
+
+    def _sorted_query(self, sort_by: MemeSortField, order: SortOrder):
+        """
+        Запрос мемов со стабильной сортировкой (ключ сортировки, id), которая обслуживается индексом.
+
+        Args:
+            sort_by (MemeSortField): Поле сортировки.
+            order (SortOrder): Направление сортировки.
+
+        Returns:
+            Select: Отсортированный запрос.
+        """
+        columns = [Meme.id] if sort_by == MemeSortField.id else [getattr(Meme, sort_by.value), Meme.id]
+        if order == SortOrder.desc:
+            columns = [column.desc() for column in columns]
+        return select(Meme).order_by(*columns)
+
+    def _list_conditions(self, sort_by: MemeSortField, meme_filter: Optional[MemeFilter]) -> List:
+        """
+        Условия отбора мемов для списка по сведениям об изображении. Каждое условие - диапазон
+        по индексированному столбцу.
+
+        Args:
+            sort_by (MemeSortField): Поле сортировки. При сортировке по сведениям об изображении
+                мемы без них исключаются.
+            meme_filter (Optional[MemeFilter]): Ограничения по сведениям об изображении.
+
+        Returns:
+            List: Условия для WHERE.
+        """
+        conditions = []
+        if sort_by in METADATA_SORT_FIELDS:
+            conditions.append(getattr(Meme, sort_by.value).is_not(None))
+        if meme_filter is not None:
+            for field in ("size", "width", "height"):
+                column = getattr(Meme, field)
+                low, high = getattr(meme_filter, f"min_{field}"), getattr(meme_filter, f"max_{field}")
+                if low is not None:
+                    conditions.append(column >= low)
+                if high is not None:
+                    conditions.append(column <= high)
+        return conditions
+
+    def _after_cursor(self, query, cursor: Cursor):
+        """
+        Ограничение запроса строками, которые идут после позиции курсора.
+
+        Args:
+            query (Select): Отсортированный запрос.
+            cursor (Cursor): Позиция последнего элемента предыдущей страницы.
+
+        Returns:
+            Select: Запрос с условием keyset-пагинации.
+        """
+        if cursor.sort_by == MemeSortField.id:
+            key, bound = Meme.id, cursor.id
+        else:
+            key, bound = tuple_(getattr(Meme, cursor.sort_by.value), Meme.id), tuple_(cursor.value, cursor.id)
+        return query.where(key < bound if cursor.order == SortOrder.desc else key > bound)
+
+    async def _count_memes(
+        self, strategy: CountStrategy, conditions: Optional[List] = None
+    ) -> Tuple[Optional[int], CountStrategy]:
+        """
+        Подсчет общего количества мемов выбранным способом.
+
+        Если счетчик еще не заведен или оценка планировщика недоступна (не PostgreSQL или таблица
+        ни разу не анализировалась), используется точный подсчет. Счетчик и оценка относятся ко всей
+        таблице, поэтому при условиях отбора количество всегда считается точно.
+
+        Args:
+            strategy (CountStrategy): Запрошенный способ подсчета.
+            conditions (Optional[List]): Условия отбора мемов (см. _list_conditions).
+
+        Returns:
+            Tuple[Optional[int], CountStrategy]: Количество мемов и фактически использованный способ.
+        """
+        if strategy == CountStrategy.none:
+            return None, CountStrategy.none
+        if conditions:
+            total = await self.db.scalar(select(func.count()).select_from(Meme).where(*conditions))
+            return total, CountStrategy.exact
+        if strategy == CountStrategy.estimate and self.db.get_bind().dialect.name == "postgresql":
+            estimate = await self.db.scalar(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'meme'::regclass")
+            )
+            if estimate is not None and estimate >= 0:
+                return int(estimate), CountStrategy.estimate
+        if strategy == CountStrategy.counter:
+            counter = await self.db.scalar(select(MemeStats.value).where(MemeStats.name == "total"))
+            if counter is not None:
+                return int(counter), CountStrategy.counter
+        return await self.db.scalar(select(func.count()).select_from(Meme)), CountStrategy.exact
+
+    async def _adjust_total(self, delta: int) -> None:
+        """
+        Изменение счетчика мемов в текущей транзакции. Если счетчик не заведен, ничего не делает.
+
+        Args:
+            delta (int): На сколько изменить счетчик.
+        """
+        await self.db.execute(
+            update(MemeStats).where(MemeStats.name == "total").values(value=MemeStats.value + delta)
+        )
+
+    async def _store_image(self, file: UploadFile) -> Tuple[str, Optional[str], ImageMetadata]:
+        """
+        Загрузка изображения в MinIO с проверкой содержимого.
+
+        Сигнатура файла, размеры в пикселях, количество кадров, размер и SHA-256 определяются в том же
+        потоковом проходе, которым файл отправляется в MinIO (в режиме дедупликации - которым считается хэш).
+        Файл, который не является изображением заявленного типа, в хранилище не попадает.
+
+        В режиме дедупликации ключ объекта строится из SHA-256 содержимого. Если такое изображение уже
+        хранится, загрузка пропускается и увеличивается счетчик ссылок в meme_blob в текущей транзакции.
+        Иначе до конца транзакции держится блокировка ключа, чтобы фоновое удаление не стерло объект,
+        который был в очереди на удаление и загружен заново.
+
+        Args:
+            file (UploadFile): Файл изображения.
+
+        Returns:
+            Tuple[str, Optional[str], ImageMetadata]: Путь к объекту в MinIO, SHA-256 содержимого
+            (None без дедупликации) и сведения об изображении.
+
+        Raises:
+            HTTPException: Если файл слишком большой или не является изображением заявленного типа.
+        """
+        file_extension = file.filename.split(".")[-1].lower()
+        if not self.dedup:
+            minio_path = f"{uuid.uuid4()}.{file_extension}"
+            inspector = ImageInspector(file.content_type)
+            await stream_to_minio(self.minio_client, self.bucket_name, minio_path, file, inspector=inspector)
+            return minio_path, None, inspector.finish()
+
+        metadata = await inspect_upload(file)
+        content_hash, size = metadata.checksum, metadata.size
+        stored_path = (
+            await self.db.execute(
+                update(MemeBlob)
+                .where(MemeBlob.sha256 == content_hash)
+                .values(ref_count=MemeBlob.ref_count + 1)
+                .returning(MemeBlob.minio_path)
+            )
+        ).scalar()
+        if stored_path is not None:
+            DEDUP_SKIPPED_UPLOADS.inc()
+            DEDUP_SKIPPED_BYTES.inc(size)
+            logger.info(f"Skipped upload of {size} bytes: identical image is stored as '{stored_path}'.")
+            return stored_path, content_hash, metadata
+
+        minio_path = f"sha256/{content_hash}.{file_extension}"
+        # Until this transaction commits, the deletion queue must not remove the key being re-uploaded
+        await lock_object(self.db, self.bucket_name, minio_path)
+        await stream_to_minio(self.minio_client, self.bucket_name, minio_path, file)
+        # The same image may have been stored concurrently; then only its reference count grows
+        insert = postgresql.insert if self.db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        stored_path = (
+            await self.db.execute(
+                insert(MemeBlob)
+                .values(
+                    sha256=content_hash,
+                    minio_bucket=self.bucket_name,
+                    minio_path=minio_path,
+                    size=size,
+                    ref_count=1,
+                )
+                .on_conflict_do_update(
+                    index_elements=[MemeBlob.sha256], set_={"ref_count": MemeBlob.ref_count + 1}
+                )
+                .returning(MemeBlob.minio_path)
+            )
+        ).scalar()
+        return stored_path, content_hash, metadata
+
+    async def _release_image(self, content_hash: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Уменьшение счетчика ссылок на изображение в текущей транзакции.
+
+        Args:
+            content_hash (str): SHA-256 изображения.
+
+        Returns:
+            Optional[Tuple[str, str, int]]: Бакет, путь и размер объекта, если ссылок больше не осталось
+            и объект нужно удалить.
+        """
+        ref_count = (
+            await self.db.execute(
+                update(MemeBlob)
+                .where(MemeBlob.sha256 == content_hash)
+                .values(ref_count=MemeBlob.ref_count - 1)
+                .returning(MemeBlob.ref_count)
+            )
+        ).scalar()
+        if ref_count is None or ref_count > 0:
+            return None
+        orphan = (
+            await self.db.execute(
+                delete(MemeBlob)
+                .where(MemeBlob.sha256 == content_hash, MemeBlob.ref_count <= 0)
+                .returning(MemeBlob.minio_bucket, MemeBlob.minio_path, MemeBlob.size)
+            )
+        ).first()
+        return tuple(orphan) if orphan else None
+
+    async def get_dedup_stats(self) -> DedupStatsResponse:
+        """
+        Статистика дедупликации изображений по таблице meme_blob.
+
+        Returns:
+            DedupStatsResponse: Количество объектов и ссылок, хранимый объем и сэкономленный объем в байтах.
+        """
+        row = (
+            await self.db.execute(
+                select(
+                    func.count(),
+                    func.coalesce(func.sum(MemeBlob.ref_count), 0),
+                    func.coalesce(func.sum(MemeBlob.size), 0),
+                    func.coalesce(func.sum(MemeBlob.size * (MemeBlob.ref_count - 1)), 0),
+                )
+            )
+        ).one()
+        return DedupStatsResponse(blobs=row[0], references=row[1], stored_bytes=row[2], bytes_saved=row[3])
+
+    async def get_paginated_memes_payload(
+        self,
+        page: int,
+        page_size: int,
+        sort_by: MemeSortField = MemeSortField.id,
+        order: SortOrder = SortOrder.asc,
+        cursor: Optional[str] = None,
+        count: Optional[CountStrategy] = None,
+        meme_filter: Optional[MemeFilter] = None,
+    ) -> Dict[str, Any]:
+        """
+        Получение списка мемов с пагинацией по номеру страницы или по курсору в виде JSON-представления
+        для FastJSONResponse, без создания pydantic-моделей.
+
+        Args:
+            page (int): Номер страницы. Не используется, если передан курсор.
+            page_size (int): Количество мемов на странице.
+            sort_by (MemeSortField): Поле сортировки.
+            order (SortOrder): Направление сортировки.
+            cursor (Optional[str]): Курсор из next_cursor предыдущей страницы.
+            count (Optional[CountStrategy]): Способ подсчета total. По умолчанию COUNT_STRATEGY из конфигурации.
+            meme_filter (Optional[MemeFilter]): Ограничения по размеру файла и размерам изображения.
+
+        Returns:
+            Dict[str, Any]: Представление с полями PaginatedMemesResponse.
+
+        Raises:
+            HTTPException: Если курсор некорректен или не соответствует параметрам сортировки,
+                или не удалось получить presigned URL.
+        """
+        conditions = self._list_conditions(sort_by, meme_filter)
+        query = self._sorted_query(sort_by, order).where(*conditions)
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            if position.sort_by != sort_by or position.order != order:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor does not match sort_by and order.",
+                )
+            query = self._after_cursor(query, position)
+            page = None
+        else:
+            query = query.offset((page - 1) * page_size)
+
+        with timed("count"):
+            total, total_strategy = await self._count_memes(count or CountStrategy(COUNT_STRATEGY), conditions)
+        # One extra row tells whether there is a next page without another query
+        with timed("page_query"):
+            memes = (await self.db.scalars(query.limit(page_size + 1))).all()
+        next_cursor = None
+        if len(memes) > page_size:
+            memes = memes[:page_size]
+            last = memes[-1]
+            next_cursor = encode_cursor(
+                Cursor(sort_by=sort_by, order=order, value=getattr(last, sort_by.value), id=last.id)
+            )
+
+        return {
+            "items": await self._to_payloads(memes),
+            "total": total,
+            "total_strategy": total_strategy,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        }
+
+    async def get_paginated_memes(
+        self,
+        page: int,
+        page_size: int,
+        sort_by: MemeSortField = MemeSortField.id,
+        order: SortOrder = SortOrder.asc,
+        cursor: Optional[str] = None,
+        count: Optional[CountStrategy] = None,
+        meme_filter: Optional[MemeFilter] = None,
+    ) -> PaginatedMemesResponse:
+        """
+        Получение списка мемов с пагинацией по номеру страницы или по курсору.
+
+        Args:
+            page (int): Номер страницы. Не используется, если передан курсор.
+            page_size (int): Количество мемов на странице.
+            sort_by (MemeSortField): Поле сортировки.
+            order (SortOrder): Направление сортировки.
+            cursor (Optional[str]): Курсор из next_cursor предыдущей страницы.
+            count (Optional[CountStrategy]): Способ подсчета total. По умолчанию COUNT_STRATEGY из конфигурации.
+            meme_filter (Optional[MemeFilter]): Ограничения по размеру файла и размерам изображения.
+
+        Returns:
+            PaginatedMemesResponse: Объект ответа с пагинированными мемами.
+
+        Raises:
+            HTTPException: Если курсор некорректен или не соответствует параметрам сортировки.
+        """
+        return PaginatedMemesResponse.model_validate(
+            await self.get_paginated_memes_payload(page, page_size, sort_by, order, cursor, count, meme_filter)
+        )
+
+    def _title_match(self, q: str):
+        """
+        Условие поиска по названию и оценка сходства для ранжирования.
+
+        В PostgreSQL подходят названия, содержащие q как подстроку или похожие на q по триграммам
+        (оператор %> из pg_trgm); оценка - word_similarity. Оба условия обслуживаются индексом
+        ix_meme_title_trgm. В остальных СУБД ищутся только подстроки, а оценка - доля названия,
+        которую занимает q.
+
+        Args:
+            q (str): Поисковая строка.
+
+        Returns:
+            Tuple[ColumnElement, ColumnElement]: Условие отбора и оценка сходства от 0 до 1.
+        """
+        substring = Meme.title.icontains(q, autoescape=True)
+        if self.db.get_bind().dialect.name == "postgresql":
+            return or_(substring, Meme.title.op("%>")(q)), func.word_similarity(q, Meme.title)
+        return substring, cast(func.length(q), Float) / func.length(Meme.title)
+
+    async def search_memes_payload(self, q: str, page_size: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Поиск мемов по названию с ранжированием по сходству и пагинацией по курсору.
+        Результат - JSON-представление для FastJSONResponse.
+
+        Args:
+            q (str): Поисковая строка.
+            page_size (int): Количество мемов на странице.
+            cursor (Optional[str]): Курсор из next_cursor предыдущей страницы того же поиска.
+
+        Returns:
+            Dict[str, Any]: Представление с полями MemeSearchResponse.
+
+        Raises:
+            HTTPException: Если курсор некорректен или получен для другой поисковой строки.
+        """
+        match, score = self._title_match(q)
+        query = select(Meme, score).where(match)
+        if cursor:
+            try:
+                position = decode_search_cursor(cursor)
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            if position.query != q:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not match q.")
+            query = query.where(or_(score < position.score, and_(score == position.score, Meme.id > position.id)))
+
+        rows = (await self.db.execute(query.order_by(score.desc(), Meme.id).limit(page_size + 1))).all()
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last, last_score = rows[-1]
+            next_cursor = encode_search_cursor(SearchCursor(query=q, score=last_score, id=last.id))
+        return {
+            "items": await self._to_payloads([meme for meme, _ in rows]),
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        }
+
+    async def search_memes(self, q: str, page_size: int, cursor: Optional[str] = None) -> MemeSearchResponse:
+        """
+        Поиск мемов по названию с ранжированием по сходству и пагинацией по курсору.
+
+        Args:
+            q (str): Поисковая строка.
+            page_size (int): Количество мемов на странице.
+            cursor (Optional[str]): Курсор из next_cursor предыдущей страницы того же поиска.
+
+        Returns:
+            MemeSearchResponse: Найденные мемы от наиболее похожих к наименее похожим.
+
+        Raises:
+            HTTPException: Если курсор некорректен или получен для другой поисковой строки.
+        """
+        return MemeSearchResponse.model_validate(await self.search_memes_payload(q, page_size, cursor))
 
-    def create_meme(self, title: str, file: UploadFile) -> MemeResponse:
+    async def get_list_validators(self) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Валидатор списка мемов для условных запросов по версии данных из meme_stats. Любое создание,
+        изменение или удаление мема увеличивает версию (см. bump_data_version) и меняет ETag.
+        Таблица мемов не читается, так что проверка стоит одного запроса по первичному ключу.
+
+        Returns:
+            Tuple[Optional[str], Optional[int]]: ETag и версия данных. Если счетчик версии не заведен,
+            оба значения None, и условные запросы к списку не поддерживаются.
+        """
+        version = await get_data_version(self.db)
+        if version is None:
+            return None, None
+        return make_etag("memes", version), version
+
+    async def create_meme(
+        self,
+        title: str,
+        file: UploadFile,
+        before_commit: Optional[Callable[[MemeResponse], Awaitable[None]]] = None,
+    ) -> MemeResponse:
         """
         Создание нового мема с загрузкой изображения в MinIO.
 
         Args:
             title (str): Название мема.
             file (UploadFile): Файл изображения.
+            before_commit (Optional[Callable[[MemeResponse], Awaitable[None]]]): Вызывается с готовым ответом
+                в транзакции создания до ее коммита, например чтобы сохранить ответ для Idempotency-Key.
 
         Returns:
             MemeResponse: Объект ответа с информацией о созданном меме.
 
         Raises:
-            HTTPException: Если файл не загружен или имеет недопустимый формат.
+            HTTPException: Если файл не загружен, имеет недопустимый формат, не является изображением
+                заявленного типа или слишком большой.
         """
         if not file.filename:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded.")
@@ -98,42 +623,385 @@ class MemeService:
                 detail="Invalid file type. Only PNG, JPG, and GIF are allowed.",
             )
 
-        file_extension = file.filename.split(".")[-1].lower()
-        minio_path = f"{uuid.uuid4()}.{file_extension}"
         try:
             # Upload file to MinIO
-            self.minio_client.upload_to_minio(
-                bucket_name=self.bucket_name, minio_path=minio_path, file_data=file.file
-            )
+            minio_path, content_hash, metadata = await self._store_image(file)
 
             # Add meme metadata to the database
             meme = Meme(
                 title=title,
                 minio_bucket=self.bucket_name,
                 minio_path=minio_path,
+                content_hash=content_hash,
+                **_metadata_columns(metadata),
                 created_at=datetime.now(timezone.utc),
                 updated_at=datetime.now(timezone.utc),
             )
             self.db.add(meme)
-            self.db.commit()
-            self.db.refresh(meme)
-
-            # Generate presigned URL for the uploaded image
-            presigned_url = self.minio_client.get_presigned_url(meme.minio_bucket, meme.minio_path)
-            return MemeResponse(
-                id=meme.id,
-                title=meme.title,
-                minio_bucket=meme.minio_bucket,
-                minio_path=meme.minio_path,
-                minio_url=presigned_url,
-                created_at=meme.created_at,
-                updated_at=meme.updated_at,
-            )
+            response = None
+            try:
+                await self._adjust_total(1)
+                await bump_data_version(self.db)
+                if before_commit is not None:
+                    await self.db.flush()
+                    response = await self._to_response(meme)
+                    await before_commit(response)
+                await self.db.commit()
+            except Exception:
+                await self.db.rollback()
+                await self._remove_unreferenced([minio_path])
+                raise
+            if response is not None:
+                return response
+            await self.db.refresh(meme)
+
+            # Build the response with a presigned URL for the uploaded image
+            return await self._to_response(meme)
         except S3Error as e:
             logger.error(f"Failed to upload file to MinIO: {e}")
             raise HTTPException(status_code=500, detail="Failed to upload file to storage")
 
-    def get_meme_by_id(self, id: int) -> Optional[MemeResponse]:
+    def _validate_new_meme(self, title: str, file: UploadFile) -> Optional[str]:
+        """
+        Проверка названия и файла нового мема без обращения к хранилищу.
+
+        Args:
+            title (str): Название мема.
+            file (UploadFile): Файл изображения.
+
+        Returns:
+            Optional[str]: Описание ошибки или None, если данные корректны.
+        """
+        if not title:
+            return "Title must not be empty."
+        if not file.filename:
+            return "No file uploaded."
+        if not self._is_allowed_image_file(file):
+            return "Invalid file type. Only PNG, JPG, and GIF are allowed."
+        return None
+
+    async def create_memes_batch(self, items: List[Tuple[str, UploadFile]]) -> BatchCreateResponse:
+        """
+        Пакетное создание мемов.
+
+        Файлы загружаются в MinIO параллельно (в режиме дедупликации - последовательно, так как счетчики
+        ссылок меняются в общей транзакции), затем все строки вставляются одним INSERT в одной транзакции.
+        Ошибки отдельных элементов возвращаются в результатах, не прерывая пакет. Если транзакция не
+        удалась, уже загруженные файлы ставятся в очередь на удаление.
+
+        Args:
+            items (List[Tuple[str, UploadFile]]): Пары (название, файл изображения).
+
+        Returns:
+            BatchCreateResponse: Результаты по каждому элементу в порядке запроса.
+
+        Raises:
+            HTTPException: Если не удалось сохранить мемы в базе данных.
+        """
+        results = [BatchItemResult(index=index, status_code=status.HTTP_201_CREATED) for index in range(len(items))]
+        valid = []
+        for index, (title, file) in enumerate(items):
+            error = self._validate_new_meme(title, file)
+            if error:
+                results[index] = BatchItemResult(index=index, status_code=status.HTTP_400_BAD_REQUEST, error=error)
+            else:
+                valid.append(index)
+
+        if self.dedup:
+            stored = []
+            for index in valid:
+                try:
+                    stored.append(await self._store_image(items[index][1]))
+                except Exception as e:
+                    stored.append(e)
+        else:
+            stored = await asyncio.gather(
+                *(self._store_image(items[index][1]) for index in valid), return_exceptions=True
+            )
+
+        rows, row_indexes = [], []
+        for index, outcome in zip(valid, stored):
+            if isinstance(outcome, BaseException):
+                if isinstance(outcome, HTTPException):
+                    results[index] = BatchItemResult(index=index, status_code=outcome.status_code, error=outcome.detail)
+                else:
+                    logger.error(f"Failed to upload batch item {index} to MinIO: {outcome}")
+                    results[index] = BatchItemResult(
+                        index=index,
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        error="Failed to upload file to storage",
+                    )
+                continue
+            minio_path, content_hash, metadata = outcome
+            now = datetime.now(timezone.utc)
+            rows.append(
+                {
+                    "title": items[index][0],
+                    "minio_bucket": self.bucket_name,
+                    "minio_path": minio_path,
+                    "content_hash": content_hash,
+                    **_metadata_columns(metadata),
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            row_indexes.append(index)
+
+        if rows:
+            try:
+                memes = list(await self.db.scalars(insert(Meme).returning(Meme, sort_by_parameter_order=True), rows))
+                await self._adjust_total(len(memes))
+                await bump_data_version(self.db)
+                await self.db.commit()
+            except Exception as e:
+                await self.db.rollback()
+                logger.error(f"Failed to save batch of {len(rows)} memes: {e}")
+                await self._remove_unreferenced([row["minio_path"] for row in rows])
+                raise HTTPException(status_code=500, detail="Failed to save memes")
+            for index, response in zip(row_indexes, await self._to_responses(memes)):
+                results[index] = BatchItemResult(index=index, status_code=status.HTTP_201_CREATED, meme=response)
+
+        created = sum(1 for result in results if result.meme is not None)
+        return BatchCreateResponse(items=results, created=created, failed=len(results) - created)
+
+    async def start_direct_upload(self, title: str, content_type: str) -> DirectUploadResponse:
+        """
+        Выдача POST-политики для загрузки изображения напрямую в MinIO, минуя API.
+
+        Политика разрешает загрузить только один объект с заданным типом содержимого и размером
+        не больше MAX_UPLOAD_SIZE. Незавершенная загрузка удаляется фоновым удалением после complete_by.
+
+        Args:
+            title (str): Название будущего мема.
+            content_type (str): Тип изображения: image/png, image/jpeg или image/gif.
+
+        Returns:
+            DirectUploadResponse: Адрес и поля формы для загрузки, идентификатор загрузки и сроки.
+
+        Raises:
+            HTTPException: Если тип изображения не поддерживается.
+        """
+        extension = IMAGE_EXTENSIONS.get(content_type)
+        if extension is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid file type. Only PNG, JPG, and GIF are allowed.",
+            )
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=DIRECT_UPLOAD_EXPIRES)
+        upload = PendingUpload(
+            token=secrets.token_urlsafe(24),
+            title=title,
+            minio_bucket=self.bucket_name,
+            minio_path=f"{uuid.uuid4()}.{extension}",
+            content_type=content_type,
+            max_size=MAX_UPLOAD_SIZE,
+            created_at=now,
+            expires_at=expires_at + timedelta(seconds=DIRECT_UPLOAD_COMPLETE_WINDOW),
+        )
+        fields = await self.minio_client.run(
+            "presign",
+            self.minio_client.presign_post_policy,
+            upload.minio_bucket,
+            upload.minio_path,
+            content_type,
+            upload.max_size,
+            expires_at,
+        )
+        self.db.add(upload)
+        await self.db.commit()
+        return DirectUploadResponse(
+            token=upload.token,
+            url=self.minio_client.bucket_url(upload.minio_bucket),
+            fields=fields,
+            max_size=upload.max_size,
+            expires_at=expires_at,
+            complete_by=upload.expires_at,
+        )
+
+    async def complete_direct_upload(self, token: str) -> MemeResponse:
+        """
+        Завершение загрузки напрямую в MinIO: проверка объекта и создание мема.
+
+        Файл минует API, поэтому при завершении он один раз читается из MinIO потоком: проверяется
+        сигнатура и определяются сведения об изображении. Если объект не соответствует политике
+        (слишком большой или не является изображением заявленного типа), он ставится в очередь
+        на удаление, а загрузка отменяется.
+
+        Args:
+            token (str): Идентификатор загрузки.
+
+        Returns:
+            MemeResponse: Объект ответа с информацией о созданном меме.
+
+        Raises:
+            HTTPException: Если загрузка не найдена (404), истекла (410), файл еще не загружен (409)
+                или не соответствует политике (400).
+        """
+        now = datetime.now(timezone.utc)
+        row = (
+            await self.db.execute(
+                select(PendingUpload, PendingUpload.expires_at <= now)
+                .where(PendingUpload.token == token)
+                .with_for_update()
+            )
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found.")
+        upload, expired = row
+        if expired:
+            await self.db.rollback()
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload has expired.")
+
+        try:
+            metadata = await self.minio_client.run(
+                "inspect",
+                self.minio_client.inspect_object,
+                upload.minio_bucket,
+                upload.minio_path,
+                upload.content_type,
+            )
+            valid = metadata is None or metadata.size <= upload.max_size
+        except HTTPException:
+            # Not an image of the declared type
+            valid = False
+        if not valid:
+            await enqueue_deletions(self.db, [(upload.minio_bucket, upload.minio_path, None)])
+            await self.db.delete(upload)
+            await self.db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Uploaded file does not match the upload policy.",
+            )
+        if metadata is None:
+            await self.db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="File has not been uploaded yet.")
+
+        meme = await self._add_uploaded_meme(upload.title, upload.minio_bucket, upload.minio_path, metadata)
+        # The pending row goes away in the same transaction, so the object is never left unreferenced
+        await self.db.delete(upload)
+        await self.db.commit()
+        await self.db.refresh(meme)
+        return await self._to_response(meme)
+
+    async def complete_resumable_upload(self, id: str) -> MemeResponse:
+        """
+        Создание мема из полностью принятой загрузки по частям.
+
+        Части приходят разными запросами, поэтому собранный объект один раз читается из MinIO потоком:
+        проверяется сигнатура и определяются сведения об изображении. Если файл не является изображением
+        заявленного типа, объект ставится в очередь на удаление, а загрузка отменяется.
+
+        Повторный вызов возвращает уже созданный мем, пока запись о загрузке не истекла.
+
+        Args:
+            id (str): Идентификатор загрузки.
+
+        Returns:
+            MemeResponse: Объект ответа с информацией о созданном меме.
+
+        Raises:
+            HTTPException: Если загрузка не найдена (404), истекла (410), приняты не все байты (409)
+                или файл не является изображением заявленного типа (400).
+        """
+        row = (
+            await self.db.execute(
+                select(ResumableUpload, ResumableUpload.expires_at <= datetime.now(timezone.utc))
+                .where(ResumableUpload.id == id)
+                .with_for_update()
+            )
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found.")
+        upload, expired = row
+        meme_id = upload.meme_id
+        if meme_id is not None:
+            await self.db.rollback()
+            meme = await self.get_meme_by_id(meme_id)
+            if meme is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Meme not found")
+            return meme
+        if expired:
+            await self.db.rollback()
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload has expired.")
+        if not upload.assembled:
+            detail = f"Upload is not finished: {upload.received} of {upload.length} bytes received."
+            await self.db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+        try:
+            metadata = await self.minio_client.run(
+                "inspect",
+                self.minio_client.inspect_object,
+                upload.minio_bucket,
+                upload.minio_path,
+                upload.content_type,
+            )
+        except HTTPException:
+            await enqueue_deletions(self.db, [(upload.minio_bucket, upload.minio_path, upload.length)])
+            await self.db.delete(upload)
+            await self.db.commit()
+            raise
+        meme = await self._add_uploaded_meme(upload.title, upload.minio_bucket, upload.minio_path, metadata)
+        await self.db.flush()
+        # The row is kept until it expires so that a repeated completion returns the same meme
+        upload.meme_id = meme.id
+        upload.expires_at = datetime.now(timezone.utc) + timedelta(seconds=RESUMABLE_UPLOAD_EXPIRES)
+        await self.db.commit()
+        await self.db.refresh(meme)
+        return await self._to_response(meme)
+
+    async def _add_uploaded_meme(
+        self, title: str, bucket_name: str, minio_path: str, metadata: ImageMetadata
+    ) -> Meme:
+        """
+        Добавление мема для объекта, который уже загружен в MinIO, в текущей транзакции.
+
+        Args:
+            title (str): Название мема.
+            bucket_name (str): Название бакета MinIO.
+            minio_path (str): Путь к объекту в бакете MinIO.
+            metadata (ImageMetadata): Сведения о проверенном изображении.
+
+        Returns:
+            Meme: Добавленная строка мема.
+        """
+        now = datetime.now(timezone.utc)
+        meme = Meme(
+            title=title,
+            minio_bucket=bucket_name,
+            minio_path=minio_path,
+            **_metadata_columns(metadata),
+            created_at=now,
+            updated_at=now,
+        )
+        self.db.add(meme)
+        await self._adjust_total(1)
+        await bump_data_version(self.db)
+        return meme
+
+    async def _remove_unreferenced(self, minio_paths: List[str]) -> None:
+        """
+        Постановка в очередь на удаление загруженных файлов, на которые после отката транзакции
+        не ссылается ни одна запись. Перед удалением ссылки проверяются еще раз.
+
+        Args:
+            minio_paths (List[str]): Пути к объектам в MinIO.
+        """
+        try:
+            referenced = set(
+                await self.db.scalars(select(MemeBlob.minio_path).where(MemeBlob.minio_path.in_(minio_paths)))
+            )
+            await enqueue_deletions(
+                self.db, [(self.bucket_name, minio_path, None) for minio_path in set(minio_paths) - referenced]
+            )
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            # The periodic bucket reconciliation will find these objects
+            logger.error(f"Failed to queue uploaded files for deletion: {e}")
+
+    async def get_meme_by_id(self, id: int) -> Optional[MemeResponse]:
         """
         Получение мема по его идентификатору.
 
@@ -143,21 +1011,95 @@ class MemeService:
         Returns:
             Optional[MemeResponse]: Объект ответа с информацией о меме или None, если мем не найден.
         """
-        meme = self.db.query(Meme).filter(Meme.id == id).first()
+        meme = await self.db.get(Meme, id)
         if meme:
-            presigned_url = self.minio_client.get_presigned_url(meme.minio_bucket, meme.minio_path)
-            return MemeResponse(
-                id=meme.id,
-                title=meme.title,
-                minio_bucket=meme.minio_bucket,
-                minio_path=meme.minio_path,
-                minio_url=presigned_url,
-                created_at=meme.created_at,
-                updated_at=meme.updated_at,
-            )
+            return await self._to_response(meme)
         return None
 
-    def update_meme(self, id: int, title: str, file: UploadFile = None) -> Optional[MemeResponse]:
+    async def get_meme_validators(self, id: int) -> Optional[Tuple[str, datetime]]:
+        """
+        Валидаторы мема для условных запросов. Загруженная строка остается в сессии,
+        поэтому последующий get_meme_by_id не делает повторный запрос. Варианты генерируются в фоне
+        и не меняют updated_at, поэтому в ETag входят пути готовых вариантов.
+
+        Args:
+            id (int): Идентификатор мема.
+
+        Returns:
+            Optional[Tuple[str, datetime]]: ETag и время последнего изменения или None, если мем не найден.
+        """
+        meme = await self.db.get(Meme, id)
+        if not meme:
+            return None
+        ready = (await load_ready_variants(self.db, [meme])).get(meme.id, [])
+        variant_paths = sorted(f"{variant.name}={variant.minio_path}" for variant in ready)
+        return make_etag(meme.id, meme.updated_at, *variant_paths), meme.updated_at
+
+    async def open_meme_image(self, id: int) -> Optional[Tuple[CachedObject, BinaryIO]]:
+        """
+        Открытие изображения мема из локального кэша или с загрузкой из MinIO.
+
+        Args:
+            id (int): Идентификатор мема.
+
+        Returns:
+            Optional[Tuple[CachedObject, BinaryIO]]: Описание изображения и открытый файл, который нужно закрыть,
+                или None, если мем не найден.
+
+        Raises:
+            HTTPException: Если изображения нет в хранилище.
+        """
+        meme = await self.db.get(Meme, id)
+        if not meme:
+            return None
+        bucket_name, minio_path = meme.minio_bucket, meme.minio_path
+        # Release the connection while the image is downloaded
+        await self.db.rollback()
+        try:
+            return await get_media_cache().open(self.minio_client, bucket_name, minio_path)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+            raise
+
+    async def get_memes_by_ids_payload(self, ids: List[int]) -> Dict[str, Any]:
+        """
+        Получение нескольких мемов по идентификаторам одним запросом IN с пакетной генерацией presigned URL.
+        Результат - JSON-представление для FastJSONResponse.
+
+        Args:
+            ids (List[int]): Идентификаторы мемов. Повторы игнорируются.
+
+        Returns:
+            Dict[str, Any]: Представление с полями MemesLookupResponse.
+        """
+        ids = list(dict.fromkeys(ids))
+        found = {meme.id: meme for meme in await self.db.scalars(select(Meme).where(Meme.id.in_(ids)))}
+        memes = [found[id] for id in ids if id in found]
+        return {
+            "items": await self._to_payloads(memes),
+            "not_found": [id for id in ids if id not in found],
+        }
+
+    async def get_memes_by_ids(self, ids: List[int]) -> MemesLookupResponse:
+        """
+        Получение нескольких мемов по идентификаторам одним запросом IN с пакетной генерацией presigned URL.
+
+        Args:
+            ids (List[int]): Идентификаторы мемов. Повторы игнорируются.
+
+        Returns:
+            MemesLookupResponse: Найденные мемы в порядке запроса и идентификаторы, которые не найдены.
+        """
+        return MemesLookupResponse.model_validate(await self.get_memes_by_ids_payload(ids))
+
+    async def update_meme(
+        self,
+        id: int,
+        title: str,
+        file: UploadFile = None,
+        before_commit: Optional[Callable[[MemeResponse], Awaitable[None]]] = None,
+    ) -> Optional[MemeResponse]:
         """
         Обновление существующего мема.
 
@@ -165,11 +1107,13 @@ class MemeService:
             id (int): Идентификатор мема.
             title (str): Новое название мема.
             file (UploadFile, optional): Новый файл изображения.
+            before_commit (Optional[Callable[[MemeResponse], Awaitable[None]]]): Вызывается с готовым ответом
+                в транзакции обновления до ее коммита, например чтобы сохранить ответ для Idempotency-Key.
 
         Returns:
             Optional[MemeResponse]: Объект ответа с информацией о меме или None, если мем не найден.
         """
-        meme = self.db.query(Meme).filter(Meme.id == id).first()
+        meme = await self.db.get(Meme, id)
         if not meme:
             return None
         if title:
@@ -181,27 +1125,44 @@ class MemeService:
                     detail="Invalid file type. Only PNG, JPG, and GIF are allowed.",
                 )
 
-            file_extension = file.filename.split(".")[-1].lower()
-            minio_path = f"{uuid.uuid4()}.{file_extension}"
-            self.minio_client.upload_to_minio(bucket_name="memes", minio_path=minio_path, file_data=file.file)
+            minio_path, content_hash, metadata = await self._store_image(file)
+            if meme.content_hash:
+                orphan = await self._release_image(meme.content_hash)
+            else:
+                orphan = (meme.minio_bucket, meme.minio_path, None)
+            # The old image is removed by the storage garbage collector after the commit
+            if orphan is not None and orphan[1] != minio_path:
+                await enqueue_deletions(self.db, [orphan])
+            self.minio_client.invalidate_presigned_url(meme.minio_bucket, meme.minio_path)
             meme.minio_path = minio_path
+            meme.content_hash = content_hash
+            for column, value in _metadata_columns(metadata).items():
+                setattr(meme, column, value)
         meme.updated_at = datetime.now(timezone.utc)
-        self.db.commit()
-        self.db.refresh(meme)
-        presigned_url = self.minio_client.get_presigned_url(meme.minio_bucket, meme.minio_path)
-        return MemeResponse(
-            id=meme.id,
-            title=meme.title,
-            minio_bucket=meme.minio_bucket,
-            minio_path=meme.minio_path,
-            minio_url=presigned_url,
-            created_at=meme.created_at,
-            updated_at=meme.updated_at,
-        )
+        await bump_data_version(self.db)
+        response = None
+        try:
+            if before_commit is not None:
+                await self.db.flush()
+                response = await self._to_response(meme)
+                await before_commit(response)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            if file:
+                await self._remove_unreferenced([minio_path])
+            raise
+        if response is not None:
+            return response
+        await self.db.refresh(meme)
+        return await self._to_response(meme)
 
-    def delete_meme(self, id: int) -> bool:
+    async def delete_meme(self, id: int) -> bool:
         """
-        Удаление мема по его идентификатору и удаление соответствующего файла из MinIO.
+        Удаление мема по его идентификатору.
+
+        Файлы изображения и вариантов ставятся в очередь на удаление в той же транзакции
+        и удаляются из MinIO в фоне (см. StorageGCService).
 
         Args:
             id (int): Идентификатор мема.
@@ -209,15 +1170,25 @@ class MemeService:
         Returns:
             bool: True, если мем был успешно удален, иначе False.
         """
-        meme = self.db.query(Meme).filter(Meme.id == id).first()
+        meme = await self.db.get(Meme, id)
         if not meme:
             return False
-        try:
-            # Удаление файла из MinIO
-            self.minio_client.client.remove_object(meme.minio_bucket, meme.minio_path)
-        except S3Error as e:
-            logger.error(f"Failed to delete file from MinIO: {e}")
-            raise HTTPException(status_code=500, detail="Failed to delete file from storage")
-        self.db.delete(meme)
-        self.db.commit()
+        variants = (
+            await self.db.execute(
+                delete(MemeVariant)
+                .where(MemeVariant.meme_id == id)
+                .returning(MemeVariant.minio_bucket, MemeVariant.minio_path, MemeVariant.size)
+            )
+        ).all()
+        await self.db.delete(meme)
+        if meme.content_hash:
+            # The image may be shared: it is removed only together with the last reference
+            orphan = await self._release_image(meme.content_hash)
+        else:
+            orphan = (meme.minio_bucket, meme.minio_path, None)
+        await enqueue_deletions(self.db, [tuple(row) for row in ([orphan] if orphan else []) + variants])
+        await self._adjust_total(-1)
+        await bump_data_version(self.db)
+        await self.db.commit()
+        self.minio_client.invalidate_presigned_url(meme.minio_bucket, meme.minio_path)
         return True
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+from app.models.meme_stats import MemeStats
+
+
+async def bump_data_version(db: AsyncSession) -> None:
+    """
+    Увеличение версии данных мемов в текущей транзакции. Вызывается каждой операцией записи,
+    чтобы кэши ответов во всех процессах перестали отдавать старые страницы после коммита.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+    """
+    await db.execute(update(MemeStats).where(MemeStats.name == "version").values(value=MemeStats.value + 1))
+
+
+async def get_data_version(db: AsyncSession) -> Optional[int]:
+    """
+    Текущая версия данных мемов.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+
+    Returns:
+        Optional[int]: Версия или None, если счетчик версии не заведен.
+    """
+    return await db.scalar(select(MemeStats.value).where(MemeStats.name == "version"))
+
+
+class ResponseCache:
+    """
+    Потокобезопасный LRU-кэш ответов, привязанных к версии данных. Запись считается актуальной, пока версия
+    данных не изменилась и с момента ее сохранения прошло не больше ttl секунд.
+
+    Attributes:
+        max_size (int): Максимальное количество записей.
+        ttl (float): Максимальный возраст записи в секундах.
+        hits (int): Количество попаданий в кэш.
+        misses (int): Количество промахов.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        """
+        Получение ответа из кэша.
+
+        Args:
+            key (Hashable): Параметры запроса.
+            version (int): Текущая версия данных.
+
+        Returns:
+            Optional[Any]: Ответ или None, если актуальной записи нет.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and self._clock() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, version: int, value: Any) -> None:
+        """
+        Сохранение ответа в кэш с вытеснением самых давно использованных записей.
+
+        Args:
+            key (Hashable): Параметры запроса.
+            version (int): Версия данных, по которой построен ответ.
+            value (Any): Ответ.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def get_or_build(
+        self,
+        db: AsyncSession,
+        key: Hashable,
+        build: Callable[[], Awaitable[Any]],
+        version: Optional[int] = None,
+    ) -> Any:
+        """
+        Получение ответа из кэша или построение и сохранение нового.
+
+        Версия данных читается до построения ответа, поэтому ответ, построенный во время записи,
+        сохраняется под старой версией и не будет отдан после ее коммита.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия базы данных.
+            key (Hashable): Параметры запроса.
+            build (Callable[[], Awaitable[Any]]): Построение ответа.
+            version (Optional[int]): Уже прочитанная версия данных (например, для ETag). Если не задана,
+                читается из базы данных.
+
+        Returns:
+            Any: Ответ.
+        """
+        if version is None:
+            version = await get_data_version(db)
+        if version is None:
+            return await build()
+        cached = self.get(key, version)
+        if cached is not None:
+            return cached
+        value = await build()
+        self.set(key, version, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики кэша.
+
+        Returns:
+            Dict[str, int]: Размер кэша, количество попаданий и промахов.
+        """
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# List pages of the public service; disabled caches keep no entries
+list_response_cache = ResponseCache(
+    max_size=RESPONSE_CACHE_SIZE if RESPONSE_CACHE_ENABLED else 0, ttl=RESPONSE_CACHE_TTL
+)
@@ -0,0 +1,302 @@
+import base64
+import binascii
+import logging
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException, status
+from minio.datatypes import Part
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
+from app.config import MAX_UPLOAD_SIZE, RESUMABLE_UPLOAD_EXPIRES, UPLOAD_PART_SIZE
+from app.minio_service import MinioService
+from app.models.resumable_upload import ResumableUpload
+from app.services.meme_service import IMAGE_EXTENSIONS
+from app.services.storage_gc_service import enqueue_deletions
+from app.upload_pipeline import ByteBudget, upload_budget
+
+logger = logging.getLogger("resources")
+
+TUS_VERSION = "1.0.0"
+
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """
+    Разбор заголовка Upload-Metadata протокола tus: пары "ключ значение-в-base64" через запятую.
+
+    Args:
+        header (Optional[str]): Значение заголовка.
+
+    Returns:
+        Dict[str, str]: Декодированные значения по ключам. Ключ без значения дает пустую строку.
+
+    Raises:
+        HTTPException: Если значение не является корректным base64 в UTF-8.
+    """
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value.strip(), validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid Upload-Metadata value for '{key}'."
+            )
+    return metadata
+
+
+class ResumableUploadService:
+    def __init__(
+        self,
+        db: AsyncSession,
+        minio_client: MinioService,
+        bucket_name: str = "memes",
+        part_size: int = UPLOAD_PART_SIZE,
+        budget: Optional[ByteBudget] = None,
+    ):
+        """
+        Инициализация ResumableUploadService с подключением к базе данных и MinIO.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия базы данных.
+            minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+            bucket_name (str): Бакет для загружаемых изображений.
+            part_size (int): Размер части multipart upload в байтах.
+            budget (Optional[ByteBudget]): Бюджет памяти. По умолчанию общий бюджет загрузок процесса.
+        """
+        self.db = db
+        self.minio_client = minio_client
+        self.bucket_name = bucket_name
+        self.part_size = part_size
+        self.budget = budget or upload_budget
+
+    async def create_upload(self, title: str, content_type: str, length: int) -> ResumableUpload:
+        """
+        Начало загрузки по частям: создание multipart upload в MinIO и записи о загрузке.
+
+        Args:
+            title (str): Название будущего мема.
+            content_type (str): Тип изображения: image/png, image/jpeg или image/gif.
+            length (int): Полный размер файла в байтах.
+
+        Returns:
+            ResumableUpload: Созданная загрузка.
+
+        Raises:
+            HTTPException: Если название пустое, тип не поддерживается или размер некорректен.
+        """
+        if not title:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Title must not be empty.")
+        extension = IMAGE_EXTENSIONS.get(content_type)
+        if extension is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid file type. Only PNG, JPG, and GIF are allowed.",
+            )
+        if length <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload-Length must be positive.")
+        if length > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File is too large. Maximum size is {MAX_UPLOAD_SIZE} bytes.",
+            )
+        minio_path = f"{uuid.uuid4()}.{extension}"
+        upload_id = await self.minio_client.run(
+            "upload", self.minio_client.create_multipart_upload, self.bucket_name, minio_path, content_type
+        )
+        upload = ResumableUpload(
+            id=secrets.token_urlsafe(24),
+            title=title,
+            content_type=content_type,
+            minio_bucket=self.bucket_name,
+            minio_path=minio_path,
+            length=length,
+            received=0,
+            multipart_upload_id=upload_id,
+            parts=[],
+            tail_size=0,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=RESUMABLE_UPLOAD_EXPIRES),
+        )
+        self.db.add(upload)
+        await self.db.commit()
+        return upload
+
+    async def get_upload(self, id: str) -> ResumableUpload:
+        """
+        Получение незавершенной или завершенной загрузки, срок которой не истек.
+
+        Args:
+            id (str): Идентификатор загрузки.
+
+        Returns:
+            ResumableUpload: Загрузка.
+
+        Raises:
+            HTTPException: Если загрузка не найдена (404) или истекла (410).
+        """
+        query = select(ResumableUpload, ResumableUpload.expires_at <= datetime.now(timezone.utc)).where(
+            ResumableUpload.id == id
+        )
+        row = (await self.db.execute(query)).first()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found.")
+        upload, expired = row
+        if expired:
+            await self.db.rollback()
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload has expired.")
+        return upload
+
+    async def append(self, id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """
+        Прием очередного фрагмента файла, начиная с offset.
+
+        Байты собираются в части по part_size и отправляются в MinIO как части multipart upload.
+        Номера частей определяются сохраненным состоянием, поэтому повтор после ошибки перезаписывает
+        те же части. Если клиент оборвал соединение, уже принятые байты сохраняются, и загрузку можно
+        продолжить с нового смещения. После последнего байта объект собирается в MinIO.
+
+        Пока принимается тело запроса, строка загрузки не заблокирована и соединение с базой возвращено в пул.
+        Новое состояние сохраняется условным UPDATE по прежнему received: если параллельный запрос
+        с тем же смещением успел раньше, фрагмент отклоняется с 409. Объект собирается в MinIO после
+        этого UPDATE и до коммита, поэтому его собирает только запрос, чье состояние сохранено.
+
+        Args:
+            id (str): Идентификатор загрузки.
+            offset (int): Смещение фрагмента (заголовок Upload-Offset).
+            chunks (AsyncIterator[bytes]): Тело запроса.
+
+        Returns:
+            int: Количество принятых байтов после фрагмента.
+
+        Raises:
+            HTTPException: Если загрузка не найдена (404) или истекла (410), смещение не совпадает
+                с принятым или его занял параллельный запрос (409), или фрагмент выходит за Upload-Length (413).
+        """
+        upload = await self.get_upload(id)
+        # Nothing is written yet: end the read transaction so the body streams without a pooled connection
+        await self.db.commit()
+        received = upload.received
+        if offset != received:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload-Offset {offset} does not match the {received} bytes received.",
+            )
+        if upload.assembled:
+            return received
+
+        # The buffer never grows past one part, but turning it into a part briefly holds a second copy
+        held = await self.budget.acquire(2 * self.part_size)
+        try:
+            buffer = bytearray()
+            if upload.tail_size:
+                buffer += await self.minio_client.run(
+                    "download", self.minio_client.get_object_bytes, upload.minio_bucket, upload.tail_path
+                )
+            parts: List[List] = list(upload.parts)
+            try:
+                async for chunk in chunks:
+                    if received + len(chunk) > upload.length:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Upload goes past Upload-Length of {upload.length} bytes.",
+                        )
+                    received += len(chunk)
+                    view = memoryview(chunk)
+                    while view:
+                        taken = min(self.part_size - len(buffer), len(view))
+                        buffer += view[:taken]
+                        view = view[taken:]
+                        if len(buffer) == self.part_size:
+                            part = bytes(buffer)
+                            buffer.clear()
+                            parts.append(await self._upload_part(upload, len(parts) + 1, part))
+            except ClientDisconnect:
+                # Keep what arrived; the client asks for the offset and continues from there
+                logger.info(f"Client disconnected from upload '{id}' after {received} of {upload.length} bytes.")
+            if received == offset:
+                return received
+
+            if received == upload.length:
+                if buffer or not parts:
+                    parts.append(await self._upload_part(upload, len(parts) + 1, bytes(buffer)))
+                    buffer.clear()
+            tail_path = None
+            if buffer:
+                # A new key per request: neither a failed commit nor a concurrent request overwrites the stored tail
+                tail_path = f"resumable/{upload.id}/{received}-{secrets.token_hex(4)}"
+                await self.minio_client.run(
+                    "upload",
+                    self.minio_client.put_bytes,
+                    upload.minio_bucket,
+                    tail_path,
+                    bytes(buffer),
+                    "application/octet-stream",
+                )
+            if upload.tail_path is not None:
+                await enqueue_deletions(self.db, [(upload.minio_bucket, upload.tail_path, upload.tail_size or None)])
+            saved = await self.db.execute(
+                update(ResumableUpload)
+                .where(ResumableUpload.id == id, ResumableUpload.received == offset)
+                .values(
+                    tail_path=tail_path,
+                    tail_size=len(buffer),
+                    parts=parts,
+                    received=received,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=RESUMABLE_UPLOAD_EXPIRES),
+                )
+            )
+            if saved.rowcount == 0:
+                bucket_name = upload.minio_bucket
+                await self.db.rollback()
+                if tail_path is not None:
+                    await enqueue_deletions(self.db, [(bucket_name, tail_path, len(buffer))])
+                    await self.db.commit()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Bytes at Upload-Offset {offset} were already received by a concurrent request.",
+                )
+            if received == upload.length:
+                # The updated row stays locked until the commit: a concurrent final request waits for it,
+                # then matches no row and gets 409 instead of completing the multipart upload a second time
+                await self.minio_client.run(
+                    "upload",
+                    self.minio_client.complete_multipart_upload,
+                    upload.minio_bucket,
+                    upload.minio_path,
+                    upload.multipart_upload_id,
+                    [Part(number, etag) for number, etag in parts],
+                )
+            await self.db.commit()
+            return received
+        except BaseException:
+            await self.db.rollback()
+            raise
+        finally:
+            self.budget.release(held)
+
+    async def _upload_part(self, upload: ResumableUpload, part_number: int, data: bytes) -> List:
+        """
+        Отправка части multipart upload.
+
+        Args:
+            upload (ResumableUpload): Загрузка.
+            part_number (int): Номер части, начиная с 1.
+            data (bytes): Содержимое части.
+
+        Returns:
+            List: Номер части и ее ETag для сохранения в ResumableUpload.parts.
+        """
+        part = await self.minio_client.run(
+            "upload_part",
+            self.minio_client.upload_part,
+            upload.minio_bucket,
+            upload.minio_path,
+            upload.multipart_upload_id,
+            part_number,
+            data,
+        )
+        return [part.part_number, part.etag]
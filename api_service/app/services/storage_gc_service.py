@@ -0,0 +1,511 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import delete, func, select, text, union, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker
+from app.config import (
+    STORAGE_GC_BATCH_SIZE,
+    STORAGE_GC_INTERVAL,
+    STORAGE_GC_ORPHAN_MIN_AGE,
+    STORAGE_GC_RECONCILE_INTERVAL,
+)
+from app.metrics import STORAGE_GC_FAILURES, STORAGE_GC_RECLAIMED, STORAGE_GC_REMOVED
+from app.minio_service import MinioService
+from app.models.meme import Meme
+from app.models.meme_blob import MemeBlob
+from app.models.meme_stats import MemeStats
+from app.models.meme_variant import MemeVariant
+from app.models.pending_deletion import PendingDeletion
+from app.models.pending_upload import PendingUpload
+from app.models.resumable_upload import ResumableUpload
+from app.models.storage_responses import StorageGCStatsResponse
+from app.services.idempotency_service import IdempotencyService
+
+logger = logging.getLogger("resources")
+
+# Retry delay after a failed removal doubles per attempt up to this many seconds
+MAX_RETRY_DELAY = 3600
+# Session-level advisory lock held by the one process that runs the background loop
+STORAGE_GC_LOCK_ID = 0x6D656D65
+
+
+async def enqueue_deletions(db: AsyncSession, objects: Iterable[Tuple[str, str, Optional[int]]]) -> None:
+    """
+    Постановка объектов MinIO в очередь на удаление в текущей транзакции.
+    Объекты, которые уже стоят в очереди, пропускаются.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        objects (Iterable[Tuple[str, str, Optional[int]]]): Бакет, путь и размер объекта (None, если неизвестен).
+    """
+    rows = {
+        (bucket_name, minio_path): {"minio_bucket": bucket_name, "minio_path": minio_path, "size": size}
+        for bucket_name, minio_path, size in objects
+    }
+    if rows:
+        insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        await db.execute(
+            insert(PendingDeletion).on_conflict_do_nothing(
+                index_elements=[PendingDeletion.minio_bucket, PendingDeletion.minio_path]
+            ),
+            list(rows.values()),
+        )
+
+
+async def lock_object(db: AsyncSession, bucket_name: str, minio_path: str) -> None:
+    """
+    Блокировка пути объекта MinIO до конца текущей транзакции (pg_advisory_xact_lock).
+
+    Загрузка, которая пишет объект под ключом из SHA-256 содержимого, берет блокировку до записи в MinIO,
+    а разбор очереди удаления - на время проверки ссылок и удаления. Поэтому удаление не сотрет объект,
+    загруженный повторно, пока запись о нем еще не закоммичена. В SQLite блокировка не нужна:
+    транзакции записи там выполняются по одной.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        bucket_name (str): Название бакета.
+        minio_path (str): Путь к объекту в бакете.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"{bucket_name}/{minio_path}"))))
+
+
+async def try_lock_objects(db: AsyncSession, objects: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    """
+    Попытка взять блокировки lock_object без ожидания.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        objects (Iterable[Tuple[str, str]]): Пары (бакет, путь к объекту).
+
+    Returns:
+        Set[Tuple[str, str]]: Объекты, блокировки которых получены до конца транзакции.
+    """
+    objects = set(objects)
+    if db.get_bind().dialect.name != "postgresql" or not objects:
+        return objects
+    keys = {f"{bucket_name}/{minio_path}": (bucket_name, minio_path) for bucket_name, minio_path in objects}
+    locked = await db.scalars(
+        text(
+            "SELECT key FROM unnest(CAST(:keys AS text[])) AS key WHERE pg_try_advisory_xact_lock(hashtext(key))"
+        ).bindparams(keys=list(keys))
+    )
+    return {keys[key] for key in locked}
+
+
+class DrainResult(NamedTuple):
+    """
+    Итог одного прохода по очереди удаления.
+    """
+
+    processed: int
+    removed: int
+    bytes_reclaimed: int
+    failed: int
+
+
+class ReconcileResult(NamedTuple):
+    """
+    Итог сверки содержимого бакета с базой данных.
+    """
+
+    scanned: int
+    queued: int
+    queued_bytes: int
+
+
+class StorageGCService:
+    def __init__(self, db: AsyncSession, minio_client: MinioService, bucket_name: str = "memes"):
+        """
+        Инициализация StorageGCService с подключением к базе данных и MinIO.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия базы данных.
+            minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+            bucket_name (str): Бакет, который сверяется с базой данных.
+        """
+        self.db = db
+        self.minio_client = minio_client
+        self.bucket_name = bucket_name
+
+    async def _referenced(self, minio_paths: Iterable[str]) -> Set[str]:
+        """
+        Пути, на которые ссылается мем, общее изображение, вариант или незавершенная загрузка
+        (включая уже принятые байты загрузки по частям).
+
+        Args:
+            minio_paths (Iterable[str]): Проверяемые пути.
+
+        Returns:
+            Set[str]: Пути из minio_paths, которые еще используются.
+        """
+        minio_paths = list(set(minio_paths))
+        if not minio_paths:
+            return set()
+        query = union(
+            select(Meme.minio_path).where(Meme.minio_path.in_(minio_paths)),
+            select(MemeBlob.minio_path).where(MemeBlob.minio_path.in_(minio_paths)),
+            select(MemeVariant.minio_path).where(MemeVariant.minio_path.in_(minio_paths)),
+            select(PendingUpload.minio_path).where(PendingUpload.minio_path.in_(minio_paths)),
+            select(ResumableUpload.minio_path).where(ResumableUpload.minio_path.in_(minio_paths)),
+            select(ResumableUpload.tail_path).where(ResumableUpload.tail_path.in_(minio_paths)),
+        )
+        return set(await self.db.scalars(query))
+
+    async def expire_uploads(self, batch_size: int = STORAGE_GC_BATCH_SIZE) -> int:
+        """
+        Отмена незавершенных загрузок напрямую в MinIO, срок которых истек: строки удаляются,
+        а объекты (если клиент успел их загрузить) ставятся в очередь на удаление.
+
+        Args:
+            batch_size (int): Максимальное количество загрузок за проход.
+
+        Returns:
+            int: Количество отмененных загрузок.
+        """
+        uploads = (
+            await self.db.scalars(
+                select(PendingUpload)
+                .where(PendingUpload.expires_at <= datetime.now(timezone.utc))
+                .order_by(PendingUpload.expires_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not uploads:
+            await self.db.rollback()
+            return 0
+        # Uploads that never started have no object; the drainer treats missing objects as removed
+        await enqueue_deletions(self.db, [(upload.minio_bucket, upload.minio_path, None) for upload in uploads])
+        await self.db.execute(delete(PendingUpload).where(PendingUpload.token.in_([upload.token for upload in uploads])))
+        await self.db.commit()
+        logger.info(f"Expired {len(uploads)} unfinished direct uploads.")
+        return len(uploads)
+
+    async def expire_resumable_uploads(self, batch_size: int = STORAGE_GC_BATCH_SIZE) -> int:
+        """
+        Удаление записей о загрузках по частям, срок которых истек. У незавершенных загрузок multipart
+        upload в MinIO отменяется, а собранный объект и принятый остаток ставятся в очередь на удаление.
+        Объект загрузки, из которой уже создан мем, остается.
+
+        Args:
+            batch_size (int): Максимальное количество загрузок за проход.
+
+        Returns:
+            int: Количество удаленных записей.
+        """
+        uploads = (
+            await self.db.scalars(
+                select(ResumableUpload)
+                .where(ResumableUpload.expires_at <= datetime.now(timezone.utc))
+                .order_by(ResumableUpload.expires_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not uploads:
+            await self.db.rollback()
+            return 0
+        objects: List[Tuple[str, str, Optional[int]]] = []
+        for upload in uploads:
+            if upload.tail_path is not None:
+                objects.append((upload.minio_bucket, upload.tail_path, upload.tail_size))
+            if upload.meme_id is not None:
+                continue
+            if upload.assembled:
+                objects.append((upload.minio_bucket, upload.minio_path, upload.length))
+                continue
+            try:
+                await self.minio_client.run(
+                    "remove",
+                    self.minio_client.abort_multipart_upload,
+                    upload.minio_bucket,
+                    upload.minio_path,
+                    upload.multipart_upload_id,
+                )
+            except Exception as e:
+                # MinIO also drops stale multipart uploads by its own lifecycle
+                logger.error(f"Failed to abort multipart upload of '{upload.minio_path}': {e}")
+        await enqueue_deletions(self.db, objects)
+        await self.db.execute(delete(ResumableUpload).where(ResumableUpload.id.in_([upload.id for upload in uploads])))
+        await self.db.commit()
+        logger.info(f"Expired {len(uploads)} resumable uploads.")
+        return len(uploads)
+
+    async def drain_deletion_queue(self, batch_size: int = STORAGE_GC_BATCH_SIZE) -> DrainResult:
+        """
+        Удаление из MinIO очередной пачки объектов из очереди пакетными запросами DeleteObjects.
+
+        Строки выбираются с FOR UPDATE SKIP LOCKED, поэтому очередь можно разбирать из нескольких процессов.
+        Объекты, на которые снова ссылается запись (например, то же изображение загрузили повторно
+        с дедупликацией), не удаляются. Проверка ссылок и удаление идут под блокировкой lock_object;
+        объекты, которые сейчас загружаются, остаются до следующего прохода. После ошибки попытка
+        откладывается с экспоненциальной задержкой.
+
+        Args:
+            batch_size (int): Максимальное количество объектов за проход.
+
+        Returns:
+            DrainResult: Количество обработанных, удаленных и неудачных объектов и освобожденный объем.
+        """
+        now = datetime.now(timezone.utc)
+        rows = (
+            await self.db.scalars(
+                select(PendingDeletion)
+                .where(PendingDeletion.not_before <= now)
+                .order_by(PendingDeletion.not_before, PendingDeletion.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not rows:
+            await self.db.rollback()
+            return DrainResult(processed=0, removed=0, bytes_reclaimed=0, failed=0)
+
+        # An upload holding the lock may be re-creating the object; leave those rows for the next pass
+        locked = await try_lock_objects(self.db, [(row.minio_bucket, row.minio_path) for row in rows])
+        rows = [row for row in rows if (row.minio_bucket, row.minio_path) in locked]
+        referenced = await self._referenced(row.minio_path for row in rows)
+        to_remove = [row for row in rows if row.minio_path not in referenced]
+        unknown = [(row.minio_bucket, row.minio_path) for row in to_remove if row.size is None]
+        sizes = await self.minio_client.run("stat", self.minio_client.get_object_sizes, unknown) if unknown else {}
+        by_bucket = defaultdict(list)
+        for row in to_remove:
+            by_bucket[row.minio_bucket].append(row.minio_path)
+        errors = {}
+        for bucket_name, names in by_bucket.items():
+            try:
+                failed = await self.minio_client.run("remove", self.minio_client.remove_objects, bucket_name, names)
+            except Exception as e:
+                failed = {name: str(e) for name in names}
+            errors.update({(bucket_name, name): error for name, error in failed.items()})
+
+        done, removed, reclaimed = [], 0, 0
+        for row in rows:
+            error = errors.get((row.minio_bucket, row.minio_path))
+            if error is None:
+                done.append(row.id)
+                if row.minio_path not in referenced:
+                    removed += 1
+                    reclaimed += row.size if row.size is not None else sizes.get((row.minio_bucket, row.minio_path), 0)
+                continue
+            row.attempts += 1
+            row.last_error = error[:1000]
+            row.not_before = now + timedelta(seconds=min(2 ** row.attempts, MAX_RETRY_DELAY))
+            logger.error(f"Failed to delete '{row.minio_path}' from MinIO (attempt {row.attempts}): {error}")
+        if done:
+            await self.db.execute(delete(PendingDeletion).where(PendingDeletion.id.in_(done)))
+        for name, value in (("reclaimed_bytes", reclaimed), ("reclaimed_objects", removed)):
+            await self.db.execute(update(MemeStats).where(MemeStats.name == name).values(value=MemeStats.value + value))
+        await self.db.commit()
+        STORAGE_GC_REMOVED.inc(removed)
+        STORAGE_GC_RECLAIMED.inc(reclaimed)
+        STORAGE_GC_FAILURES.inc(len(errors))
+        if removed:
+            logger.info(f"Removed {removed} objects ({reclaimed} bytes) from MinIO.")
+        return DrainResult(processed=len(rows), removed=removed, bytes_reclaimed=reclaimed, failed=len(errors))
+
+    async def reconcile_orphans(
+        self, chunk_size: int = 1000, min_age: float = STORAGE_GC_ORPHAN_MIN_AGE
+    ) -> ReconcileResult:
+        """
+        Сверка содержимого бакета с базой данных и постановка в очередь объектов, на которые ничего не ссылается.
+
+        Бакет просматривается по chunk_size ключей, каждая пачка проверяется одним запросом, поэтому
+        ни список объектов, ни набор путей из базы не загружаются целиком. Объекты моложе min_age
+        пропускаются: их загрузка могла еще не дойти до коммита записи.
+
+        Args:
+            chunk_size (int): Количество ключей в одной пачке.
+            min_age (float): Минимальный возраст объекта в секундах.
+
+        Returns:
+            ReconcileResult: Количество просмотренных объектов, поставленных в очередь и их объем.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=min_age)
+        scanned, queued, queued_bytes = 0, 0, 0
+        start_after = None
+        while True:
+            page = await self.minio_client.run(
+                "list", self.minio_client.list_objects_page, self.bucket_name, start_after, chunk_size
+            )
+            if not page:
+                break
+            start_after = page[-1][0]
+            scanned += len(page)
+            names = [name for name, _, _ in page]
+            known = await self._referenced(names)
+            known.update(
+                await self.db.scalars(
+                    select(PendingDeletion.minio_path).where(
+                        PendingDeletion.minio_bucket == self.bucket_name, PendingDeletion.minio_path.in_(names)
+                    )
+                )
+            )
+            orphans: List[Tuple[str, str, Optional[int]]] = [
+                (self.bucket_name, name, size)
+                for name, size, last_modified in page
+                if name not in known and last_modified is not None and last_modified < cutoff
+            ]
+            await enqueue_deletions(self.db, orphans)
+            await self.db.commit()
+            queued += len(orphans)
+            queued_bytes += sum(size or 0 for _, _, size in orphans)
+            if len(page) < chunk_size:
+                break
+        logger.info(f"Reconciled {scanned} objects in '{self.bucket_name}': {queued} orphans ({queued_bytes} bytes) queued.")
+        return ReconcileResult(scanned=scanned, queued=queued, queued_bytes=queued_bytes)
+
+    async def get_stats(self) -> StorageGCStatsResponse:
+        """
+        Состояние очереди удаления и итоги фонового удаления.
+
+        Returns:
+            StorageGCStatsResponse: Глубина и объем очереди и освобожденный объем.
+        """
+        depth, queued_bytes, failing, oldest = (
+            await self.db.execute(
+                select(
+                    func.count(),
+                    func.coalesce(func.sum(PendingDeletion.size), 0),
+                    func.count().filter(PendingDeletion.attempts > 0),
+                    func.min(PendingDeletion.enqueued_at),
+                ).select_from(PendingDeletion)
+            )
+        ).one()
+        totals = dict(
+            (
+                await self.db.execute(
+                    select(MemeStats.name, MemeStats.value).where(
+                        MemeStats.name.in_(["reclaimed_bytes", "reclaimed_objects"])
+                    )
+                )
+            ).all()
+        )
+        return StorageGCStatsResponse(
+            queue_depth=depth,
+            queued_bytes=queued_bytes,
+            failing=failing,
+            oldest_enqueued_at=oldest,
+            bytes_reclaimed=totals.get("reclaimed_bytes", 0),
+            objects_reclaimed=totals.get("reclaimed_objects", 0),
+        )
+
+
+async def _acquire_gc_leadership(connection: AsyncConnection) -> bool:
+    """
+    Попытка стать процессом, который выполняет фоновое удаление. Блокировка pg_try_advisory_lock
+    принадлежит соединению и снимается, когда оно закрывается. В SQLite процесс всегда один.
+
+    Args:
+        connection (AsyncConnection): Соединение, которое держит блокировку.
+
+    Returns:
+        bool: True, если блокировка получена.
+    """
+    if connection.dialect.name != "postgresql":
+        return True
+    acquired = (await connection.execute(select(func.pg_try_advisory_lock(STORAGE_GC_LOCK_ID)))).scalar()
+    await connection.commit()
+    return bool(acquired)
+
+
+async def _storage_gc_pass(
+    session_factory: async_sessionmaker, minio_client: MinioService, batch_size: int, reconcile: bool
+) -> None:
+    async with session_factory() as db:
+        gc_service = StorageGCService(db, minio_client)
+        while await gc_service.expire_uploads(batch_size) == batch_size:
+            pass
+        while await gc_service.expire_resumable_uploads(batch_size) == batch_size:
+            pass
+        # Housekeeping of the write path shares this loop
+        await IdempotencyService(db).purge_expired()
+        # Keep going while batches come back full
+        while (await gc_service.drain_deletion_queue(batch_size)).processed == batch_size:
+            pass
+        if reconcile:
+            await gc_service.reconcile_orphans()
+
+
+async def run_storage_gc(
+    session_factory: async_sessionmaker,
+    minio_client: MinioService,
+    interval: float = STORAGE_GC_INTERVAL,
+    reconcile_interval: float = STORAGE_GC_RECONCILE_INTERVAL,
+    batch_size: int = STORAGE_GC_BATCH_SIZE,
+) -> None:
+    """
+    Фоновый цикл: отмена истекших загрузок, удаление истекших ключей идемпотентности и разбор
+    очереди удаления каждые interval секунд, сверка бакета каждые reconcile_interval секунд.
+
+    Цикл запускается в каждом воркере, но работает только в одном: в том, который получил
+    сессионную advisory-блокировку STORAGE_GC_LOCK_ID на отдельном соединении. Остальные раз
+    в interval секунд пробуют ее получить и подменяют лидера, если его соединение закрылось.
+
+    Args:
+        session_factory (async_sessionmaker): Фабрика сессий базы данных.
+        minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+        interval (float): Пауза между проходами по очереди в секундах.
+        reconcile_interval (float): Пауза между сверками бакета в секундах.
+        batch_size (int): Максимальное количество объектов за один запрос к очереди.
+    """
+    engine = session_factory.kw["bind"]
+    while True:
+        try:
+            async with engine.connect() as leader:
+                if await _acquire_gc_leadership(leader):
+                    try:
+                        last_reconcile = time.monotonic()
+                        while True:
+                            reconcile = time.monotonic() - last_reconcile >= reconcile_interval
+                            if reconcile:
+                                last_reconcile = time.monotonic()
+                            try:
+                                await _storage_gc_pass(session_factory, minio_client, batch_size, reconcile)
+                            except Exception as e:
+                                logger.error(f"Storage garbage collection failed: {e}")
+                            await asyncio.sleep(interval)
+                            # Fails once the connection holding the lock is gone, and another worker may lead
+                            await leader.execute(select(1))
+                            await leader.commit()
+                    finally:
+                        # Closing the connection releases the lock instead of returning it to the pool still held
+                        await leader.invalidate()
+        except Exception as e:
+            logger.error(f"Storage garbage collection leadership failed: {e}")
+        await asyncio.sleep(interval)
+
+
+_gc_task: Optional[asyncio.Task] = None
+
+
+def start_storage_gc(session_factory: async_sessionmaker, minio_client: MinioService) -> None:
+    """
+    Запуск фонового удаления объектов в текущем event loop.
+
+    Args:
+        session_factory (async_sessionmaker): Фабрика сессий базы данных.
+        minio_client (MinioService): Клиент MinIO для работы с файловым хранилищем.
+    """
+    global _gc_task
+    if _gc_task is None:
+        _gc_task = asyncio.create_task(run_storage_gc(session_factory, minio_client))
+
+
+async def stop_storage_gc() -> None:
+    """
+    Остановка фонового удаления объектов. Незавершенные удаления остаются в очереди.
+    """
+    global _gc_task
+    if _gc_task is not None:
+        _gc_task.cancel()
+        try:
+            await _gc_task
+        except asyncio.CancelledError:
+            pass
+        _gc_task = None
@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import BinaryIO, Deque, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from minio.datatypes import Part
+from app.image_metadata import ImageInspector, ImageMetadata
+from app.config import MAX_UPLOAD_SIZE, UPLOAD_MEMORY_BUDGET, UPLOAD_PART_CONCURRENCY, UPLOAD_PART_SIZE
+from app.minio_service import MinioService
+
+logger = logging.getLogger("resources")
+
+
+class ByteBudget:
+    """
+    Общий для процесса бюджет памяти под загрузки. Каждая часть файла резервирует свой размер до чтения
+    и освобождает его после отправки в MinIO; ожидающие обслуживаются в порядке очереди.
+
+    Attributes:
+        capacity (int): Максимальный объем памяти в байтах.
+        available (int): Свободный объем в байтах.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.available = capacity
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    async def acquire(self, amount: int) -> int:
+        """
+        Резервирование памяти. Ждет, пока объем не освободится.
+
+        Args:
+            amount (int): Запрашиваемый объем в байтах. Ограничивается сверху capacity.
+
+        Returns:
+            int: Фактически зарезервированный объем, который нужно передать в release.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            if not self._waiters and self.available >= amount:
+                self.available -= amount
+                return amount
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((amount, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (amount, future) in self._waiters:
+                    self._waiters.remove((amount, future))
+                    raise
+            if future.done() and not future.cancelled():
+                self.release(amount)
+            raise
+        return amount
+
+    def release(self, amount: int) -> None:
+        """
+        Возврат памяти в бюджет и пробуждение ожидающих.
+
+        Args:
+            amount (int): Объем, полученный из acquire.
+        """
+        with self._lock:
+            self.available += amount
+            while self._waiters and self._waiters[0][0] <= self.available:
+                granted, future = self._waiters.popleft()
+                self.available -= granted
+                future.get_loop().call_soon_threadsafe(self._grant, future, granted)
+
+    def _grant(self, future: asyncio.Future, amount: int) -> None:
+        # Runs in the waiter's loop; a waiter cancelled in the meantime gives its share back
+        if future.done():
+            self.release(amount)
+        else:
+            future.set_result(None)
+
+
+# Caps the memory held by all in-flight uploads of this process
+upload_budget = ByteBudget(UPLOAD_MEMORY_BUDGET)
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is too large. Maximum size is {max_size} bytes.",
+    )
+
+
+def _inspect_stream(stream: BinaryIO, chunk_size: int, max_size: int, expected_type: Optional[str]) -> ImageMetadata:
+    inspector = ImageInspector(expected_type)
+    while chunk := stream.read(chunk_size):
+        if inspector.size + len(chunk) > max_size:
+            raise _too_large(max_size)
+        inspector.update(chunk)
+        inspector.check_signature()
+    return inspector.finish()
+
+
+async def inspect_upload(
+    file: UploadFile, chunk_size: int = 1024 * 1024, max_size: int = MAX_UPLOAD_SIZE
+) -> ImageMetadata:
+    """
+    Проверка изображения и подсчет его SHA-256, размера и размеров в пикселях одним потоковым проходом
+    вне event loop.
+
+    Файл уже принят на сервер (в память или во временный файл), поэтому проход не требует
+    обращений к MinIO. После проверки позиция чтения возвращается в начало файла.
+
+    Args:
+        file (UploadFile): Загруженный файл.
+        chunk_size (int): Размер читаемого блока в байтах.
+        max_size (int): Максимальный размер файла в байтах.
+
+    Returns:
+        ImageMetadata: Сведения об изображении.
+
+    Raises:
+        HTTPException: Если файл больше max_size, не является изображением или не совпадает с заявленным типом.
+    """
+    if file.size is not None and file.size > max_size:
+        raise _too_large(max_size)
+    await file.seek(0)
+    try:
+        return await run_in_threadpool(_inspect_stream, file.file, chunk_size, max_size, file.content_type)
+    finally:
+        await file.seek(0)
+
+
+def _hash_stream(stream: BinaryIO, chunk_size: int) -> str:
+    digest = hashlib.sha256()
+    while chunk := stream.read(chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def upload_checksum(file: UploadFile, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Подсчет SHA-256 уже принятого файла вне event loop. После подсчета позиция чтения
+    возвращается в начало файла.
+
+    Args:
+        file (UploadFile): Загруженный файл.
+        chunk_size (int): Размер читаемого блока в байтах.
+
+    Returns:
+        str: SHA-256 содержимого в hex.
+    """
+    await file.seek(0)
+    try:
+        return await run_in_threadpool(_hash_stream, file.file, chunk_size)
+    finally:
+        await file.seek(0)
+
+
+async def stream_to_minio(
+    minio_service: MinioService,
+    bucket_name: str,
+    minio_path: str,
+    file: UploadFile,
+    part_size: int = UPLOAD_PART_SIZE,
+    max_size: int = MAX_UPLOAD_SIZE,
+    concurrency: int = UPLOAD_PART_CONCURRENCY,
+    budget: Optional[ByteBudget] = None,
+    inspector: Optional[ImageInspector] = None,
+) -> int:
+    """
+    Потоковая загрузка файла в MinIO с ограниченным расходом памяти.
+
+    Файл читается частями по part_size. Файл меньше одной части отправляется одним запросом,
+    большие файлы - через multipart upload, где до concurrency частей одного объекта отправляются
+    параллельно. Память под каждую часть резервируется в общем бюджете процесса.
+
+    Если передан inspector, каждая прочитанная часть проходит через него в том же проходе. Файл
+    с неверной сигнатурой отклоняется до первого обращения к MinIO, а файл с некорректными заголовками -
+    до завершения multipart upload, так что объект в хранилище не появляется.
+
+    Args:
+        minio_service (MinioService): Сервис MinIO.
+        bucket_name (str): Название бакета.
+        minio_path (str): Путь к объекту в бакете.
+        file (UploadFile): Загруженный файл.
+        part_size (int): Размер части в байтах.
+        max_size (int): Максимальный размер объекта в байтах.
+        concurrency (int): Количество частей одного объекта, отправляемых параллельно.
+        budget (Optional[ByteBudget]): Бюджет памяти. По умолчанию общий бюджет процесса.
+        inspector (Optional[ImageInspector]): Проверка изображения; сведения о нем возвращает inspector.finish().
+
+    Returns:
+        int: Размер загруженного объекта в байтах.
+
+    Raises:
+        HTTPException: Если файл больше max_size или не прошел проверку inspector.
+        S3Error: Если MinIO вернул ошибку.
+    """
+    budget = budget or upload_budget
+    content_type = file.content_type or "application/octet-stream"
+    if file.size is not None and file.size > max_size:
+        raise _too_large(max_size)
+
+    held = await budget.acquire(part_size)
+    try:
+        chunk = await file.read(part_size)
+        single = len(chunk) < part_size
+        if inspector is not None:
+            await run_in_threadpool(inspector.update, chunk)
+            if single:
+                inspector.finish()
+            else:
+                inspector.check_signature()
+        if single:
+            if len(chunk) > max_size:
+                raise _too_large(max_size)
+            await minio_service.run("upload", minio_service.put_bytes, bucket_name, minio_path, chunk, content_type)
+        else:
+            upload_id = await minio_service.run(
+                "upload", minio_service.create_multipart_upload, bucket_name, minio_path, content_type
+            )
+    except BaseException:
+        budget.release(held)
+        raise
+    if single:
+        budget.release(held)
+        return len(chunk)
+
+    slots = asyncio.Semaphore(concurrency)
+    tasks: List[asyncio.Task] = []
+
+    async def send(part_number: int, data: bytes, reserved: int) -> Part:
+        try:
+            return await minio_service.run(
+                "upload_part", minio_service.upload_part, bucket_name, minio_path, upload_id, part_number, data
+            )
+        finally:
+            budget.release(reserved)
+            slots.release()
+
+    total = 0
+    try:
+        while chunk:
+            total += len(chunk)
+            if total > max_size:
+                raise _too_large(max_size)
+            failed = next((task for task in tasks if task.done() and task.exception()), None)
+            if failed is not None:
+                raise failed.exception()
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(len(tasks) + 1, chunk, held)))
+            chunk, held = b"", 0
+            held = await budget.acquire(part_size)
+            chunk = await file.read(part_size)
+            if chunk and inspector is not None:
+                await run_in_threadpool(inspector.update, chunk)
+        parts = await asyncio.gather(*tasks)
+        if inspector is not None:
+            inspector.finish()
+        await minio_service.run(
+            "upload", minio_service.complete_multipart_upload, bucket_name, minio_path, upload_id, parts
+        )
+        return total
+    except BaseException:
+        # Let in-flight parts finish so their memory is returned, then drop the upload
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await minio_service.run(
+                "upload", minio_service.abort_multipart_upload, bucket_name, minio_path, upload_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload of '{minio_path}': {e}")
+        raise
+    finally:
+        if held:
+            budget.release(held)
@@ -0,0 +1,388 @@
+"""
+Нагрузочный бенчмарк API против локальных подмен внешних сервисов.
+
+Приложение запускается как обычно (uvicorn, main:app, внутренний API) в отдельном процессе. Вместо MinIO
+используется S3-совместимый сервер в памяти процесса бенчмарка (benchmarks/fake_s3.py), вместо
+PostgreSQL - файл SQLite или локальная база из --database-url. Таблицы базы пересоздаются и заполняются
+--dataset-size мемами, после чего сценарии выполняются по очереди с заданной конкурентностью:
+
+    list_shallow  GET /memes, первая страница
+    list_deep     GET /memes, последняя страница (OFFSET на всю таблицу)
+    get           GET /memes/{id} для случайных id
+    create        POST /memes
+    update        PUT /memes/{id} с новым изображением
+    delete        DELETE /memes/{id} для мемов из сценария create
+
+Для каждого сценария считаются пропускная способность и задержки p50/p95/p99. Результат сохраняется
+в JSON (--output) и может сравниваться с предыдущим прогоном (--baseline).
+
+Запуск из каталога api_service:
+    python -m benchmarks.bench_api --dataset-size 10000 --concurrency 16 --requests 2000 --output run.json
+    python -m benchmarks.bench_api --baseline run.json --set RESPONSE_CACHE_ENABLED=false
+
+ВНИМАНИЕ: все таблицы базы из --database-url удаляются.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+from PIL import Image
+from benchmarks.fake_s3 import FakeS3Server
+
+SCENARIOS = ["list_shallow", "list_deep", "get", "create", "update", "delete"]
+READ_SCENARIOS = {"list_shallow", "list_deep", "get"}
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-size", type=int, default=10000, help="Количество мемов в базе перед запуском.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Количество одновременных запросов.")
+    parser.add_argument("--requests", type=int, default=1000, help="Количество запросов в каждом сценарии.")
+    parser.add_argument("--warmup", type=int, default=50, help="Неучитываемые запросы перед сценариями чтения.")
+    parser.add_argument("--page-size", type=int, default=20, help="Размер страницы в сценариях списка.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую.")
+    parser.add_argument("--database-url", default=None, help="URL базы SQLAlchemy. По умолчанию временный файл SQLite.")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="Задержка подмены S3 на запрос в миллисекундах.")
+    parser.add_argument("--workers", type=int, default=1, help="Количество процессов uvicorn.")
+    parser.add_argument("--image-size", type=int, default=64, help="Сторона загружаемых изображений в пикселях.")
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="NAME=VALUE", help="Переменная окружения приложения (app/config.py)."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed генератора случайных id.")
+    parser.add_argument("--output", default=None, help="Файл для результатов в JSON.")
+    parser.add_argument("--baseline", default=None, help="JSON предыдущего прогона для сравнения.")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_image(side: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (side, side), (200, 120, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    # Nearest-rank percentile of an ascending list
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """
+    Сводка по одному сценарию.
+
+    Args:
+        latencies (List[float]): Задержки успешных запросов в секундах.
+        errors (int): Количество неуспешных запросов.
+        elapsed (float): Длительность сценария в секундах.
+
+    Returns:
+        Dict[str, Any]: Количество запросов и ошибок, пропускная способность и задержки в миллисекундах.
+    """
+    ordered = sorted(latencies)
+    latency = (
+        {
+            "mean": sum(ordered) / len(ordered) * 1000,
+            "p50": percentile(ordered, 50) * 1000,
+            "p95": percentile(ordered, 95) * 1000,
+            "p99": percentile(ordered, 99) * 1000,
+            "max": ordered[-1] * 1000,
+        }
+        if ordered
+        else {}
+    )
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {name: round(value, 3) for name, value in latency.items()},
+    }
+
+
+async def prepare_database(dataset_size: int, image: bytes, s3: FakeS3Server) -> List[int]:
+    """
+    Пересоздание таблиц и заполнение базы и подмены S3 мемами.
+
+    Args:
+        dataset_size (int): Количество мемов.
+        image (bytes): Изображение, сохраняемое для каждого мема.
+        s3 (FakeS3Server): Подмена S3.
+
+    Returns:
+        List[int]: Идентификаторы созданных мемов.
+    """
+    from sqlalchemy import insert, select, text
+    from app import Base, engine
+    from app.models.meme import Meme
+    from app.models.meme_stats import MemeStats
+    import main  # noqa: F401 - registers every model on Base.metadata
+
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        elif conn.dialect.name == "sqlite":
+            # Readers must not wait for the writer scenarios
+            await conn.execute(text("PRAGMA journal_mode=WAL"))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        now = datetime.now(timezone.utc)
+        for start in range(0, dataset_size, 1000):
+            rows = [
+                {
+                    "title": f"Benchmark meme {number}",
+                    "minio_bucket": "memes",
+                    "minio_path": f"seed/{number:08d}.png",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for number in range(start, min(start + 1000, dataset_size))
+            ]
+            await conn.execute(insert(Meme), rows)
+        counters = [("total", dataset_size), ("version", 0), ("reclaimed_bytes", 0), ("reclaimed_objects", 0)]
+        await conn.execute(insert(MemeStats), [{"name": name, "value": value} for name, value in counters])
+        ids = list((await conn.execute(select(Meme.id).order_by(Meme.id))).scalars())
+    await engine.dispose()
+    for number in range(dataset_size):
+        s3.storage.put("memes", f"seed/{number:08d}.png", image, "image/png")
+    return ids
+
+
+def start_app(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--workers", str(workers),
+        "--log-level", "warning",
+        "--no-access-log",
+    ]
+    return subprocess.Popen(command, cwd=API_DIR, env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API process exited with code {process.returncode}")
+        try:
+            if (await client.get("/memes", params={"page_size": 1})).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become ready in time")
+
+
+async def run_scenario(
+    request: Callable[[int], Awaitable[httpx.Response]], total: int, concurrency: int
+) -> Dict[str, Any]:
+    """
+    Выполнение total запросов с concurrency одновременными исполнителями.
+
+    Args:
+        request (Callable[[int], Awaitable[httpx.Response]]): Отправка запроса с порядковым номером.
+        total (int): Количество запросов.
+        concurrency (int): Количество исполнителей.
+
+    Returns:
+        Dict[str, Any]: Сводка по сценарию (см. summarize).
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for number in counter:
+            started = time.perf_counter()
+            try:
+                response = await request(number)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_benchmark(args: argparse.Namespace, s3: FakeS3Server, env: Dict[str, str]) -> Dict[str, Any]:
+    image = make_image(args.image_size)
+    ids = await prepare_database(args.dataset_size, image, s3)
+    rng = random.Random(args.seed)
+    port = free_port()
+    process = start_app(port, args.workers, env)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    created: List[int] = []
+
+    def upload() -> Dict[str, Any]:
+        # Trailing random bytes keep every upload distinct, so deduplication does not short-circuit it
+        return {"file": ("bench.png", image + os.urandom(16), "image/png")}
+
+    async def create(number: int) -> httpx.Response:
+        response = await client.post("/memes", data={"title": f"Created meme {number}"}, files=upload())
+        if response.status_code == 200:
+            created.append(response.json()["id"])
+        return response
+
+    def delete(number: int) -> Awaitable[httpx.Response]:
+        # Memes from the create scenario go first, then the newest seeded ones
+        pool = created + ids[::-1]
+        return client.delete(f"/memes/{pool[number]}")
+
+    deep_page = max(math.ceil(len(ids) / args.page_size), 1)
+    requests: Dict[str, Callable[[int], Awaitable[httpx.Response]]] = {
+        "list_shallow": lambda number: client.get("/memes", params={"page": 1, "page_size": args.page_size}),
+        "list_deep": lambda number: client.get("/memes", params={"page": deep_page, "page_size": args.page_size}),
+        "get": lambda number: client.get(f"/memes/{rng.choice(ids)}"),
+        "create": create,
+        "update": lambda number: client.put(
+            f"/memes/{ids[number % len(ids)]}", data={"title": f"Updated meme {number}"}, files=upload()
+        ),
+        "delete": delete,
+    }
+
+    results: Dict[str, Any] = {}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await wait_ready(client, process)
+            for name in [name for name in SCENARIOS if name in args.scenarios.split(",")]:
+                if name in READ_SCENARIOS and args.warmup:
+                    await run_scenario(requests[name], args.warmup, args.concurrency)
+                s3_requests = s3.storage.requests
+                results[name] = await run_scenario(requests[name], args.requests, args.concurrency)
+                results[name]["s3_requests"] = s3.storage.requests - s3_requests
+                print_row(name, results[name])
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=API_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_row(name: str, result: Dict[str, Any]) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{name:<13} {result['throughput_rps']:>9.1f} {latency.get('p50', 0):>9.2f} {latency.get('p95', 0):>9.2f} "
+        f"{latency.get('p99', 0):>9.2f} {result['errors']:>7}",
+        flush=True,
+    )
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """
+    Печать изменений относительно предыдущего прогона в процентах.
+
+    Args:
+        results (Dict[str, Any]): Результаты текущего прогона.
+        baseline (Dict[str, Any]): Результаты предыдущего прогона.
+    """
+
+    def change(current: float, previous: float) -> str:
+        return f"{(current - previous) / previous * 100:+8.1f}%" if previous else f"{'n/a':>9}"
+
+    print(f"\n{'vs baseline':<13} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, result in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        latency, previous_latency = result["latency_ms"], previous["latency_ms"]
+        print(
+            f"{name:<13} {change(result['throughput_rps'], previous['throughput_rps'])}"
+            + "".join(f" {change(latency.get(q, 0), previous_latency.get(q, 0))}" for q in ("p50", "p95", "p99"))
+        )
+
+
+def main() -> None:
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="meme-bench-")
+    database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    settings = {
+        "INTERNAL_MEDIA_SERVICE": "true",
+        # Background work would compete with the measured requests; enable it with --set when needed
+        "THUMBNAILS_ENABLED": "false",
+        "STORAGE_GC_ENABLED": "false",
+        "MEDIA_CACHE_DIR": os.path.join(workdir, "media"),
+    }
+    settings.update(item.split("=", 1) for item in args.set)
+
+    s3 = FakeS3Server(latency=args.s3_latency / 1000).start()
+    env = {**os.environ, **settings, "DATABASE_URL": database_url, "MINIO_ENDPOINT": s3.endpoint, "MINIO_SECURE": "false"}
+    # The app modules read their configuration on import
+    os.environ.update(env)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(f"{'scenario':<13} {'req/s':>9} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'errors':>7}")
+    try:
+        results = asyncio.run(run_benchmark(args, s3, env))
+    finally:
+        s3.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "database": database_url.split(":", 1)[0],
+            "dataset_size": args.dataset_size,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "page_size": args.page_size,
+            "workers": args.workers,
+            "s3_latency_ms": args.s3_latency,
+            "image_size": args.image_size,
+            "seed": args.seed,
+            "settings": settings,
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
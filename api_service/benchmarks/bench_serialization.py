@@ -0,0 +1,96 @@
+"""
+Микробенчмарк сериализации страницы мемов.
+
+Сравнивает прежний путь (валидированные MemeResponse, повторная проверка response_model в FastAPI
+и JSONResponse) с быстрым (meme_payload и FastJSONResponse) для разных размеров страницы.
+
+Запуск из каталога api_service:
+    python -m benchmarks.bench_serialization --repeat 500
+"""
+import argparse
+import asyncio
+import timeit
+from datetime import datetime, timezone
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from app.models.meme import Meme
+from app.models.meme_responses import MemeResponse, PaginatedMemesResponse
+from app.serialization import FastJSONResponse, meme_payload
+
+VARIANT_NAMES = ["thumb", "preview"]
+RESPONSE_FIELD = create_response_field(name="response", type_=PaginatedMemesResponse)
+
+
+def make_memes(count: int) -> List[Meme]:
+    now = datetime.now(timezone.utc)
+    return [
+        Meme(
+            id=i,
+            title=f"Meme number {i}",
+            minio_bucket="memes",
+            minio_path=f"{i:08d}.jpg",
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def presigned(path: str) -> str:
+    return f"http://minio:9000/memes/{path}?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Signature={'0' * 64}"
+
+
+def validated_page(memes: List[Meme]) -> bytes:
+    # The path before the fast serializer: models built field by field, then FastAPI's response_model step
+    items = [
+        MemeResponse(
+            id=meme.id,
+            title=meme.title,
+            minio_bucket=meme.minio_bucket,
+            minio_path=meme.minio_path,
+            minio_url=presigned(meme.minio_path),
+            variants={name: presigned(f"variants/{meme.id}/{name}.webp") for name in VARIANT_NAMES},
+            created_at=meme.created_at,
+            updated_at=meme.updated_at,
+        )
+        for meme in memes
+    ]
+    page = PaginatedMemesResponse(items=items, total=len(memes), page=1, page_size=len(memes))
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=page))
+    return JSONResponse(content).body
+
+
+def fast_page(memes: List[Meme]) -> bytes:
+    items = [
+        meme_payload(
+            meme,
+            presigned(meme.minio_path),
+            {name: presigned(f"variants/{meme.id}/{name}.webp") for name in VARIANT_NAMES},
+            VARIANT_NAMES,
+        )
+        for meme in memes
+    ]
+    page = {"items": items, "total": len(memes), "total_strategy": "exact", "page": 1, "page_size": len(memes)}
+    return FastJSONResponse(page).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=300, help="Количество повторов для каждого размера страницы.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100], help="Размеры страницы.")
+    args = parser.parse_args()
+
+    # asyncio.run has a fixed cost; measure it so it is not attributed to serialization
+    loop_overhead = timeit.timeit(lambda: asyncio.run(asyncio.sleep(0)), number=args.repeat) / args.repeat
+    print(f"{'page_size':>9} {'validated, us':>14} {'fast, us':>9} {'speedup':>8}")
+    for size in args.sizes:
+        memes = make_memes(size)
+        validated = timeit.timeit(lambda: validated_page(memes), number=args.repeat) / args.repeat - loop_overhead
+        fast = timeit.timeit(lambda: fast_page(memes), number=args.repeat) / args.repeat
+        print(f"{size:>9} {validated * 1e6:>14.0f} {fast * 1e6:>9.0f} {validated / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
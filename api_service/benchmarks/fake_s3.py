@@ -0,0 +1,266 @@
+"""
+Подмена MinIO для бенчмарков: S3-совместимый HTTP-сервер в памяти процесса.
+
+Поддерживает ровно те запросы, которые отправляет клиент minio из MinioService: проверку и создание
+бакета, PUT/GET/HEAD/DELETE объекта, multipart upload, пакетное удаление и ListObjectsV2.
+Подписи запросов не проверяются. Задержка latency добавляется к каждому запросу, чтобы
+имитировать сетевое хранилище.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+class StoredObject(NamedTuple):
+    """
+    Объект, хранящийся в памяти.
+    """
+
+    data: bytes
+    content_type: str
+    etag: str
+    last_modified: datetime
+
+
+class FakeS3Storage:
+    """
+    Потокобезопасное хранилище бакетов, объектов и незавершенных multipart upload.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, Dict[str, StoredObject]] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def put(self, bucket_name: str, key: str, data: bytes, content_type: str = "application/octet-stream") -> StoredObject:
+        """
+        Сохранение объекта. Бакет создается, если его нет.
+
+        Args:
+            bucket_name (str): Название бакета.
+            key (str): Путь к объекту.
+            data (bytes): Содержимое.
+            content_type (str): Тип содержимого.
+
+        Returns:
+            StoredObject: Сохраненный объект.
+        """
+        stored = StoredObject(data, content_type, hashlib.md5(data).hexdigest(), datetime.now(timezone.utc))
+        with self.lock:
+            self.buckets.setdefault(bucket_name, {})[key] = stored
+        return stored
+
+
+def _xml(root: str, body: str) -> bytes:
+    return f'<?xml version="1.0" encoding="UTF-8"?><{root} xmlns="{S3_NAMESPACE}">{body}</{root}>'.encode()
+
+
+def _iso(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeS3Server"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _route(self) -> Tuple[str, Optional[str], Dict[str, List[str]]]:
+        parts = urlsplit(self.path)
+        bucket_name, _, key = unquote(parts.path).lstrip("/").partition("/")
+        return bucket_name, key or None, parse_qs(parts.query, keep_blank_values=True)
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if "Content-Length" not in (headers or {}):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str, bucket_name: str, key: Optional[str] = None) -> None:
+        body = _xml(
+            "Error",
+            f"<Code>{code}</Code><Message>{code}</Message><BucketName>{escape(bucket_name)}</BucketName>"
+            f"<Key>{escape(key or '')}</Key><Resource>{escape(self.path)}</Resource>"
+            f"<RequestId>{uuid.uuid4().hex}</RequestId><HostId>fake-s3</HostId>",
+        )
+        self._send(status, body, {"Content-Type": "application/xml"})
+
+    def _handle(self) -> None:
+        storage = self.server.storage
+        with storage.lock:
+            storage.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        bucket_name, key, query = self._route()
+        body = self._body()
+        with storage.lock:
+            bucket = storage.buckets.get(bucket_name)
+        if key is None:
+            return self._handle_bucket(bucket_name, bucket, query, body)
+        if bucket is None:
+            return self._error(404, "NoSuchBucket", bucket_name, key)
+        return self._handle_object(bucket_name, bucket, key, query, body)
+
+    def _handle_bucket(
+        self, bucket_name: str, bucket: Optional[Dict[str, StoredObject]], query: Dict[str, List[str]], body: bytes
+    ) -> None:
+        storage = self.server.storage
+        if self.command == "PUT":
+            with storage.lock:
+                storage.buckets.setdefault(bucket_name, {})
+            return self._send(200, headers={"Location": f"/{bucket_name}"})
+        if bucket is None:
+            return self._error(404, "NoSuchBucket", bucket_name)
+        if self.command == "HEAD":
+            return self._send(200)
+        if self.command == "POST" and "delete" in query:
+            keys = [
+                element.text
+                for element in ElementTree.fromstring(body).iter()
+                if element.tag.rsplit("}", 1)[-1] == "Key"
+            ]
+            with storage.lock:
+                for name in keys:
+                    bucket.pop(name, None)
+            deleted = "".join(f"<Deleted><Key>{escape(name)}</Key></Deleted>" for name in keys)
+            return self._send(200, _xml("DeleteResult", deleted), {"Content-Type": "application/xml"})
+        if self.command == "GET" and query.get("list-type") == ["2"]:
+            prefix = query.get("prefix", [""])[0]
+            start_after = query.get("start-after", [""])[0]
+            token = query.get("continuation-token", [""])[0]
+            max_keys = int(query.get("max-keys", ["1000"])[0])
+            with storage.lock:
+                names = sorted(name for name in bucket if name.startswith(prefix) and name > max(start_after, token))
+                page = [(name, bucket[name]) for name in names[:max_keys]]
+            truncated = len(names) > max_keys
+            contents = "".join(
+                f"<Contents><Key>{escape(name)}</Key><LastModified>{_iso(stored.last_modified)}</LastModified>"
+                f'<ETag>"{stored.etag}"</ETag><Size>{len(stored.data)}</Size><StorageClass>STANDARD</StorageClass></Contents>'
+                for name, stored in page
+            )
+            next_token = f"<NextContinuationToken>{escape(page[-1][0])}</NextContinuationToken>" if truncated else ""
+            result = (
+                f"<Name>{escape(bucket_name)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>{contents}{next_token}"
+            )
+            return self._send(200, _xml("ListBucketResult", result), {"Content-Type": "application/xml"})
+        return self._error(501, "NotImplemented", bucket_name)
+
+    def _handle_object(
+        self, bucket_name: str, bucket: Dict[str, StoredObject], key: str, query: Dict[str, List[str]], body: bytes
+    ) -> None:
+        storage = self.server.storage
+        upload_id = query.get("uploadId", [None])[0]
+        if self.command == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with storage.lock:
+                storage.uploads[upload_id] = {}
+            result = f"<Bucket>{escape(bucket_name)}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>"
+            return self._send(200, _xml("InitiateMultipartUploadResult", result), {"Content-Type": "application/xml"})
+        if upload_id is not None:
+            with storage.lock:
+                parts = storage.uploads.get(upload_id)
+            if parts is None:
+                return self._error(404, "NoSuchUpload", bucket_name, key)
+            if self.command == "PUT":
+                parts[int(query["partNumber"][0])] = body
+                return self._send(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+            if self.command == "DELETE":
+                with storage.lock:
+                    storage.uploads.pop(upload_id, None)
+                return self._send(204)
+            if self.command == "POST":
+                with storage.lock:
+                    storage.uploads.pop(upload_id, None)
+                stored = storage.put(bucket_name, key, b"".join(data for _, data in sorted(parts.items())))
+                result = (
+                    f"<Location>/{escape(bucket_name)}/{escape(key)}</Location><Bucket>{escape(bucket_name)}</Bucket>"
+                    f'<Key>{escape(key)}</Key><ETag>"{stored.etag}"</ETag>'
+                )
+                return self._send(200, _xml("CompleteMultipartUploadResult", result), {"Content-Type": "application/xml"})
+        if self.command == "PUT":
+            stored = storage.put(bucket_name, key, body, self.headers.get("Content-Type") or "application/octet-stream")
+            return self._send(200, headers={"ETag": f'"{stored.etag}"'})
+        if self.command == "DELETE":
+            with storage.lock:
+                bucket.pop(key, None)
+            return self._send(204)
+        with storage.lock:
+            stored = bucket.get(key)
+        if stored is None:
+            return self._error(404, "NoSuchKey", bucket_name, key)
+        headers = {
+            "Content-Type": stored.content_type,
+            "Content-Length": str(len(stored.data)),
+            "ETag": f'"{stored.etag}"',
+            "Last-Modified": format_datetime(stored.last_modified, usegmt=True),
+        }
+        return self._send(200, stored.data, headers)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = _handle
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    """
+    S3-совместимый сервер в отдельном потоке.
+
+    Attributes:
+        storage (FakeS3Storage): Содержимое хранилища.
+        latency (float): Задержка перед ответом на каждый запрос в секундах.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), FakeS3Handler)
+        self.storage = FakeS3Storage()
+        self.latency = latency
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        """
+        Адрес сервера в формате host:port для MINIO_ENDPOINT.
+        """
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "FakeS3Server":
+        """
+        Запуск сервера в фоновом потоке.
+
+        Returns:
+            FakeS3Server: Этот же сервер.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-s3", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Остановка сервера.
+        """
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
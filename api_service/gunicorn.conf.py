@@ -0,0 +1,42 @@
+"""
+Настройки gunicorn для запуска в production: `gunicorn -c gunicorn.conf.py main:app`.
+
+Приложение загружается в мастер-процессе до fork, каждый воркер uvicorn открывает свои соединения
+с базой данных и MinIO в lifespan. По SIGTERM воркеры перестают принимать соединения и дожидаются
+текущих запросов не дольше GRACEFUL_TIMEOUT секунд.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Workers share Prometheus metrics through files; the directory must be set before the preloaded
+# app imports prometheus_client, and stale files of a previous run are removed
+if workers > 1:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "prometheus-multiproc"))
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# Each worker caches media in its own per-PID subdirectory with a share of MEDIA_CACHE_MAX_BYTES;
+# those left by a previous run are removed before the workers start. Anything else in the directory is kept
+os.environ["MEDIA_CACHE_WORKERS"] = str(workers)
+_media_cache_dir = os.environ.get("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "meme-media-cache"))
+if os.path.isdir(_media_cache_dir):
+    for _name in os.listdir(_media_cache_dir):
+        if _name.isdigit():
+            shutil.rmtree(os.path.join(_media_cache_dir, _name), ignore_errors=True)
+
+
+def child_exit(server, worker):
+    # Drop gauges of the exited worker; its counters stay in the aggregate
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
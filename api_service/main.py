@@ -1,20 +1,55 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import uvicorn
-from app.config import PORT, INTERNAL_MEDIA_SERVICE
+from app.config import PORT, INTERNAL_MEDIA_SERVICE, GRACEFUL_TIMEOUT, METRICS_ENABLED, STORAGE_GC_ENABLED
+from app import SessionLocal, engine, replica_engine
+from app.minio_service import init_minio_service, close_minio_service, get_shared_minio_service
+from app.media_cache import close_media_cache
+from app.health import router as health_router
+from app.metrics import MetricsMiddleware, metrics_endpoint
+from app.services.derivative_service import close_process_pool
+from app.services.storage_gc_service import start_storage_gc, stop_storage_gc
 
 if INTERNAL_MEDIA_SERVICE:
     from app.internal_router import router
 else:
     from app.external_router import router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the pooled MinIO client once per process; release it, the image workers, the image cache
+    # and the DB pool on shutdown. The internal service also removes deleted objects from MinIO in the background;
+    # every worker starts the loop, but only the holder of its advisory lock does the work
+    # With gunicorn --preload the engines are created before fork: drop any inherited connections
+    # so that every worker opens its own
+    for db_engine in {engine, replica_engine}:
+        await db_engine.dispose(close=False)
+    init_minio_service()
+    if INTERNAL_MEDIA_SERVICE and STORAGE_GC_ENABLED:
+        start_storage_gc(SessionLocal, get_shared_minio_service())
+    yield
+    await stop_storage_gc()
+    close_process_pool()
+    close_media_cache()
+    close_minio_service()
+    await engine.dispose()
+    if replica_engine is not engine:
+        await replica_engine.dispose()
+
+
 # Initialize the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
+app.include_router(health_router)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 
-# Function to run the app
+# Development server with auto-reload; production runs gunicorn -c gunicorn.conf.py main:app
 def start():
-    uvicorn.run("main:app", host="0.0.0.0", port=PORT, reload=True)
+    uvicorn.run("main:app", host="0.0.0.0", port=PORT, reload=True, timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
 
 
 # Main guard for running the application
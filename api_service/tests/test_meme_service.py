@@ -1,111 +1,1095 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from main import app
-from app import get_db, get_minio_service, Base
+from app import get_db, get_minio_service, get_replica_session_factory, get_session_factory, Base
 from app.minio_service import MinioService
 from app.services.meme_service import MemeService
 from unittest.mock import MagicMock
 from fastapi import UploadFile
 from io import BytesIO
 from starlette.datastructures import Headers
+from PIL import Image
 
-DATABASE_URL = "sqlite:///./test.db"
+DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: the TestClient runs the app in its own event loop, so connections must not be shared
+engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+TestingSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
-Base.metadata.create_all(bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def override_get_minio_service():
     minio_client = MagicMock()
-    minio_client.get_presigned_url.return_value = "http://localhost:9000/mocked_url"
+    minio_client.presigned_get_object.return_value = "http://localhost:9000/mocked_url"
     minio_service = MinioService(client=minio_client)
     return minio_service
 
 app.dependency_overrides[get_db] = override_get_db
 app.dependency_overrides[get_minio_service] = override_get_minio_service
+app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+app.dependency_overrides[get_replica_session_factory] = lambda: TestingSessionLocal
 
 client = TestClient(app)
 
+def image_bytes(format: str = "JPEG", size=(4, 3)) -> bytes:
+    # Uploads are checked by their magic bytes, so test files must be real images
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format)
+    return buffer.getvalue()
+
 @pytest.fixture(scope="module")
-def test_client():
-    Base.metadata.create_all(bind=engine)
-    yield client
-    Base.metadata.drop_all(bind=engine)
+def anyio_backend():
+    return "asyncio"
 
 @pytest.fixture(scope="module")
-def db_session():
-    db = TestingSessionLocal()
-    yield db
-    db.close()
+async def db_session(anyio_backend):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with TestingSessionLocal() as db:
+        yield db
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
 
 @pytest.fixture(scope="module")
 def minio_service():
-    minio_service = MagicMock()
-    minio_service.get_presigned_url.return_value = "http://localhost:9000/mocked_url"
-    return minio_service
+    minio_client = MagicMock()
+    minio_client.presigned_get_object.return_value = "http://localhost:9000/mocked_url"
+    minio_service = MinioService(client=minio_client)
+    yield minio_service
+    minio_service.close()
 
 @pytest.fixture
 def meme_service(db_session, minio_service):
     return MemeService(db_session, minio_service)
 
-def test_create_meme(meme_service):
+@pytest.mark.anyio
+async def test_create_meme(meme_service):
     with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
         file_content = f.read()
     headers = Headers({"content-type": "image/jpeg"})
     file = UploadFile(filename="test_image.jpg", file=BytesIO(file_content), headers=headers)
-    meme_response = meme_service.create_meme("Test Meme", file)
+    meme_response = await meme_service.create_meme("Test Meme", file)
     assert meme_response.title == "Test Meme"
     assert meme_response.minio_path.endswith(".jpg")
 
-def test_get_paginated_memes(meme_service):
-    response = meme_service.get_paginated_memes(1, 10)
+@pytest.mark.anyio
+async def test_get_paginated_memes(meme_service):
+    response = await meme_service.get_paginated_memes(1, 10)
     assert response.page == 1
     assert response.page_size == 10
     assert isinstance(response.items, list)
 
-def test_get_meme_by_id(meme_service):
+@pytest.mark.anyio
+async def test_get_meme_by_id(meme_service):
     with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
         file_content = f.read()
     headers = Headers({"content-type": "image/jpeg"})
     file = UploadFile(filename="test_image.jpg", file=BytesIO(file_content), headers=headers)
-    created_meme = meme_service.create_meme("Test Meme", file)
-    meme_response = meme_service.get_meme_by_id(created_meme.id)
+    created_meme = await meme_service.create_meme("Test Meme", file)
+    meme_response = await meme_service.get_meme_by_id(created_meme.id)
     assert meme_response.id == created_meme.id
     assert meme_response.title == "Test Meme"
 
-def test_update_meme(meme_service):
+@pytest.mark.anyio
+async def test_update_meme(meme_service):
     with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
         file_content = f.read()
     headers = Headers({"content-type": "image/jpeg"})
     file = UploadFile(filename="test_image.jpg", file=BytesIO(file_content), headers=headers)
-    created_meme = meme_service.create_meme("Test Meme", file)
+    created_meme = await meme_service.create_meme("Test Meme", file)
 
     with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
         updated_file_content = f.read()
     updated_headers = Headers({"content-type": "image/jpeg"})
     updated_file = UploadFile(filename="updated_test_image.jpg", file=BytesIO(updated_file_content), headers=updated_headers)
-    updated_meme_response = meme_service.update_meme(created_meme.id, "Updated Test Meme", updated_file)
+    updated_meme_response = await meme_service.update_meme(created_meme.id, "Updated Test Meme", updated_file)
     assert updated_meme_response.title == "Updated Test Meme"
     assert updated_meme_response.minio_path.endswith(".jpg")
 
-def test_delete_meme(meme_service):
+    # If the update does not commit, the newly uploaded image is queued for deletion
+    from sqlalchemy import select
+    from app.models.pending_deletion import PendingDeletion
+
+    uploaded = []
+
+    async def fail(response):
+        uploaded.append(response.minio_path)
+        raise RuntimeError("commit failed")
+
+    failed_file = UploadFile(filename="failed.jpg", file=BytesIO(updated_file_content), headers=updated_headers)
+    with pytest.raises(RuntimeError):
+        await meme_service.update_meme(created_meme.id, "Failed Update", failed_file, before_commit=fail)
+    assert (await meme_service.get_meme_by_id(created_meme.id)).minio_path == updated_meme_response.minio_path
+    queued = await meme_service.db.scalars(select(PendingDeletion.minio_path).where(PendingDeletion.minio_path == uploaded[0]))
+    assert queued.all() == uploaded
+
+@pytest.mark.anyio
+async def test_delete_meme(meme_service):
     with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
         file_content = f.read()
     headers = Headers({"content-type": "image/jpeg"})
     file = UploadFile(filename="test_image.jpg", file=BytesIO(file_content), headers=headers)
-    created_meme = meme_service.create_meme("Test Meme", file)
+    created_meme = await meme_service.create_meme("Test Meme", file)
 
-    success = meme_service.delete_meme(created_meme.id)
+    success = await meme_service.delete_meme(created_meme.id)
     assert success is True
-    meme_response = meme_service.get_meme_by_id(created_meme.id)
+    meme_response = await meme_service.get_meme_by_id(created_meme.id)
     assert meme_response is None
+
+def test_shared_minio_service_is_reused(monkeypatch):
+    from app import minio_service as minio_module
+
+    checks = []
+
+    def fake_ensure_bucket_exists(self, bucket_name):
+        checks.append(bucket_name)
+        self.bucket_ready = True
+        return True
+
+    monkeypatch.setattr(minio_module, "_minio_service", None)
+    monkeypatch.setattr(minio_module.MinioService, "ensure_bucket_exists", fake_ensure_bucket_exists)
+    first = minio_module.get_shared_minio_service()
+    second = minio_module.get_shared_minio_service()
+    assert first is second
+    assert checks == ["memes"]
+    minio_module.close_minio_service()
+    assert minio_module._minio_service is None
+
+def test_presigned_url_cache_hits_and_invalidation():
+    minio_client = MagicMock()
+    minio_client.presigned_get_object.return_value = "http://localhost:9000/signed"
+    minio_service = MinioService(client=minio_client)
+
+    assert minio_service.get_presigned_url("memes", "a.jpg") == "http://localhost:9000/signed"
+    assert minio_service.get_presigned_url("memes", "a.jpg") == "http://localhost:9000/signed"
+    assert minio_client.presigned_get_object.call_count == 1
+    assert minio_service.url_cache.stats()["hits"] == 1
+
+    minio_service.invalidate_presigned_url("memes", "a.jpg")
+    minio_service.get_presigned_url("memes", "a.jpg")
+    assert minio_client.presigned_get_object.call_count == 2
+
+def test_presigned_url_cache_ttl_and_lru():
+    from app.minio_service import PresignedUrlCache
+
+    now = [0.0]
+    cache = PresignedUrlCache(max_size=2, ttl=10, clock=lambda: now[0])
+    cache.set(("memes", "a"), "url-a")
+    cache.set(("memes", "b"), "url-b")
+    assert cache.get(("memes", "a")) == "url-a"
+    cache.set(("memes", "c"), "url-c")
+    assert cache.get(("memes", "b")) is None
+    now[0] = 11
+    assert cache.get(("memes", "a")) is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2}
+
+@pytest.mark.anyio
+async def test_get_paginated_memes_by_cursor(meme_service):
+    from app.pagination import MemeSortField, SortOrder
+
+    for i in range(3):
+        headers = Headers({"content-type": "image/jpeg"})
+        file = UploadFile(filename="test_image.jpg", file=BytesIO(image_bytes()), headers=headers)
+        await meme_service.create_meme(f"Cursor Meme {i}", file)
+
+    first_page = await meme_service.get_paginated_memes(1, 100, MemeSortField.created_at, SortOrder.desc)
+    expected = [item.id for item in first_page.items]
+    seen = []
+    response = await meme_service.get_paginated_memes(1, 2, MemeSortField.created_at, SortOrder.desc)
+    seen.extend(item.id for item in response.items)
+    while response.next_cursor:
+        response = await meme_service.get_paginated_memes(
+            1, 2, MemeSortField.created_at, SortOrder.desc, cursor=response.next_cursor
+        )
+        assert response.page is None
+        seen.extend(item.id for item in response.items)
+    assert seen == expected
+
+@pytest.mark.anyio
+async def test_get_paginated_memes_rejects_bad_cursor(meme_service):
+    from fastapi import HTTPException
+    from app.pagination import MemeSortField, SortOrder
+
+    with pytest.raises(HTTPException) as exc_info:
+        await meme_service.get_paginated_memes(1, 10, cursor="not-a-cursor")
+    assert exc_info.value.status_code == 400
+
+    cursor = (await meme_service.get_paginated_memes(1, 1, MemeSortField.id, SortOrder.asc)).next_cursor
+    with pytest.raises(HTTPException):
+        await meme_service.get_paginated_memes(1, 1, MemeSortField.updated_at, SortOrder.asc, cursor=cursor)
+
+@pytest.mark.anyio
+async def test_get_paginated_memes_count_strategies(meme_service, db_session):
+    from app.models.meme_stats import MemeStats
+    from app.pagination import CountStrategy
+
+    exact = await meme_service.get_paginated_memes(1, 10, count=CountStrategy.exact)
+    assert exact.total_strategy == CountStrategy.exact
+
+    none = await meme_service.get_paginated_memes(1, 10, count=CountStrategy.none)
+    assert none.total is None
+
+    # SQLite has no planner statistics, so the estimate falls back to an exact count
+    estimate = await meme_service.get_paginated_memes(1, 10, count=CountStrategy.estimate)
+    assert estimate.total_strategy == CountStrategy.exact
+
+    await db_session.merge(MemeStats(name="total", value=exact.total))
+    await db_session.commit()
+    headers = Headers({"content-type": "image/jpeg"})
+    created = await meme_service.create_meme("Counted Meme", UploadFile(filename="a.jpg", file=BytesIO(image_bytes()), headers=headers))
+    counter = await meme_service.get_paginated_memes(1, 10, count=CountStrategy.counter)
+    assert counter.total_strategy == CountStrategy.counter
+    assert counter.total == exact.total + 1
+    await meme_service.delete_meme(created.id)
+    assert (await meme_service.get_paginated_memes(1, 10, count=CountStrategy.counter)).total == exact.total
+
+@pytest.mark.anyio
+async def test_upload_records_image_metadata(meme_service, db_session, minio_service):
+    import hashlib
+    from fastapi import HTTPException
+    from PIL import ImageDraw
+    from app.models.meme import Meme
+    from app.pagination import CountStrategy, MemeFilter, MemeSortField, SortOrder
+
+    frames = []
+    for i in range(3):
+        frame = Image.new("RGB", (21, 9), "white")
+        ImageDraw.Draw(frame).rectangle([i, i, i + 4, i + 4], fill="blue")
+        frames.append(frame)
+    buffer = BytesIO()
+    frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:])
+    gif = buffer.getvalue()
+    animated = await meme_service.create_meme(
+        "Animated", UploadFile(filename="a.gif", file=BytesIO(gif), headers=Headers({"content-type": "image/gif"}))
+    )
+    assert (animated.width, animated.height, animated.frames) == (21, 9, 3)
+    assert (animated.size, animated.checksum) == (len(gif), hashlib.sha256(gif).hexdigest())
+
+    # The content decides, not the name or the declared type; rejected files never reach storage
+    uploads = minio_service.client.put_object.call_count
+    for name, content_type, content in [
+        ("fake.jpg", "image/jpeg", b"not an image"),
+        ("png.jpg", "image/jpeg", image_bytes("PNG")),
+        ("cut.jpg", "image/jpeg", image_bytes()[:20]),
+    ]:
+        file = UploadFile(filename=name, file=BytesIO(content), headers=Headers({"content-type": content_type}))
+        with pytest.raises(HTTPException) as exc_info:
+            await meme_service.create_meme("Rejected", file)
+        assert exc_info.value.status_code == 400
+    assert minio_service.client.put_object.call_count == uploads
+
+    for width in (22, 23):
+        file = UploadFile(filename="w.png", file=BytesIO(image_bytes("PNG", (width, 9))), headers=Headers({"content-type": "image/png"}))
+        await meme_service.create_meme(f"Width {width}", file)
+    db_session.add(Meme(title="Legacy", minio_bucket="memes", minio_path="legacy.png"))
+    await db_session.commit()
+
+    # Filtered keyset pages over the (width, id) index; memes without metadata are left out of the order
+    meme_filter = MemeFilter(min_width=21, max_width=23, max_height=9)
+    response = await meme_service.get_paginated_memes(
+        1, 2, MemeSortField.width, SortOrder.desc, count=CountStrategy.counter, meme_filter=meme_filter
+    )
+    assert (response.total, response.total_strategy) == (3, CountStrategy.exact)
+    widths = [item.width for item in response.items]
+    while response.next_cursor:
+        response = await meme_service.get_paginated_memes(
+            1, 2, MemeSortField.width, SortOrder.desc, cursor=response.next_cursor, meme_filter=meme_filter
+        )
+        widths.extend(item.width for item in response.items)
+    assert widths == [23, 22, 21]
+    by_size = await meme_service.get_paginated_memes(1, 100, MemeSortField.size, SortOrder.asc)
+    assert "Legacy" not in [item.title for item in by_size.items]
+    assert [item.size for item in by_size.items] == sorted(item.size for item in by_size.items)
+
+@pytest.mark.anyio
+async def test_storage_operations_run_off_the_event_loop(minio_service):
+    import threading
+
+    calls = []
+    minio_service.client.remove_object.side_effect = lambda bucket, path: calls.append(threading.current_thread().name)
+    await minio_service.remove_object_async("memes", "gone.jpg")
+    minio_service.client.remove_object.side_effect = None
+    assert calls[0].startswith("storage")
+    stats = minio_service.timings.stats()["remove"]
+    assert stats["count"] >= 1
+    assert stats["queued_seconds"] >= 0 and stats["io_seconds"] >= 0
+
+@pytest.mark.anyio
+async def test_stream_to_minio_uploads_parts_within_budget(minio_service):
+    from app.upload_pipeline import ByteBudget, stream_to_minio
+
+    minio_service.client._create_multipart_upload.return_value = "upload-1"
+    minio_service.client._upload_part.side_effect = lambda bucket, path, data, headers, upload_id, number: f"etag-{number}"
+    budget = ByteBudget(capacity=8)
+    headers = Headers({"content-type": "image/gif"})
+    file = UploadFile(filename="big.gif", file=BytesIO(b"x" * 10), headers=headers)
+
+    size = await stream_to_minio(minio_service, "memes", "big.gif", file, part_size=4, max_size=100, budget=budget)
+
+    assert size == 10
+    assert minio_service.client._upload_part.call_count == 3
+    parts = minio_service.client._complete_multipart_upload.call_args.args[3]
+    assert [part.part_number for part in parts] == [1, 2, 3]
+    assert budget.available == budget.capacity
+    minio_service.client._upload_part.side_effect = None
+
+@pytest.mark.anyio
+async def test_stream_to_minio_rejects_oversized_files(minio_service):
+    from fastapi import HTTPException
+    from app.upload_pipeline import ByteBudget, stream_to_minio
+
+    budget = ByteBudget(capacity=8)
+    headers = Headers({"content-type": "image/gif"})
+    file = UploadFile(filename="big.gif", file=BytesIO(b"x" * 10), headers=headers)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await stream_to_minio(minio_service, "memes", "big.gif", file, part_size=4, max_size=6, budget=budget)
+    assert exc_info.value.status_code == 413
+    assert minio_service.client._abort_multipart_upload.called
+    assert budget.available == budget.capacity
+
+@pytest.mark.anyio
+async def test_dedup_storage_shares_identical_images(db_session, minio_service):
+    dedup_service = MemeService(db_session, minio_service, dedup=True)
+    minio_service.client.reset_mock()
+
+    def upload(name):
+        headers = Headers({"content-type": "image/png"})
+        return UploadFile(filename=name, file=BytesIO(image_bytes("PNG")), headers=headers)
+
+    first = await dedup_service.create_meme("Original", upload("a.png"))
+    second = await dedup_service.create_meme("Repost", upload("b.png"))
+    assert first.minio_path == second.minio_path
+    assert first.minio_path.startswith("sha256/")
+    assert minio_service.client.put_object.call_count == 1
+
+    stats = await dedup_service.get_dedup_stats()
+    assert stats.references >= 2
+    assert stats.bytes_saved >= len(image_bytes("PNG"))
+
+    from sqlalchemy import select
+    from app.models.pending_deletion import PendingDeletion
+
+    def queued():
+        return db_session.scalars(select(PendingDeletion.minio_path).where(PendingDeletion.minio_path == second.minio_path))
+
+    await dedup_service.delete_meme(first.id)
+    assert list(await queued()) == []
+    await dedup_service.delete_meme(second.id)
+    assert list(await queued()) == [second.minio_path]
+    assert not minio_service.client.remove_object.called
+
+@pytest.mark.anyio
+async def test_storage_gc_drains_deletion_queue(db_session, minio_service, meme_service):
+    from sqlalchemy import delete
+    from app.models.meme_stats import MemeStats
+    from app.models.pending_deletion import PendingDeletion
+    from app.services.storage_gc_service import StorageGCService, enqueue_deletions
+
+    await db_session.execute(delete(PendingDeletion))
+    db_session.add_all([MemeStats(name="reclaimed_bytes", value=0), MemeStats(name="reclaimed_objects", value=0)])
+    await db_session.commit()
+    headers = Headers({"content-type": "image/png"})
+    kept = await meme_service.create_meme("Kept", UploadFile(filename="k.png", file=BytesIO(image_bytes("PNG")), headers=headers))
+    await enqueue_deletions(db_session, [("memes", "gone.png", 10), ("memes", "broken.png", 5), ("memes", kept.minio_path, None)])
+    await db_session.commit()
+    # An object already in the queue is not queued twice
+    await enqueue_deletions(db_session, [("memes", "gone.png", 10), ("memes", "gone.png", 10)])
+    await db_session.commit()
+
+    failure = MagicMock(code="AccessDenied", message="denied")
+    failure.name = "broken.png"
+    minio_service.client.remove_objects.side_effect = lambda bucket, objects: iter([failure])
+    gc_service = StorageGCService(db_session, minio_service)
+    result = await gc_service.drain_deletion_queue()
+    removed = [obj._name for obj in minio_service.client.remove_objects.call_args.args[1]]
+    assert sorted(removed) == ["broken.png", "gone.png"]
+    assert (result.processed, result.removed, result.bytes_reclaimed, result.failed) == (3, 1, 10, 1)
+
+    stats = await gc_service.get_stats()
+    assert (stats.queue_depth, stats.failing, stats.bytes_reclaimed, stats.objects_reclaimed) == (1, 1, 10, 1)
+    # The failed object is retried later, not on the next pass
+    assert (await gc_service.drain_deletion_queue()).processed == 0
+    minio_service.client.remove_objects.side_effect = None
+
+@pytest.mark.anyio
+async def test_storage_gc_reconciles_orphaned_objects(db_session, minio_service, meme_service):
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import delete, select
+    from app.models.pending_deletion import PendingDeletion
+    from app.services.storage_gc_service import StorageGCService
+
+    await db_session.execute(delete(PendingDeletion))
+    await db_session.commit()
+    headers = Headers({"content-type": "image/png"})
+    kept = await meme_service.create_meme("Listed", UploadFile(filename="l.png", file=BytesIO(image_bytes("PNG")), headers=headers))
+    old = datetime.now(timezone.utc) - timedelta(days=1)
+
+    def listed(name, size, last_modified):
+        obj = MagicMock(size=size, last_modified=last_modified)
+        obj.object_name = name
+        return obj
+
+    minio_service.client.list_objects.side_effect = lambda bucket, recursive, start_after: iter(
+        [
+            obj
+            for obj in [
+                listed(kept.minio_path, 6, old),
+                listed("orphan-a.png", 7, old),
+                listed("orphan-b.png", 8, old),
+                listed("uploading.png", 9, datetime.now(timezone.utc)),
+            ]
+            if start_after is None or obj.object_name > start_after
+        ]
+    )
+    result = await StorageGCService(db_session, minio_service).reconcile_orphans(chunk_size=2, min_age=60)
+    assert (result.queued, result.queued_bytes) == (2, 15)
+    assert sorted(await db_session.scalars(select(PendingDeletion.minio_path))) == ["orphan-a.png", "orphan-b.png"]
+    minio_service.client.list_objects.side_effect = None
+
+@pytest.mark.anyio
+async def test_generate_variants_replaces_fallback_urls(db_session, minio_service, meme_service):
+    from app.services.derivative_service import DerivativeService, VariantSpec
+
+    with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
+        file_content = f.read()
+    headers = Headers({"content-type": "image/jpeg"})
+    created = await meme_service.create_meme("Thumbnail Meme", UploadFile(filename="t.jpg", file=BytesIO(file_content), headers=headers))
+    assert set(created.variants.values()) == {created.minio_url}
+
+    etag_before, updated_before = await meme_service.get_meme_validators(created.id)
+
+    minio_service.client.get_object.return_value.read.return_value = file_content
+    minio_service.client.presigned_get_object.side_effect = lambda bucket, path, expires: f"http://localhost:9000/{path}"
+    specs = [VariantSpec(name="thumb", max_side=32, format="webp")]
+    variants = await DerivativeService(db_session, minio_service, specs=specs).generate_for_meme(created.id)
+    response = await meme_service.get_meme_by_id(created.id)
+    etag_after, updated_after = await meme_service.get_meme_validators(created.id)
+    minio_service.client.presigned_get_object.side_effect = None
+
+    assert len(variants) == 1
+    assert max(variants[0].width, variants[0].height) <= 32
+    assert variants[0].content_type == "image/webp"
+    assert str(response.variants["thumb"]).endswith(variants[0].minio_path)
+    assert updated_after == updated_before
+    assert etag_after != etag_before
+
+@pytest.mark.anyio
+async def test_generate_variants_discards_objects_of_deleted_meme(db_session, minio_service, meme_service, monkeypatch):
+    from sqlalchemy import select
+    from app.models.pending_deletion import PendingDeletion
+    from app.services.derivative_service import DerivativeService, VariantSpec
+
+    headers = Headers({"content-type": "image/png"})
+    created = await meme_service.create_meme("Deleted While Rendering", UploadFile(filename="d.png", file=BytesIO(image_bytes("PNG")), headers=headers))
+    minio_service.client.get_object.return_value.read.return_value = image_bytes("PNG")
+    run = minio_service.run
+
+    async def delete_during_upload(operation, *args):
+        # The meme is deleted after the variants are rendered and before they are saved
+        if operation == "upload":
+            async with TestingSessionLocal() as other:
+                await MemeService(other, minio_service).delete_meme(created.id)
+        return await run(operation, *args)
+
+    monkeypatch.setattr(minio_service, "run", delete_during_upload)
+    specs = [VariantSpec(name="thumb", max_side=32, format="webp")]
+    assert await DerivativeService(db_session, minio_service, specs=specs).generate_for_meme(created.id) == []
+    queued = await db_session.scalars(select(PendingDeletion.minio_path).where(PendingDeletion.minio_path.like(f"variants/{created.id}/%")))
+    assert len(queued.all()) == 1
+
+@pytest.mark.anyio
+async def test_create_memes_batch_reports_partial_failures(meme_service):
+    headers = Headers({"content-type": "image/jpeg"})
+    items = [
+        ("Batch One", UploadFile(filename="one.jpg", file=BytesIO(image_bytes()), headers=headers)),
+        ("Batch Bad", UploadFile(filename="bad.txt", file=BytesIO(b"bad"), headers=Headers({"content-type": "text/plain"}))),
+        ("Batch Two", UploadFile(filename="two.jpg", file=BytesIO(image_bytes()), headers=headers)),
+    ]
+    response = await meme_service.create_memes_batch(items)
+
+    assert (response.created, response.failed) == (2, 1)
+    assert [item.status_code for item in response.items] == [201, 400, 201]
+    assert response.items[0].meme.title == "Batch One"
+    assert response.items[2].meme.title == "Batch Two"
+    assert (await meme_service.get_meme_by_id(response.items[2].meme.id)).title == "Batch Two"
+
+@pytest.mark.anyio
+async def test_get_memes_by_ids_keeps_order_and_reports_missing(meme_service):
+    headers = Headers({"content-type": "image/jpeg"})
+    first = await meme_service.create_meme("Lookup One", UploadFile(filename="1.jpg", file=BytesIO(image_bytes()), headers=headers))
+    second = await meme_service.create_meme("Lookup Two", UploadFile(filename="2.jpg", file=BytesIO(image_bytes()), headers=headers))
+
+    response = await meme_service.get_memes_by_ids([second.id, 999999, first.id, second.id])
+
+    assert [item.id for item in response.items] == [second.id, first.id]
+    assert response.not_found == [999999]
+
+@pytest.mark.anyio
+async def test_response_cache_is_invalidated_by_writes(meme_service, db_session):
+    from app.models.meme_stats import MemeStats
+    from app.services.response_cache import ResponseCache
+
+    cache = ResponseCache(max_size=10, ttl=60)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return await meme_service.get_paginated_memes(1, 10)
+
+    # Without a version row the cache is bypassed
+    await cache.get_or_build(db_session, "page", build)
+    await cache.get_or_build(db_session, "page", build)
+    assert len(builds) == 2
+
+    await db_session.merge(MemeStats(name="version", value=0))
+    await db_session.commit()
+    first = await cache.get_or_build(db_session, "page", build)
+    assert await cache.get_or_build(db_session, "page", build) is first
+    assert len(builds) == 3
+
+    headers = Headers({"content-type": "image/jpeg"})
+    await meme_service.create_meme("Cached Meme", UploadFile(filename="c.jpg", file=BytesIO(image_bytes()), headers=headers))
+    fresh = await cache.get_or_build(db_session, "page", build)
+    assert len(builds) == 4
+    assert fresh.total == first.total + 1
+
+def test_response_cache_expires_entries():
+    from app.services.response_cache import ResponseCache
+
+    now = [0.0]
+    cache = ResponseCache(max_size=1, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1, "A")
+    assert cache.get("a", 1) == "A"
+    assert cache.get("a", 2) is None
+    cache.set("a", 1, "A")
+    now[0] = 11
+    assert cache.get("a", 1) is None
+    cache.set("a", 1, "A")
+    cache.set("b", 1, "B")
+    assert cache.get("a", 1) is None
+    assert cache.stats()["size"] == 1
+
+@pytest.mark.anyio
+async def test_conditional_get_answers_not_modified(meme_service):
+    from fastapi import FastAPI
+    from sqlalchemy import event
+    from app.internal_router import router as internal_router
+    from app.models.meme_stats import MemeStats
+    from app.services.response_cache import get_data_version
+
+    headers = Headers({"content-type": "image/jpeg"})
+    created = await meme_service.create_meme("Conditional Meme", UploadFile(filename="e.jpg", file=BytesIO(image_bytes()), headers=headers))
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = app.dependency_overrides
+    internal_client = TestClient(internal_app)
+
+    first = internal_client.get(f"/memes/{created.id}")
+    assert first.status_code == 200
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    cached = internal_client.get(f"/memes/{created.id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert internal_client.get(f"/memes/{created.id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # The list ETag comes from the data version counter; a 304 never touches the meme table
+    await meme_service.db.merge(MemeStats(name="version", value=(await get_data_version(meme_service.db)) or 0))
+    await meme_service.db.commit()
+    page = internal_client.get("/memes")
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        assert internal_client.get("/memes", headers={"If-None-Match": page.headers["etag"]}).status_code == 304
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+    assert statements and not any("FROM meme " in statement or "FROM meme\n" in statement for statement in statements)
+
+    await meme_service.update_meme(created.id, "Conditional Meme v2")
+    assert internal_client.get(f"/memes/{created.id}", headers={"If-None-Match": etag}).status_code == 200
+    assert internal_client.get("/memes", headers={"If-None-Match": page.headers["etag"]}).status_code == 200
+
+@pytest.mark.anyio
+async def test_search_memes_ranks_and_paginates(meme_service):
+    from fastapi import HTTPException
+
+    headers = Headers({"content-type": "image/jpeg"})
+    for title in ["Grumpy Cat", "Cat", "Dog 100% Cat", "Doge"]:
+        await meme_service.create_meme(title, UploadFile(filename="s.jpg", file=BytesIO(image_bytes()), headers=headers))
+
+    first = await meme_service.search_memes("cat", 2)
+    assert [meme.title for meme in first.items] == ["Cat", "Grumpy Cat"]
+    second = await meme_service.search_memes("cat", 2, cursor=first.next_cursor)
+    assert "Dog 100% Cat" in [meme.title for meme in second.items]
+    assert "Doge" not in [meme.title for meme in first.items + second.items]
+
+    # LIKE wildcards in the query are matched literally
+    assert [meme.title for meme in (await meme_service.search_memes("100%", 10)).items] == ["Dog 100% Cat"]
+    with pytest.raises(HTTPException):
+        await meme_service.search_memes("dog", 2, cursor=first.next_cursor)
+
+@pytest.mark.anyio
+async def test_fast_serialization_matches_response_model(meme_service, minio_service, monkeypatch):
+    import json
+    from fastapi import HTTPException
+    from app.models.meme_responses import PaginatedMemesResponse
+    from app.serialization import render_json
+
+    payload = await meme_service.get_paginated_memes_payload(1, 100)
+    assert payload["items"]
+    expected = PaginatedMemesResponse.model_validate(payload).model_dump_json()
+    assert json.loads(render_json(payload)) == json.loads(expected)
+
+    # A missing presigned URL fails like the response model would instead of serializing null
+    async def no_urls(objects, remember=True):
+        return [None for _ in objects]
+
+    monkeypatch.setattr(minio_service, "get_presigned_urls_async", no_urls)
+    with pytest.raises(HTTPException) as error:
+        await meme_service.get_paginated_memes_payload(1, 100)
+    assert error.value.status_code == 500
+
+@pytest.mark.anyio
+async def test_export_streams_ndjson_in_batches(meme_service, minio_service):
+    import json
+    from datetime import datetime, timedelta, timezone
+    from app.services.export_service import ExportService
+
+    headers = Headers({"content-type": "image/jpeg"})
+    created = await meme_service.create_meme("Exported Meme", UploadFile(filename="x.jpg", file=BytesIO(image_bytes()), headers=headers))
+    total = (await meme_service.get_paginated_memes(1, 1)).total
+
+    export_service = ExportService(TestingSessionLocal, minio_service, batch_size=2)
+    chunks = [chunk async for chunk in export_service.stream_ndjson(include_urls=True)]
+    records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert len(records) == total
+    assert len(chunks) == (total + 1) // 2
+    assert [record["id"] for record in records] == sorted(record["id"] for record in records)
+    assert records[-1]["title"] == "Exported Meme"
+    assert records[-1]["minio_url"] == "http://localhost:9000/mocked_url"
+
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    assert [chunk async for chunk in export_service.stream_ndjson(updated_since=future)] == []
+    before = [chunk async for chunk in export_service.stream_ndjson(updated_before=future)]
+    assert b'"minio_url"' not in b"".join(before)
+    assert created.id in [json.loads(line)["id"] for chunk in before for line in chunk.splitlines()]
+
+    from fastapi import FastAPI
+    from app.internal_router import router as internal_router
+
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = app.dependency_overrides
+    response = TestClient(internal_app).get("/memes/export")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.splitlines()) == total
+
+@pytest.mark.anyio
+async def test_image_proxy_serves_ranges_from_disk_cache(meme_service, minio_service, tmp_path, monkeypatch):
+    import asyncio
+    from fastapi import FastAPI
+    from app import media_cache
+    from app.internal_router import router as internal_router
+
+    cache = media_cache.MediaCache(str(tmp_path / "media"), max_bytes=15)
+    monkeypatch.setattr(media_cache, "_media_cache", cache)
+    obj = minio_service.client.get_object.return_value
+    obj.stream.side_effect = lambda chunk_size: iter([b"01234", b"56789"])
+    obj.headers = {"Content-Type": "image/jpeg", "ETag": '"abc"'}
+    minio_service.client.get_object.reset_mock()
+
+    headers = Headers({"content-type": "image/jpeg"})
+    created = await meme_service.create_meme("Proxied Meme", UploadFile(filename="p.jpg", file=BytesIO(image_bytes()), headers=headers))
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = {**app.dependency_overrides, get_minio_service: lambda: minio_service}
+    internal_client = TestClient(internal_app)
+
+    full = internal_client.get(f"/memes/{created.id}/image")
+    assert (full.status_code, full.content) == (200, b"0123456789")
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-type"] == "image/jpeg"
+    partial = internal_client.get(f"/memes/{created.id}/image", headers={"Range": "bytes=2-4"})
+    assert (partial.status_code, partial.content) == (206, b"234")
+    assert partial.headers["content-range"] == "bytes 2-4/10"
+    assert internal_client.get(f"/memes/{created.id}/image", headers={"Range": "bytes=-3"}).content == b"789"
+    assert internal_client.get(f"/memes/{created.id}/image", headers={"Range": "bytes=10-"}).status_code == 416
+    assert internal_client.get(f"/memes/{created.id}/image", headers={"If-None-Match": '"abc"'}).status_code == 304
+    assert minio_service.client.get_object.call_count == 1
+
+    # Concurrent misses share one download; the byte cap evicts the least recently used object
+    results = await asyncio.gather(*[cache.open(minio_service, "memes", "other.jpg") for _ in range(5)])
+    for _, file in results:
+        assert file.read() == b"0123456789"
+        file.close()
+    assert minio_service.client.get_object.call_count == 2
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == 10
+
+    # Directories of exited workers are removed, the current process keeps its own
+    import os
+    for pid in ("999999999", str(os.getpid())):
+        (tmp_path / "root" / pid).mkdir(parents=True)
+    media_cache.remove_stale_directories(str(tmp_path / "root"))
+    assert os.listdir(tmp_path / "root") == [str(os.getpid())]
+
+@pytest.mark.anyio
+async def test_range_response_uses_zerocopy_extension(tmp_path):
+    from app.range_response import RangeFileResponse
+
+    path = tmp_path / "image.bin"
+    path.write_bytes(b"0123456789")
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "extensions": {"http.response.zerocopy": {}}}
+    response = RangeFileResponse(open(path, "rb"), 10, "image/jpeg", '"abc"', range_header="bytes=2-4")
+    await response(scope, None, send)
+    assert sent[0]["status"] == 206
+    assert (sent[1]["type"], sent[1]["offset"], sent[1]["count"]) == ("http.response.zerocopy", 2, 3)
+    assert sent[1]["file"].closed
+
+@pytest.mark.anyio
+async def test_minio_service_against_fake_s3_server():
+    from minio import Minio
+    from benchmarks.fake_s3 import FakeS3Server
+
+    server = FakeS3Server().start()
+    try:
+        client = Minio(server.endpoint, access_key="bench", secret_key="bench-secret", secure=False, region="us-east-1")
+        service = MinioService(client=client)
+        assert service.ensure_bucket_exists("memes")
+        service.put_bytes("memes", "a.png", b"first", "image/png")
+        service.put_bytes("memes", "b.png", b"second", "image/png")
+        assert service.get_object_bytes("memes", "b.png") == b"second"
+        assert [name for name, _, _ in service.list_objects_page("memes", start_after="a.png")] == ["b.png"]
+        assert service.remove_objects("memes", ["a.png", "missing.png"]) == {}
+        assert service.get_object_sizes([("memes", "a.png"), ("memes", "b.png")]) == {("memes", "b.png"): 6}
+        service.close()
+    finally:
+        server.stop()
+
+@pytest.mark.anyio
+async def test_metrics_middleware_reports_request_phases(db_session, meme_service):
+    from fastapi import FastAPI
+    from app.internal_router import router as internal_router
+    from app.metrics import MetricsMiddleware, instrument_engine, metrics_endpoint
+
+    headers = Headers({"content-type": "image/png"})
+    await meme_service.create_meme("Timed", UploadFile(filename="t.png", file=BytesIO(image_bytes("PNG")), headers=headers))
+    instrument_engine(engine.sync_engine)
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.add_middleware(MetricsMiddleware, server_timing=True)
+    internal_app.add_route("/metrics", metrics_endpoint)
+    internal_app.dependency_overrides = app.dependency_overrides
+    internal_client = TestClient(internal_app)
+
+    response = internal_client.get("/memes", params={"page_size": 5})
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    for phase in ("db;", "count;", "page_query;", "presign;", "serialization;", "total;"):
+        assert phase in timing
+    assert 'queries"' in timing
+
+    metrics = internal_client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/memes",status="200"}' in metrics
+    assert 'http_request_phase_seconds_count{phase="db",route="/memes"}' in metrics
+    assert "presigned_url_cache_hits_total" in metrics or "response_cache_hits_total" in metrics
+
+@pytest.mark.anyio
+async def test_reads_use_replica_until_client_writes(db_session, meme_service, tmp_path):
+    from fastapi import FastAPI
+    from app.internal_router import router as internal_router
+    from app.models.meme import Meme
+
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}", poolclass=NullPool)
+    ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with ReplicaSessionLocal() as replica:
+        # A row the primary does not have tells which database served the read
+        replica.add(Meme(id=424242, title="Only on replica", minio_bucket="memes", minio_path="replica.png"))
+        await replica.commit()
+
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = {**app.dependency_overrides, get_replica_session_factory: lambda: ReplicaSessionLocal}
+    internal_client = TestClient(internal_app)
+
+    assert internal_client.get("/memes/424242").json()["title"] == "Only on replica"
+    created = internal_client.post("/memes", data={"title": "Fresh"}, files={"file": ("f.png", image_bytes("PNG"), "image/png")})
+    assert created.status_code == 200
+    assert "last_write_at" in created.cookies
+    # Right after the write the client reads from the primary and sees its own meme
+    assert internal_client.get(f"/memes/{created.json()['id']}").status_code == 200
+    assert internal_client.get("/memes/424242").status_code == 404
+
+    internal_client.cookies.clear()
+    assert internal_client.get("/memes/424242").status_code == 200
+    await replica_engine.dispose()
+
+@pytest.mark.anyio
+async def test_health_and_readiness(db_session):
+    from app.health import get_storage
+
+    assert client.get("/healthz").json() == {"message": "ok"}
+
+    app.dependency_overrides[get_storage] = override_get_minio_service
+    try:
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json() == {"ready": True, "checks": {"database": "ok", "storage": "ok"}}
+
+        # The storage client is created in the lifespan; before that the service is not ready
+        app.dependency_overrides[get_storage] = lambda: None
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["checks"]["database"] == "ok"
+        assert response.json()["checks"]["storage"] != "ok"
+    finally:
+        del app.dependency_overrides[get_storage]
+
+@pytest.mark.anyio
+async def test_direct_upload_complete_and_expiry(db_session):
+    from datetime import datetime, timedelta, timezone
+    from fastapi import FastAPI
+    from minio.error import S3Error
+    from sqlalchemy import select, update
+    from app.internal_router import router as internal_router
+    from app.models.pending_deletion import PendingDeletion
+    from app.models.pending_upload import PendingUpload
+    from app.services.storage_gc_service import StorageGCService
+
+    minio_client = MagicMock()
+    minio_client.presigned_get_object.return_value = "http://localhost:9000/mocked_url"
+    minio_client.presigned_post_policy.return_value = {"policy": "p", "x-amz-signature": "s"}
+    minio_service = MinioService(client=minio_client)
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = {**app.dependency_overrides, get_minio_service: lambda: minio_service}
+    internal_client = TestClient(internal_app)
+
+    assert internal_client.post("/memes/uploads", json={"title": "Direct", "content_type": "image/bmp"}).status_code == 422
+    started = internal_client.post("/memes/uploads", json={"title": "Direct", "content_type": "image/png"})
+    assert started.status_code == 200
+    ticket = started.json()
+    assert ticket["fields"]["key"].endswith(".png")
+    assert ticket["fields"]["Content-Type"] == "image/png"
+    assert ticket["fields"]["policy"] == "p"
+
+    # Nothing in the bucket yet
+    minio_client.get_object.side_effect = S3Error("NoSuchKey", "missing", "", "", "", None)
+    assert internal_client.post(f"/memes/uploads/{ticket['token']}/complete").status_code == 409
+
+    # The object is read once on completion to check its content and record its metadata
+    minio_client.get_object.side_effect = None
+    minio_client.get_object.return_value.stream.side_effect = lambda chunk_size: iter([image_bytes("PNG", (7, 5))])
+    completed = internal_client.post(f"/memes/uploads/{ticket['token']}/complete")
+    assert completed.status_code == 200
+    assert completed.json()["title"] == "Direct"
+    assert completed.json()["minio_path"] == ticket["fields"]["key"]
+    assert (completed.json()["width"], completed.json()["height"]) == (7, 5)
+    assert internal_client.post(f"/memes/uploads/{ticket['token']}/complete").status_code == 404
+
+    # An upload that was never completed expires and its object is queued for deletion
+    abandoned = internal_client.post("/memes/uploads", json={"title": "Abandoned", "content_type": "image/gif"}).json()
+    await db_session.execute(
+        update(PendingUpload)
+        .where(PendingUpload.token == abandoned["token"])
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    await db_session.commit()
+    assert internal_client.post(f"/memes/uploads/{abandoned['token']}/complete").status_code == 410
+    assert await StorageGCService(db_session, minio_service).expire_uploads() == 1
+    assert await db_session.get(PendingUpload, abandoned["token"]) is None
+    queued = await db_session.scalars(
+        select(PendingDeletion.minio_path).where(PendingDeletion.minio_path == abandoned["fields"]["key"])
+    )
+    assert queued.all() == [abandoned["fields"]["key"]]
+
+@pytest.mark.anyio
+async def test_resumable_upload_survives_retries(db_session):
+    import base64
+    from datetime import datetime, timedelta, timezone
+    from fastapi import FastAPI, HTTPException
+    from minio import Minio
+    from sqlalchemy import select, update
+    from benchmarks.fake_s3 import FakeS3Server
+    from app.internal_router import router as internal_router
+    from app.models.pending_deletion import PendingDeletion
+    from app.models.resumable_upload import ResumableUpload
+    from app.services.resumable_upload_service import ResumableUploadService
+    from app.services.storage_gc_service import StorageGCService
+
+    server = FakeS3Server().start()
+    minio_service = MinioService(
+        client=Minio(server.endpoint, access_key="test", secret_key="test", secure=False, region="us-east-1")
+    )
+    minio_service.ensure_bucket_exists("memes")
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = {**app.dependency_overrides, get_minio_service: lambda: minio_service}
+    internal_client = TestClient(internal_app)
+
+    with open("api_service/tests/fixtures/test_image.jpg", "rb") as f:
+        # Longer than one 8 MiB part, so the upload is assembled from a full part and a short last one
+        data = f.read() + b"\0" * (9 * 1024 * 1024)
+    metadata = f"title {base64.b64encode(b'Resumable').decode()},filetype {base64.b64encode(b'image/jpeg').decode()}"
+    created = internal_client.post(
+        "/memes/resumable", headers={"Upload-Length": str(len(data)), "Upload-Metadata": metadata}
+    )
+    assert created.status_code == 201
+    location = created.headers["Location"]
+
+    def patch(offset: int, chunk: bytes):
+        return internal_client.patch(
+            location,
+            content=chunk,
+            headers={"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"},
+        )
+
+    first = 1024 * 1024
+    assert patch(0, data[:first]).headers["Upload-Offset"] == str(first)
+    # A retry of the first chunk is rejected: the client must resume from the stored offset
+    assert patch(0, data[:first]).status_code == 409
+    assert internal_client.head(location).headers["Upload-Offset"] == str(first)
+
+    # A request that loses its offset to a concurrent one while streaming is rejected when it saves
+    upload_id = location.rsplit("/", 1)[-1]
+
+    async def racing_chunks():
+        yield data[first:first + 10]
+        async with TestingSessionLocal() as other:
+            await other.execute(update(ResumableUpload).where(ResumableUpload.id == upload_id).values(received=first + 10))
+            await other.commit()
+
+    with pytest.raises(HTTPException) as conflict:
+        await ResumableUploadService(db_session, minio_service).append(upload_id, first, racing_chunks())
+    assert conflict.value.status_code == 409
+    await db_session.execute(update(ResumableUpload).where(ResumableUpload.id == upload_id).values(received=first))
+    await db_session.commit()
+
+    second = first + 8 * 1024 * 1024
+    assert patch(first, data[first:second]).headers["Upload-Offset"] == str(second)
+    assert internal_client.post(f"{location}/complete").status_code == 409
+    assert patch(second, data[second:]).headers["Upload-Offset"] == str(len(data))
+
+    completed = internal_client.post(f"{location}/complete")
+    assert completed.status_code == 200
+    assert completed.json()["title"] == "Resumable"
+    assert server.storage.buckets["memes"][completed.json()["minio_path"]].data == data
+    # Completing again after a lost response returns the same meme
+    assert internal_client.post(f"{location}/complete").json()["id"] == completed.json()["id"]
+
+    # Expiring the finished upload drops its state but keeps the meme's object
+    await db_session.execute(
+        update(ResumableUpload).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    await db_session.commit()
+    assert await StorageGCService(db_session, minio_service).expire_resumable_uploads() == 1
+    queued = await db_session.scalars(select(PendingDeletion.minio_path))
+    assert completed.json()["minio_path"] not in queued.all()
+
+    minio_service.close()
+    server.stop()
+
+@pytest.mark.anyio
+async def test_resumable_upload_concurrent_final_chunks(db_session):
+    import asyncio
+    from fastapi import HTTPException
+    from minio import Minio
+    from benchmarks.fake_s3 import FakeS3Server
+    from app.services.resumable_upload_service import ResumableUploadService
+
+    server = FakeS3Server().start()
+    minio_service = MinioService(
+        client=Minio(server.endpoint, access_key="test", secret_key="test", secure=False, region="us-east-1")
+    )
+    minio_service.ensure_bucket_exists("memes")
+    data = image_bytes("PNG")
+    upload = await ResumableUploadService(db_session, minio_service).create_upload("Raced", "image/png", len(data))
+
+    # Both requests stream the whole file before either of them saves
+    streamed = asyncio.Barrier(2)
+
+    async def body():
+        yield data
+        await streamed.wait()
+
+    async def finish():
+        async with TestingSessionLocal() as db:
+            return await ResumableUploadService(db, minio_service).append(upload.id, 0, body())
+
+    results = await asyncio.gather(finish(), finish(), return_exceptions=True)
+    outcomes = [result.status_code if isinstance(result, HTTPException) else result for result in results]
+    assert sorted(outcomes) == sorted([len(data), 409])
+    async with TestingSessionLocal() as db:
+        completed = await MemeService(db, minio_service).complete_resumable_upload(upload.id)
+    assert server.storage.buckets["memes"][completed.minio_path].data == data
+
+    minio_service.close()
+    server.stop()
+
+@pytest.mark.anyio
+async def test_idempotency_key_replays_create(db_session, minio_service):
+    from fastapi import FastAPI, HTTPException
+    from sqlalchemy import func, select, update
+    from app.internal_router import router as internal_router
+    from app.models.idempotency_key import IdempotencyKey
+    from app.models.meme import Meme
+    from app.services.idempotency_service import run_idempotent
+
+    internal_app = FastAPI()
+    internal_app.include_router(internal_router)
+    internal_app.dependency_overrides = app.dependency_overrides
+    internal_client = TestClient(internal_app)
+
+    def create(title: str, content: bytes = image_bytes("PNG")):
+        return internal_client.post(
+            "/memes",
+            data={"title": title},
+            files={"file": ("retry.png", content, "image/png")},
+            headers={"Idempotency-Key": "create-retry-1"},
+        )
+
+    first = create("Retried")
+    assert first.status_code == 200
+    count = await db_session.scalar(select(func.count()).select_from(Meme))
+    replayed = create("Retried")
+    assert replayed.status_code == 200
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json() == first.json()
+    assert await db_session.scalar(select(func.count()).select_from(Meme)) == count
+    # The same key with other parameters is a client bug, not a retry
+    assert create("Something else").status_code == 422
+    other_content = image_bytes("PNG")[:-1] + bytes([image_bytes("PNG")[-1] ^ 1])
+    assert create("Retried", other_content).status_code == 422
+
+    updated = internal_client.put(
+        f"/memes/{first.json()['id']}", data={"title": "Renamed"}, headers={"Idempotency-Key": "create-retry-1"}
+    )
+    assert updated.status_code == 200
+    assert "Idempotent-Replayed" not in updated.headers
+
+    # A slow request whose key was taken over by a retry is rolled back instead of being applied twice
+    count = await db_session.scalar(select(func.count()).select_from(Meme))
+
+    async def taken_over(save):
+        await db_session.execute(update(IdempotencyKey).where(IdempotencyKey.key == "slow-1").values(claim="retry"))
+        headers = Headers({"content-type": "image/png"})
+        file = UploadFile(filename="slow.png", file=BytesIO(image_bytes("PNG")), headers=headers)
+        return await MemeService(db_session, minio_service).create_meme("Slow", file, before_commit=save)
+
+    with pytest.raises(HTTPException) as conflict:
+        await run_idempotent(db_session, "slow-1", "POST /memes", "fingerprint", taken_over)
+    assert conflict.value.status_code == 409
+    assert await db_session.scalar(select(func.count()).select_from(Meme)) == count
@@ -3,11 +3,136 @@ CREATE TABLE meme (
     title VARCHAR(255) NOT NULL,
     minio_bucket VARCHAR(255) NOT NULL,
     minio_path VARCHAR(255) NOT NULL,
+    content_hash VARCHAR(64),
+    width INTEGER,
+    height INTEGER,
+    frames INTEGER,
+    size BIGINT,
+    checksum VARCHAR(64),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Keyset pagination: every sort order of GET /memes is an index range scan
+CREATE INDEX ix_meme_created_at_id ON meme (created_at, id);
+CREATE INDEX ix_meme_updated_at_id ON meme (updated_at, id);
+-- Image metadata recorded at upload: sorting and min/max filters stay in the index
+CREATE INDEX ix_meme_size_id ON meme (size, id);
+CREATE INDEX ix_meme_width_id ON meme (width, id);
+CREATE INDEX ix_meme_height_id ON meme (height, id);
+-- The orphan reconciler checks listed object keys against stored paths
+CREATE INDEX ix_meme_minio_path ON meme (minio_path);
+
+-- Title search: ILIKE substrings and word_similarity both use the trigram index
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX ix_meme_title_trgm ON meme USING gin (title gin_trgm_ops);
+
 INSERT INTO meme (title, minio_bucket, minio_path) VALUES
 ('First Meme', 'memes', 'Cat01.jpg'),
 ('Second Meme', 'memes', 'Cat02.jpg'),
-('Third Meme', 'memes', 'Cat03.jpg');
\ No newline at end of file
+('Third Meme', 'memes', 'Cat03.jpg');
+
+-- Counters maintained by the write paths of MemeService (COUNT_STRATEGY=counter)
+CREATE TABLE meme_stats (
+    name VARCHAR(64) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO meme_stats (name, value) SELECT 'total', count(*) FROM meme;
+
+-- Content-addressed images shared by memes (STORAGE_DEDUP=1)
+CREATE TABLE meme_blob (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    minio_bucket VARCHAR(255) NOT NULL,
+    minio_path VARCHAR(255) NOT NULL,
+    size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX ix_meme_blob_minio_path ON meme_blob (minio_path);
+
+-- Thumbnails and other derivatives generated in the background after create/update
+CREATE TABLE meme_variant (
+    id SERIAL PRIMARY KEY,
+    meme_id INTEGER NOT NULL REFERENCES meme (id) ON DELETE CASCADE,
+    name VARCHAR(64) NOT NULL,
+    source_path VARCHAR(255) NOT NULL,
+    minio_bucket VARCHAR(255) NOT NULL,
+    minio_path VARCHAR(255) NOT NULL,
+    content_type VARCHAR(64) NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    size BIGINT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_meme_variant_meme_id_name UNIQUE (meme_id, name)
+);
+CREATE INDEX ix_meme_variant_minio_path ON meme_variant (minio_path);
+
+-- Bumped by every write; the public service drops cached list pages when it changes
+INSERT INTO meme_stats (name, value) VALUES ('version', 0);
+
+-- Objects no longer referenced by any row; removed in the background in batches
+CREATE TABLE pending_deletion (
+    id BIGSERIAL PRIMARY KEY,
+    minio_bucket VARCHAR(255) NOT NULL,
+    minio_path VARCHAR(255) NOT NULL,
+    size BIGINT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    enqueued_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    not_before TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_pending_deletion_minio_bucket_minio_path UNIQUE (minio_bucket, minio_path)
+);
+CREATE INDEX ix_pending_deletion_not_before_id ON pending_deletion (not_before, id);
+
+-- Totals of the background deletion, reported by GET /storage/gc
+INSERT INTO meme_stats (name, value) VALUES ('reclaimed_bytes', 0), ('reclaimed_objects', 0);
+
+-- Direct-to-MinIO uploads with an issued POST policy that are not completed yet
+CREATE TABLE pending_upload (
+    token VARCHAR(64) PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    minio_bucket VARCHAR(255) NOT NULL,
+    minio_path VARCHAR(255) NOT NULL,
+    content_type VARCHAR(64) NOT NULL,
+    max_size BIGINT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+CREATE INDEX ix_pending_upload_expires_at ON pending_upload (expires_at);
+CREATE INDEX ix_pending_upload_minio_path ON pending_upload (minio_path);
+
+-- Chunked uploads (PATCH /memes/resumable/{id}) assembled through MinIO multipart uploads
+CREATE TABLE resumable_upload (
+    id VARCHAR(64) PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    content_type VARCHAR(64) NOT NULL,
+    minio_bucket VARCHAR(255) NOT NULL,
+    minio_path VARCHAR(255) NOT NULL,
+    length BIGINT NOT NULL,
+    received BIGINT NOT NULL DEFAULT 0,
+    multipart_upload_id VARCHAR(255) NOT NULL,
+    parts JSON NOT NULL DEFAULT '[]',
+    tail_path VARCHAR(255),
+    tail_size BIGINT NOT NULL DEFAULT 0,
+    meme_id INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+CREATE INDEX ix_resumable_upload_expires_at ON resumable_upload (expires_at);
+CREATE INDEX ix_resumable_upload_minio_path ON resumable_upload (minio_path);
+CREATE INDEX ix_resumable_upload_tail_path ON resumable_upload (tail_path);
+
+-- Stored results of create/update requests sent with an Idempotency-Key header
+CREATE TABLE idempotency_key (
+    key VARCHAR(255) NOT NULL,
+    scope VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    claim VARCHAR(32) NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (key, scope)
+);
+CREATE INDEX ix_idempotency_key_expires_at ON idempotency_key (expires_at);